@@ -0,0 +1,293 @@
+"""
+End-to-end load test of the bot's command handlers, with local stand-ins for Discord and battle.net.
+
+Commands from many simulated guilds arrive at a fixed rate, whether or not earlier ones have
+finished, and each goes the way a message from the Discord gateway does: through the bot's
+context, argument parsing, checks and hooks, to its handler, with its replies, status
+message edits and patch note broadcasts sent through the bot's dispatcher to fake channels.
+Halfway through, the bot checks a local stand-in for the patch notes site and broadcasts the
+patch to every channel subscribed by !patchnotes.
+
+Reported are the end-to-end latency of each command, from when it arrived to when its reply was
+sent, the event loop's lag, and the outbound requests made.
+
+Run from the repository root:
+    python benchmarks/bench_bot_throughput.py --commands 20000 --rate 2000 --guilds 200
+    python benchmarks/bench_bot_throughput.py --outbound-rate 20 --discord-latency 0.05
+"""
+
+# Standard library imports
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "bot_code"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "tests"))
+
+# Local imports
+from battlenet_interface import Profile_Fetcher
+from dispatcher import Outbound_Dispatcher, PRIORITY_NAMES
+from patch_scraper import Overwatch_Patch_Scraper
+from fake_discord import Fake_Author, Fake_Channel, Fake_Command_Message, Fake_Context, Fake_Guild
+from patch_site import Fake_Patch_Site
+from bench_utils import summarise_timings, write_results
+
+
+# Relative frequencies of the commands sent.
+COMMAND_WEIGHTS = {"!join": 30, "!status": 25, "!leave": 15, "!next": 10, "!link": 10, "!patchnotes": 5,
+                   "!stoppatchnotes": 5}
+# How often the event loop lag is measured, in seconds.
+LAG_INTERVAL = 0.01
+# Used for --outbound-rate 0, which is no rate limit at all.
+UNLIMITED_RATE = 1e9
+
+
+class Stand_In_Profile():
+    """
+    A public battle.net profile, as returned by over_stats.
+    """
+
+    def modes(self) -> list:
+        return ["quickplay", "competitive"]
+
+
+
+class Stand_In_Profile_Loader():
+    """
+    Loads a stand-in profile for any battletag, taking latency seconds as a scrape would.
+    Called in the bot's Profile_Fetcher threads.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+
+    def __call__(self, battletag: str) -> Stand_In_Profile:
+        self.calls += 1
+        time.sleep(self.latency)
+        return Stand_In_Profile()
+
+
+
+class Loop_Lag_Monitor():
+    """
+    Measures how late the event loop wakes a task sleeping for interval seconds, while running.
+
+    Attributes:
+        interval (float): Seconds between measurements.
+        lags (list): How many seconds late each wake up was.
+    """
+
+    def __init__(self, interval: float = LAG_INTERVAL):
+        self.interval = interval
+        self.lags = []
+        self.__task = None
+
+
+    def start(self):
+        self.__task = asyncio.ensure_future(self.__run())
+
+
+    async def stop(self):
+        self.__task.cancel()
+        await asyncio.gather(self.__task, return_exceptions=True)
+
+
+    async def __run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+
+
+
+def generate_load(count: int, guild_count: int, players_per_guild: int, seed: int = 0) -> list:
+    """
+    Generates a random but reproducible mix of commands from players in guild_count guilds.
+
+    Args:
+        count (int): The number of commands.
+        guild_count (int): The number of guilds sending them.
+        players_per_guild (int): The number of different players in each guild.
+        seed (int): The random seed.
+
+    Returns:
+        load (list): (guild id, author id, author name, content) of each command, in the order they arrive.
+    """
+    rng = random.Random(seed)
+    names, weights = list(COMMAND_WEIGHTS), list(COMMAND_WEIGHTS.values())
+    load = []
+    for _ in range(count):
+        guild = rng.randrange(guild_count)
+        player = guild * players_per_guild + rng.randrange(players_per_guild)
+        content = rng.choices(names, weights)[0]
+        if content == "!link":
+            content += f" Player{player}#{1000 + player}"
+        load.append(((guild + 1) << 22, player + 1, f"player{player}", content))
+    return load
+
+
+async def run_load(bot, load: list, rate: float, discord_latency: float = 0.0, broadcast: bool = True) -> dict:
+    """
+    Sends the commands to the bot at rate commands a second, without waiting for earlier commands
+    to finish, then waits for them all and for any status messages they changed.
+
+    Args:
+        bot (Overwatch_Bot): The bot, from create_bot.
+        load (list): The commands, from generate_load.
+        rate (float): Commands arriving each second.
+        discord_latency (float): Seconds each message sent to a fake channel takes.
+        broadcast (bool): Whether to check for and broadcast a new patch halfway through.
+
+    Returns:
+        result (dict): The commands run, the rate achieved, latency summaries overall and by command,
+            the event loop lag, and the outbound requests made.
+    """
+    if bot.user is None:
+        bot._connection.user = Fake_Author("bot")
+    discord_bot = importlib.import_module("discord_bot")
+
+    class Stand_In_Context(discord_bot.Dispatched_Context, Fake_Context):
+        """
+        The bot's own context, sending replies through its dispatcher, then to the fake channel rather than Discord.
+        """
+
+    channels, authors, timings = {}, {}, {}
+    # Stands in for Discord's channel cache, so patch note broadcasts reach the fake channels.
+    bot.get_channel = lambda channel_id: channels.get(channel_id)
+
+    async def deliver(message: Fake_Command_Message, arrival: float):
+        # As bot.process_commands does, with the stand-in context.
+        await bot.invoke(await bot.get_context(message, cls=Stand_In_Context))
+        timings.setdefault(message.content.split()[0], []).append(time.perf_counter() - arrival)
+
+    monitor = Loop_Lag_Monitor()
+    monitor.start()
+    deliveries = []
+    start = time.perf_counter()
+    for i, (guild_id, author_id, author_name, content) in enumerate(load):
+        arrival = start + i / rate
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if guild_id not in channels:
+            channels[guild_id] = Fake_Channel(guild_id, guild=Fake_Guild(guild_id), latency=discord_latency)
+        if author_id not in authors:
+            authors[author_id] = Fake_Author(author_name, author_id)
+        message = Fake_Command_Message(authors[author_id], channels[guild_id], content)
+        deliveries.append(asyncio.ensure_future(deliver(message, arrival)))
+        if broadcast and i == len(load) // 2:
+            deliveries.append(asyncio.ensure_future(bot.post_new_patches()))
+    await asyncio.gather(*deliveries)
+    seconds = time.perf_counter() - start
+    # Let the last status message edits go out, so they are counted.
+    await asyncio.sleep(bot.status_debounce + 0.1)
+    await monitor.stop()
+    for guild_queue in list(bot.guild_queues.values()):
+        await guild_queue.status_message.close()
+
+    samples = [seconds for command_samples in timings.values() for seconds in command_samples]
+    sent = [message for channel in channels.values() for message in channel.sent]
+    dispatcher = bot.dispatcher
+    return {"commands": len(samples),
+            "seconds": seconds,
+            "commands_per_sec": len(samples) / seconds,
+            "command_errors": sum(bot.metrics.command_errors.values()),
+            "latency": summarise_timings(samples),
+            "by_command": {command: dict(count=len(command_samples), **summarise_timings(command_samples))
+                           for command, command_samples in sorted(timings.items())},
+            "loop_lag": summarise_timings(monitor.lags or [0.0]),
+            "outbound": {"sent": {PRIORITY_NAMES[priority]: count for priority, count in dispatcher.sent_count.items()},
+                         "most_pending": {PRIORITY_NAMES[priority]: count
+                                          for priority, count in dispatcher.most_pending.items()},
+                         "throttled": dispatcher.throttled_count,
+                         "messages_sent": len(sent),
+                         "message_edits": sum(len(message.edits) for message in sent),
+                         "messages_pinned": sum(message.pinned for message in sent)}}
+
+
+def run_benchmark(load: list, rate: float, outbound_rate: float, discord_latency: float,
+                  battlenet_latency: float) -> dict:
+    """
+    Creates the bot, with local stand-ins for the patch notes site and battle.net, and runs the load through it.
+    Must be run with the working directory set to a scratch folder, as the bot writes its database there.
+    """
+    patch_site = Fake_Patch_Site().start()
+    try:
+        scraper = Overwatch_Patch_Scraper(live_patches_url=patch_site.url("/live"),
+                                          experimental_patches_url=patch_site.url("/experimental"))
+        # A new live patch for the bot to find and broadcast halfway through.
+        patch_site.set_page("/live", "hero.html")
+        discord_bot = importlib.import_module("discord_bot")
+
+        async def run():
+            bot = discord_bot.create_bot(scraper=scraper)
+            bot.recorder = None
+            if not outbound_rate:
+                bot.dispatcher = Outbound_Dispatcher(UNLIMITED_RATE, UNLIMITED_RATE, metrics=bot.metrics)
+            elif outbound_rate != bot.dispatcher.bucket.rate:
+                bot.dispatcher = Outbound_Dispatcher(outbound_rate, metrics=bot.metrics)
+            bot.profile_fetcher = Profile_Fetcher(load_profile=Stand_In_Profile_Loader(battlenet_latency))
+            try:
+                return await run_load(bot, load, rate, discord_latency)
+            finally:
+                await bot.dispatcher.close()
+
+        return asyncio.run(run())
+    finally:
+        patch_site.stop()
+
+
+def print_result(result: dict):
+    outbound = result["outbound"]
+    print(f"\n{result['commands']} commands in {result['seconds']:.1f} s, {result['commands_per_sec']:.1f} commands/sec, "
+          f"{result['command_errors']} errors")
+    print(f"{'command':<16}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for command, summary in list(result["by_command"].items()) + [("all", dict(count=result["commands"],
+                                                                               **result["latency"]))]:
+        print(f"{command:<16}{summary['count']:>8}{summary['mean_ms']:>10.2f}{summary['p50_ms']:>10.2f}"
+              f"{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}{summary['max_ms']:>10.2f}")
+    lag = result["loop_lag"]
+    print(f"\nEvent loop lag: p50 {lag['p50_ms']:.2f} ms, p99 {lag['p99_ms']:.2f} ms, max {lag['max_ms']:.2f} ms")
+    print(f"Outbound requests: {outbound['sent']}, most waiting at once: {outbound['most_pending']}, "
+          f"throttled {outbound['throttled']} times")
+    print(f"Messages sent: {outbound['messages_sent']}, edited {outbound['message_edits']} times, "
+          f"{outbound['messages_pinned']} pinned")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the bot's command handlers end to end.")
+    parser.add_argument("--commands", type=int, default=20000, help="The number of commands to send.")
+    parser.add_argument("--rate", type=float, default=2000, help="Commands arriving each second.")
+    parser.add_argument("--guilds", type=int, default=200, help="Guilds the commands are spread over.")
+    parser.add_argument("--players", type=int, default=15, help="Players sending commands in each guild.")
+    parser.add_argument("--outbound-rate", type=float, default=0,
+                        help="Requests to Discord allowed each second, or 0 for no limit.")
+    parser.add_argument("--discord-latency", type=float, default=0.0, help="Seconds each request to Discord takes.")
+    parser.add_argument("--battlenet-latency", type=float, default=0.05,
+                        help="Seconds each battle.net profile lookup takes.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the commands.")
+    parser.add_argument("--json", dest="json_fpath", help="Also write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    load = generate_load(args.commands, args.guilds, args.players, args.seed)
+    json_fpath = args.json_fpath and os.path.abspath(args.json_fpath)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        result = run_benchmark(load, args.rate, args.outbound_rate, args.discord_latency, args.battlenet_latency)
+        os.chdir(ROOT_DIR)
+    result["rate"] = args.rate
+    print_result(result)
+    if json_fpath:
+        write_results(json_fpath, "bot_throughput", [result])
+
+
+if __name__ == "__main__":
+    main()
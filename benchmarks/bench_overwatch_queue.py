@@ -0,0 +1,246 @@
+"""
+Scalability benchmark for Overwatch_Queue.
+
+Times each queue operation on a single queue of increasing size, then times a mix of operations
+spread across many small queues held at once, as one bot serving many servers would.
+
+For each case it reports operations per second, latency percentiles and the bytes allocated per
+operation. Allocations are measured with tracemalloc on separate runs, so that tracing does not
+slow down the timed runs.
+
+Run from the repository root:
+    python benchmarks/bench_overwatch_queue.py --json bench_output.json
+    python benchmarks/bench_overwatch_queue.py --compare bench_output.json
+
+With --compare, cases whose ops/sec dropped by more than --threshold against the earlier results
+are listed and the script exits with status 1.
+"""
+
+# Standard library imports
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "bot_code"))
+
+# Local imports
+from overwatch_queue import Player, Overwatch_Queue
+from bench_utils import read_results, summarise_timings, write_results
+
+
+SIZES = [10, 100, 1000, 10000, 100000]
+QUEUE_COUNTS = [1000, 5000]
+OPERATIONS = ["add_player", "delete_player", "delay_player", "rejoin_player", "update_queue",
+              "print_players", "print_player_wait", "undo_command"]
+
+
+def create_queue(size: int, name_prefix: str = "") -> Overwatch_Queue:
+    """
+    Creates an Overwatch 2 queue of size players.
+    """
+    players = [Player(f"{name_prefix}player{i}") for i in range(size)]
+    return Overwatch_Queue(mode=2, players=players)
+
+
+def prepare_operation(queue: Overwatch_Queue, operation: str, count: int) -> list:
+    """
+    Sets up the queue for count calls of operation, returning the argument tuple for each call.
+
+    Args:
+        queue (Overwatch_Queue): The queue to run the operation on.
+        operation (str): The name of the Overwatch_Queue method.
+        count (int): How many calls to prepare.
+
+    Returns:
+        calls (list): A list of argument tuples, one per call.
+    """
+    if operation == "add_player":
+        return [(Player(f"new{i}"),) for i in range(count)]
+    elif operation == "delete_player":
+        # Delete from the back of the waiting queue where possible, as the commonest !leave.
+        return [(player,) for player in list(reversed(queue.players))[:count]]
+    elif operation == "delay_player":
+        # Keep enough non-delaying players waiting to fill the game after each delay.
+        waiting = list(queue.waiting_players)
+        return [(player,) for player in waiting[:min(count, len(waiting) // 2)]]
+    elif operation == "rejoin_player":
+        delayed = list(queue.waiting_players)[:count]
+        for player in delayed:
+            queue.delay_player(player)
+        return [(player,) for player in delayed]
+    elif operation == "print_player_wait":
+        return [(queue.players[-1],)] * count
+    else:
+        return [()] * count
+
+
+def time_operation(queue: Overwatch_Queue, operation: str, max_ops: int, time_budget: float) -> list:
+    """
+    Times calls of operation on queue until max_ops calls or time_budget seconds have run.
+
+    Returns:
+        samples (list): The time in seconds of each call.
+    """
+    method = getattr(queue, operation)
+    calls = prepare_operation(queue, operation, max_ops)
+    samples = []
+    deadline = time.perf_counter() + time_budget
+    for args in calls:
+        start = time.perf_counter()
+        method(*args)
+        samples.append(time.perf_counter() - start)
+        if start > deadline and len(samples) >= 3:
+            break
+    return samples
+
+
+def measure_allocations(queue: Overwatch_Queue, operation: str, alloc_ops: int) -> dict:
+    """
+    Measures the bytes allocated by alloc_ops calls of operation on queue.
+
+    Returns:
+        allocations (dict): The mean peak bytes allocated during a call and mean bytes retained after it.
+    """
+    method = getattr(queue, operation)
+    calls = prepare_operation(queue, operation, alloc_ops)
+    peaks, retained = [], []
+    tracemalloc.start()
+    for args in calls:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        method(*args)
+        after, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        retained.append(after - before)
+    tracemalloc.stop()
+    if not calls:
+        return {"peak_bytes_per_op": 0, "retained_bytes_per_op": 0}
+    return {"peak_bytes_per_op": sum(peaks) // len(peaks),
+            "retained_bytes_per_op": sum(retained) // len(retained)}
+
+
+def benchmark_single_queue(size: int, operation: str, max_ops: int, time_budget: float,
+                           alloc_ops: int) -> dict:
+    """
+    Benchmarks one operation on a single queue of size players.
+
+    Returns:
+        result (dict): The case name, ops/sec, latency summary and allocations.
+    """
+    samples = time_operation(create_queue(size), operation, max_ops, time_budget)
+    result = {"case": f"single/{operation}/{size}", "operation": operation, "players": size,
+              "queues": 1, "ops": len(samples), "ops_per_sec": len(samples) / sum(samples)}
+    result.update(summarise_timings(samples))
+    result.update(measure_allocations(create_queue(size), operation, alloc_ops))
+    return result
+
+
+def benchmark_many_queues(queue_count: int, queue_size: int, rounds: int) -> dict:
+    """
+    Benchmarks a mix of joins, status checks, next games, leaves and undos over many queues,
+    visiting the queues round-robin as interleaved commands from many servers would.
+
+    Returns:
+        result (dict): The case name, ops/sec, latency summary and memory held by the queues.
+    """
+    tracemalloc.start()
+    queues = [create_queue(queue_size, f"q{i}-") for i in range(queue_count)]
+    held_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples = []
+    for round_number in range(rounds):
+        for i, queue in enumerate(queues):
+            new_player = Player(f"q{i}-round{round_number}")
+            operations = [(queue.add_player, (new_player,)), (queue.print_players, ()),
+                          (queue.update_queue, ()), (queue.print_player_wait, (new_player,)),
+                          (queue.delete_player, (new_player,)), (queue.undo_command, ())]
+            for method, args in operations:
+                start = time.perf_counter()
+                method(*args)
+                samples.append(time.perf_counter() - start)
+    result = {"case": f"many/{queue_count}x{queue_size}", "operation": "mixed", "players": queue_size,
+              "queues": queue_count, "ops": len(samples), "ops_per_sec": len(samples) / sum(samples),
+              "held_bytes": held_bytes}
+    result.update(summarise_timings(samples))
+    return result
+
+
+def print_results(results: list):
+    """
+    Prints a table of benchmark results. The bytes column is the peak bytes allocated per call for
+    single queue cases, and the bytes held by all of the queues for many queue cases.
+    """
+    print(f"{'case':<36}{'ops':>7}{'ops/sec':>13}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'bytes':>12}")
+    for result in results:
+        alloc = result.get("peak_bytes_per_op", result.get("held_bytes", 0))
+        print(f"{result['case']:<36}{result['ops']:>7}{result['ops_per_sec']:>13.1f}"
+              f"{result['p50_ms']:>10.4f}{result['p95_ms']:>10.4f}{result['p99_ms']:>10.4f}{alloc:>12}")
+
+
+def compare_results(old_results: list, new_results: list, threshold: float) -> list:
+    """
+    Compares ops/sec of matching cases between two runs.
+
+    Args:
+        old_results (list): Results from an earlier run.
+        new_results (list): Results from this run.
+        threshold (float): The fractional drop in ops/sec counted as a regression, e.g. 0.1.
+
+    Returns:
+        regressions (list): The names of cases that regressed.
+    """
+    old_by_case = {result["case"]: result for result in old_results}
+    regressions = []
+    print(f"\n{'case':<36}{'old ops/sec':>13}{'new ops/sec':>13}{'change':>9}")
+    for result in new_results:
+        old = old_by_case.get(result["case"])
+        if not old:
+            continue
+        change = result["ops_per_sec"] / old["ops_per_sec"] - 1
+        flag = "  REGRESSED" if change < -threshold else ""
+        print(f"{result['case']:<36}{old['ops_per_sec']:>13.1f}{result['ops_per_sec']:>13.1f}{change:>+9.1%}{flag}")
+        if flag:
+            regressions.append(result["case"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Overwatch_Queue operations at scale.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Players in the single queue cases.")
+    parser.add_argument("--operations", nargs="+", default=OPERATIONS, choices=OPERATIONS,
+                        help="Operations to time in the single queue cases.")
+    parser.add_argument("--max-ops", type=int, default=200, help="Most timed calls per single queue case.")
+    parser.add_argument("--time-budget", type=float, default=2.0,
+                        help="Seconds after which a single queue case stops (after at least 3 calls).")
+    parser.add_argument("--alloc-ops", type=int, default=3, help="Calls traced per case for allocations.")
+    parser.add_argument("--queues", type=int, nargs="+", default=QUEUE_COUNTS,
+                        help="Numbers of queues held at once in the many queue cases.")
+    parser.add_argument("--queue-size", type=int, default=12, help="Players in each of the many queues.")
+    parser.add_argument("--rounds", type=int, default=3, help="Rounds of commands over the many queues.")
+    parser.add_argument("--json", dest="json_fpath", help="Also write the results as JSON to this file.")
+    parser.add_argument("--compare", dest="compare_fpath", help="JSON results of an earlier run to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Fractional ops/sec drop counted as a regression.")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        for operation in args.operations:
+            results.append(benchmark_single_queue(size, operation, args.max_ops, args.time_budget, args.alloc_ops))
+    for queue_count in args.queues:
+        results.append(benchmark_many_queues(queue_count, args.queue_size, args.rounds))
+
+    print_results(results)
+    if args.json_fpath:
+        write_results(args.json_fpath, "overwatch_queue", results)
+    if args.compare_fpath:
+        regressions = compare_results(read_results(args.compare_fpath)["results"], results, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
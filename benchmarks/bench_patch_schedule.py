@@ -0,0 +1,117 @@
+"""
+Offline simulation of Patch_Schedule against the fixed hourly patch check it replaced.
+
+Simulates some weeks of polling minute by minute, with a patch released on the same day and hour
+each week give or take some jitter, and reports for each schedule the requests made and how long
+each patch went unnoticed.
+
+Run from the repository root:
+    python benchmarks/bench_patch_schedule.py --weeks 26 --json bench_output.json
+"""
+
+# Standard library imports
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timezone
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "bot_code"))
+
+# Local imports
+from patch_schedule import Patch_Schedule
+from patch_scraper import PATCH_FEEDS
+from bench_utils import write_results
+
+
+WEEK = 7 * 24 * 60 * 60
+# Tuesday 5 January 2021, 18:00 UTC
+FIRST_RELEASE = datetime(2021, 1, 5, 18, tzinfo=timezone.utc).timestamp()
+
+
+class Simulated_Clock():
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Hourly_Schedule():
+    """
+    The fixed hourly check, with the same interface as Patch_Schedule.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.last_poll = None
+
+    def is_due(self) -> bool:
+        return self.last_poll is None or self.clock() >= self.last_poll + 3600
+
+    def record_poll(self, found_patch: bool):
+        self.last_poll = self.clock()
+
+
+def simulate(create_schedule, weeks: int, jitter: float, seed: int) -> dict:
+    """
+    Polls with a schedule whenever it is due, minute by minute, for some weeks of weekly releases.
+
+    Args:
+        create_schedule (callable): Takes a clock and returns the schedule to simulate.
+        weeks (int): The number of weeks to simulate.
+        jitter (float): The most seconds each release is moved from its usual time, either way.
+        seed (int): The seed for the release jitter.
+
+    Returns:
+        result (dict): The requests made, and the mean and most seconds a release went unnoticed.
+    """
+    rng = random.Random(seed)
+    releases = [FIRST_RELEASE + week * WEEK + rng.uniform(-jitter, jitter) for week in range(weeks)]
+    clock = Simulated_Clock(FIRST_RELEASE - WEEK / 2)
+    schedule = create_schedule(clock)
+    end = FIRST_RELEASE + weeks * WEEK
+    polls, latencies, next_release = 0, [], 0
+    while clock.now < end:
+        if schedule.is_due():
+            found = next_release < len(releases) and clock.now >= releases[next_release]
+            if found:
+                latencies.append(clock.now - releases[next_release])
+                next_release += 1
+            schedule.record_poll(found)
+            polls += 1
+        clock.now += 60
+    return {"requests": polls * len(PATCH_FEEDS),
+            "requests_per_day": polls * len(PATCH_FEEDS) / ((end - FIRST_RELEASE + WEEK / 2) / 86400),
+            "mean_latency_minutes": sum(latencies) / len(latencies) / 60,
+            "max_latency_minutes": max(latencies) / 60,
+            "late_half_latency_minutes": sum(latencies[len(latencies) // 2:]) / (len(latencies) - len(latencies) // 2) / 60}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate Patch_Schedule against a fixed hourly check.")
+    parser.add_argument("--weeks", type=int, default=26, help="Weeks of weekly releases to simulate.")
+    parser.add_argument("--jitter", type=float, default=1800, help="Most seconds a release moves from its usual time.")
+    parser.add_argument("--polls-per-day", type=int, default=24, help="The adaptive schedule's budget.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_fpath", help="Also write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    schedules = {"hourly": Hourly_Schedule,
+                 "adaptive": lambda clock: Patch_Schedule(polls_per_day=args.polls_per_day, clock=clock)}
+    results = []
+    print(f"{'schedule':<10}{'requests':>10}{'per day':>10}{'mean min':>10}{'max min':>10}{'late mean':>10}")
+    for name, create_schedule in schedules.items():
+        result = simulate(create_schedule, args.weeks, args.jitter, args.seed)
+        result["schedule"] = name
+        results.append(result)
+        print(f"{name:<10}{result['requests']:>10}{result['requests_per_day']:>10.1f}"
+              f"{result['mean_latency_minutes']:>10.1f}{result['max_latency_minutes']:>10.1f}"
+              f"{result['late_half_latency_minutes']:>10.1f}")
+    if args.json_fpath:
+        write_results(args.json_fpath, "patch_schedule", results)
+
+
+if __name__ == "__main__":
+    main()
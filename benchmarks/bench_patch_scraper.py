@@ -0,0 +1,142 @@
+"""
+Offline benchmark for Overwatch_Patch_Scraper.
+
+Serves the saved patch pages from tests/fixtures/patch_pages on a local stand-in site and times
+each stage of turning a patch page into Discord messages:
+
+    fetch   Downloading the patch notes page.
+    parse   Parsing the page into patches.
+    render  Writing the latest patch as a Discord-friendly string.
+    chunk   Splitting that string into messages under 2000 characters.
+
+Peak memory for the whole pipeline is measured separately with tracemalloc, so that tracing does
+not slow down the timed runs.
+
+Run from the repository root:
+    python benchmarks/bench_patch_scraper.py --iterations 50 --json bench_output.json
+"""
+
+# Standard library imports
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "bot_code"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "tests"))
+
+# Local imports
+from patch_scraper import Overwatch_Patch_Scraper
+from patch_site import Fake_Patch_Site
+from bench_utils import summarise_timings, write_results
+
+
+PAGES = ["generic.html", "hero.html", "unknown.html"]
+STAGES = ["fetch", "parse", "render", "chunk"]
+
+
+def run_pipeline(scraper: Overwatch_Patch_Scraper, url: str, timings: dict = None) -> list:
+    """
+    Runs fetch, parse, render and chunk once, optionally recording each stage's time in seconds.
+
+    Args:
+        scraper (Overwatch_Patch_Scraper): The scraper to benchmark.
+        url (str): The url of the patch notes page.
+        timings (dict): A dict of stage name to list of times to append to, or None.
+
+    Returns:
+        messages (list): The messages produced.
+    """
+    start = time.perf_counter()
+    page_text = scraper.fetch_patches_page(url)
+    fetched = time.perf_counter()
+    latest_patch = scraper.parse_patches(page_text)[0]
+    parsed = time.perf_counter()
+    patch_note_string = scraper.write_patch_notes(latest_patch)
+    rendered = time.perf_counter()
+    messages = scraper.create_messages(patch_note_string)
+    chunked = time.perf_counter()
+    if timings is not None:
+        timings["fetch"].append(fetched - start)
+        timings["parse"].append(parsed - fetched)
+        timings["render"].append(rendered - parsed)
+        timings["chunk"].append(chunked - rendered)
+    return messages
+
+
+def benchmark_page(scraper: Overwatch_Patch_Scraper, site: Fake_Patch_Site, page: str,
+                   iterations: int, warmup: int) -> dict:
+    """
+    Benchmarks the pipeline on one saved patch page.
+
+    Returns:
+        result (dict): Timings per stage in milliseconds, peak memory in bytes and message count.
+    """
+    site.set_page("/live", page)
+    url = site.url("/live")
+    for _ in range(warmup):
+        run_pipeline(scraper, url)
+
+    timings = {stage: [] for stage in STAGES}
+    for _ in range(iterations):
+        run_pipeline(scraper, url, timings)
+
+    tracemalloc.start()
+    messages = run_pipeline(scraper, url)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {"page": page, "iterations": iterations, "messages": len(messages),
+              "peak_memory_bytes": peak_memory, "stages": {}}
+    for stage, samples in timings.items():
+        result["stages"][stage] = summarise_timings(samples)
+    return result
+
+
+def print_results(results: list):
+    """
+    Prints a table of benchmark results.
+    """
+    print(f"{'page':<14}{'stage':<8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for result in results:
+        for stage in STAGES:
+            timing = result["stages"][stage]
+            print(f"{result['page']:<14}{stage:<8}{timing['mean_ms']:>10.3f}{timing['p50_ms']:>10.3f}"
+                  f"{timing['p95_ms']:>10.3f}{timing['max_ms']:>10.3f}")
+        print(f"{result['page']:<14}peak memory {result['peak_memory_bytes'] / 1024:.1f} KiB, "
+              f"{result['messages']} message(s)\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Overwatch_Patch_Scraper on saved patch pages.")
+    parser.add_argument("--iterations", type=int, default=20, help="Timed runs per page.")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed runs per page before timing.")
+    parser.add_argument("--pages", nargs="+", default=PAGES, help="Saved pages to benchmark.")
+    parser.add_argument("--json", dest="json_fpath", help="Also write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    site = Fake_Patch_Site().start()
+    cwd = os.getcwd()
+    try:
+        # The scraper stores each feed's latest patch in the database in ./db, so keep that out of the repository.
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            scraper = Overwatch_Patch_Scraper(live_patches_url=site.url("/live"),
+                                              experimental_patches_url=site.url("/experimental"))
+            results = [benchmark_page(scraper, site, page, args.iterations, args.warmup)
+                       for page in args.pages]
+            os.chdir(cwd)
+    finally:
+        os.chdir(cwd)
+        site.stop()
+
+    print_results(results)
+    if args.json_fpath:
+        write_results(args.json_fpath, "patch_scraper", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Common functions for the benchmark scripts - summarising timings and reading/writing results.
+"""
+
+# Standard library imports
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples: list, pct: float) -> float:
+    """
+    Returns the pct percentile of samples, using the nearest-rank method.
+
+    Args:
+        samples (list): The samples to take the percentile of.
+        pct (float): The percentile, between 0 and 100.
+
+    Returns:
+        value (float): The sample at that percentile.
+    """
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarise_timings(samples: list) -> dict:
+    """
+    Summarises a list of timings in seconds as a mean, percentiles and max in milliseconds.
+
+    Args:
+        samples (list): Timings in seconds.
+
+    Returns:
+        summary (dict): The mean_ms, p50_ms, p95_ms, p99_ms and max_ms of the samples.
+    """
+    return {"mean_ms": 1000 * sum(samples) / len(samples),
+            "p50_ms": 1000 * percentile(samples, 50),
+            "p95_ms": 1000 * percentile(samples, 95),
+            "p99_ms": 1000 * percentile(samples, 99),
+            "max_ms": 1000 * max(samples)}
+
+
+def git_commit() -> str:
+    """
+    Gets the short hash of the checked out commit, so results can be compared between commits.
+
+    Returns:
+        commit (str): The short commit hash, or 'unknown' if git is unavailable.
+    """
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True)
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_results(fpath: str, benchmark: str, results: list):
+    """
+    Writes benchmark results as JSON, along with the commit and machine they were taken on.
+
+    Args:
+        fpath (str): The file to write to.
+        benchmark (str): The name of the benchmark.
+        results (list): The list of result dicts.
+    """
+    output = {"benchmark": benchmark,
+              "commit": git_commit(),
+              "python": platform.python_version(),
+              "machine": platform.platform(),
+              "time": datetime.now().isoformat(timespec="seconds"),
+              "results": results}
+    with open(fpath, "w") as f:
+        json.dump(output, f, indent=2)
+
+
+def read_results(fpath: str) -> dict:
+    """
+    Reads benchmark results written by write_results.
+
+    Args:
+        fpath (str): The file to read from.
+
+    Returns:
+        output (dict): The benchmark output, with its results under 'results'.
+    """
+    with open(fpath, "r") as f:
+        return json.load(f)
@@ -0,0 +1,445 @@
+"""
+Offline replay of queue command streams, to reproduce queue bugs and load test the bot.
+
+Replays commands recorded by the bot (see COMMAND_RECORDING_DIR in the README), or a synthetic
+stream of commands over many queues, through one of two engines:
+
+    bot     The bot's command handlers from create_bot, invoked with fake Discord contexts, so
+            argument parsing, hooks, storage and status messages are all included.
+    queue   Overwatch_Queue directly, applying each command as the bot's handler would, to time
+            the queue alone.
+
+Replays are deterministic: each guild's queues start from their recorded state (or empty) and run
+their commands in the recorded order, each on the queue its channel uses and with the guild's
+settings when it was recorded. The throughput and latency of each command are reported, along
+with the differences between the final queues and those expected - from another engine, or from
+a state file saved by an earlier replay.
+
+Run from the repository root:
+    python benchmarks/replay_commands.py db/recordings --save-state expected.json
+    python benchmarks/replay_commands.py db/recordings --expect-state expected.json
+    python benchmarks/replay_commands.py --synthetic 20000 --guilds 200 --engine both
+"""
+
+# Standard library imports
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Third party imports
+from discord.ext.commands import CommandInvokeError
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "bot_code"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "tests"))
+
+# Local imports
+from command_recorder import read_recording
+from guild_queue import DEFAULT_QUEUE_NAME, Guild_Queue, QUEUE_NAME_PATTERN, STATUS_PAGE_SIZE
+from guild_settings import Guild_Settings
+from overwatch_queue import Player, Overwatch_Queue
+from patch_scraper import Overwatch_Patch_Scraper
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+from patch_site import Fake_Patch_Site
+from bench_utils import summarise_timings, write_results
+
+
+ENGINES = ["bot", "queue"]
+# Relative frequencies of the commands in synthetic streams.
+COMMAND_WEIGHTS = {"!join": 30, "!status": 20, "!next": 10, "!wait": 10, "!leave": 8, "!delay": 5,
+                   "!rejoin": 5, "!status me": 3, "!undo": 3, "!add": 3, "!kick": 3, "!queue": 4,
+                   "!leave all": 2, "!queues": 1, "!game": 1, "!end": 1}
+# The queues synthetic '!queue <name>' commands choose between.
+QUEUE_NAMES = (DEFAULT_QUEUE_NAME, "ow1")
+
+
+def generate_commands(count: int, guild_count: int, players_per_guild: int, seed: int = 0) -> dict:
+    """
+    Generates a random but reproducible stream of commands spread over guild_count guilds, each
+    with two channels that can choose between the QUEUE_NAMES queues.
+
+    Args:
+        count (int): The total number of commands.
+        guild_count (int): The number of guilds.
+        players_per_guild (int): The number of different players using each queue.
+        seed (int): The random seed.
+
+    Returns:
+        streams (dict): For each guild id, a tuple of the starting state (None) and its commands.
+    """
+    rng = random.Random(seed)
+    guild_ids = [(i + 1) << 22 for i in range(guild_count)]
+    streams = {guild_id: (None, []) for guild_id in guild_ids}
+    names, weights = list(COMMAND_WEIGHTS), list(COMMAND_WEIGHTS.values())
+    for i in range(count):
+        guild_id = rng.choice(guild_ids)
+        player = rng.randrange(players_per_guild)
+        content = rng.choices(names, weights)[0]
+        if content in ("!add", "!kick"):
+            content += f" player{rng.randrange(players_per_guild)}"
+        elif content == "!game":
+            content += f" {rng.choice((1, 2))}"
+        elif content == "!queue" and rng.random() < 0.5:
+            content += f" {rng.choice(QUEUE_NAMES)}"
+        channel_id = guild_id + 1 + players_per_guild * rng.randrange(2)
+        streams[guild_id][1].append({"time": float(i), "guild_id": guild_id, "channel_id": channel_id,
+                                     "author": f"player{player}", "author_id": guild_id + 2 + player,
+                                     "content": content})
+    return streams
+
+
+def load_recordings(fpaths: list) -> dict:
+    """
+    Loads recording files, or every recording file in folders, written by Command_Recorder.
+
+    Returns:
+        streams (dict): For each guild id, a tuple of the starting state and its commands.
+    """
+    recording_fpaths = []
+    for fpath in fpaths:
+        if os.path.isdir(fpath):
+            recording_fpaths.extend(os.path.join(fpath, fname) for fname in sorted(os.listdir(fpath))
+                                    if fname.endswith(".jsonl"))
+        else:
+            recording_fpaths.append(fpath)
+    streams = {}
+    for fpath in recording_fpaths:
+        state, commands = read_recording(fpath)
+        if commands:
+            streams[commands[0]["guild_id"]] = (state, commands)
+    return streams
+
+
+def merge_streams(streams: dict) -> list:
+    """
+    Merges the guilds' command streams into one, in the order they were sent.
+    """
+    return sorted((command for _, commands in streams.values() for command in commands),
+                  key=lambda command: command["time"])
+
+
+def queue_state(queue: Overwatch_Queue) -> dict:
+    """
+    Gets the state of a queue to compare between replays, leaving out when it was created,
+    the session's timings, the game clock and players' Discord user ids, but keeping the games
+    each player has played.
+    """
+    state = queue.to_dict()
+    del state["start_time"]
+    del state["game_clock"]
+    for player in state["players"]:
+        del player["user_id"]
+    session = state.pop("session")
+    state["games_completed"] = session["games_completed"]
+    state["games_played"] = {player["name"]: queue.session.get_player_totals(player["name"])["games_played"]
+                             for player in session["players"]}
+    return state
+
+
+def guild_state(guild_queue: Guild_Queue) -> dict:
+    """
+    Gets the state of a guild's queues to compare between replays: each queue's state from
+    queue_state, keyed by '<queue name>.<key>', and the queue each channel uses.
+    """
+    state = {f"{name}.{key}": value for name, queue in sorted(guild_queue.queues.items())
+             for key, value in queue_state(queue).items()}
+    state["channel_queues"] = {str(channel_id): name for channel_id, name in sorted(guild_queue.channel_queues.items())}
+    return state
+
+
+def diff_states(expected: dict, actual: dict) -> list:
+    """
+    Compares the final queues of two replays.
+
+    Args:
+        expected (dict): The expected state of each guild's queue, keyed by guild id.
+        actual (dict): The replayed state of each guild's queue, keyed by guild id.
+
+    Returns:
+        differences (list): A line describing each difference, empty if the queues all match.
+    """
+    differences = []
+    for guild_id in sorted(set(expected) | set(actual), key=int):
+        expected_state, actual_state = expected.get(guild_id), actual.get(guild_id)
+        if expected_state is None or actual_state is None:
+            differences.append(f"{guild_id}: queue expected {'to exist' if actual_state is None else 'not to exist'}")
+            continue
+        for key in sorted(set(expected_state) | set(actual_state)):
+            if expected_state.get(key) != actual_state.get(key):
+                differences.append(f"{guild_id}: {key} expected {expected_state.get(key)}, "
+                                   f"got {actual_state.get(key)}")
+    return differences
+
+
+def apply_to_queue(guild_queue: Guild_Queue, command: dict):
+    """
+    Applies a recorded command to a guild's queues as the bot's command handler would, without Discord.
+    The command runs on the queue its channel uses, with the guild's settings when it was recorded.
+    Commands that do not change the queues, and those not starting with the guild's prefix, are ignored.
+
+    Args:
+        guild_queue (Guild_Queue): The guild's queues to apply the command to.
+        command (dict): The recorded command, from read_recording or generate_commands.
+    """
+    settings = Guild_Settings.from_dict(command.get("settings", {}))
+    content, author, channel_id = command["content"], command["author"], command["channel_id"]
+    if not content.startswith(settings.prefix) or not content[len(settings.prefix):].split():
+        return
+    name, *args = content[len(settings.prefix):].split()
+    arg = args[0] if args else ""
+    guild_queue.select_queue(channel_id)
+    if name == "queue" and arg:
+        if not QUEUE_NAME_PATTERN.match(arg.lower()):
+            return
+        if arg.lower() != guild_queue.queue_name:
+            guild_queue.use_queue(channel_id, arg.lower(), mode=settings.mode)
+    queue = guild_queue.queue
+    player = queue.find_player(author)
+    if name in ("queue", "join"):
+        if not player:
+            queue.add_player(Player(author))
+    elif name == "add" and args:
+        queue.add_players([Player(player_name) for player_name in dict.fromkeys(args)])
+    elif name == "game" and arg in ("1", "2"):
+        queue.set_mode(int(arg))
+    elif name == "undo":
+        queue.undo_command()
+    elif name == "leave" and arg == "all":
+        for queue_name in guild_queue.get_player_queues(author):
+            guild_queue.queues[queue_name].delete_player(guild_queue.queues[queue_name].find_player(author))
+    elif not queue.players:
+        return
+    elif name == "leave" and player:
+        queue.delete_player(player)
+    elif name == "kick" and args:
+        matches = [queue.resolve_player(player_name) for player_name in dict.fromkeys(args)]
+        queue.delete_players(list(dict.fromkeys(found[0] for found in matches if len(found) == 1)))
+    elif name == "next":
+        queue.update_queue(max_swaps=settings.swaps)
+    elif name == "status" and arg == "me":
+        if player:
+            guild_queue.get_queue_status(queue.find_player_page(player, STATUS_PAGE_SIZE))
+    elif name == "status":
+        guild_queue.get_queue_status(int(arg) if arg.isdigit() else 1)
+    elif name == "wait" and player:
+        queue.print_player_wait(player)
+    elif name == "delay" and player and not player.delaying:
+        queue.delay_player(player)
+    elif name == "rejoin" and player and player.delaying:
+        queue.rejoin_player(player)
+    elif name == "end":
+        queue.empty_queue()
+        guild_queue.remove_queue(guild_queue.queue_name)
+
+
+def replay_through_queue(streams: dict) -> tuple:
+    """
+    Replays the streams directly on each guild's Guild_Queue and its Overwatch_Queues.
+
+    Returns:
+        timings (dict): The times in seconds taken by each command, keyed by command name.
+        final_states (dict): The state of each guild's queues after the replay, keyed by guild id.
+    """
+    guild_queues = {}
+    for guild_id, (state, _) in streams.items():
+        guild_queues[guild_id] = (Guild_Queue.from_dict(guild_id, state) if state is not None
+                                  else Guild_Queue(guild_id))
+    timings = {}
+    for command in merge_streams(streams):
+        guild_queue = guild_queues[command["guild_id"]]
+        start = time.perf_counter()
+        apply_to_queue(guild_queue, command)
+        # As after every queue command in the bot, so '!leave all' finds each player's queues.
+        guild_queue.update_index()
+        timings.setdefault(command["content"].split()[0], []).append(time.perf_counter() - start)
+    final_states = {str(guild_id): guild_state(guild_queue) for guild_id, guild_queue in guild_queues.items()}
+    return timings, final_states
+
+
+async def replay_through_bot(streams: dict, scraper: Overwatch_Patch_Scraper, parallel_guilds: bool = False) -> tuple:
+    """
+    Replays the streams through the bot's command handlers with fake Discord contexts, each command
+    with the guild's settings when it was recorded.
+    Must be run with the working directory set to a scratch folder, as the bot writes its database there.
+
+    Args:
+        streams (dict): For each guild id, a tuple of the starting state and its commands.
+        scraper (Overwatch_Patch_Scraper): The patch scraper to give the bot.
+        parallel_guilds (bool): Whether to replay each guild's commands alongside the others', as
+            the bot would receive them from many servers at once, rather than one command at a time.
+
+    Returns:
+        timings (dict): The times in seconds taken by each command, keyed by command name.
+        final_states (dict): The state of each guild's queues after the replay, keyed by guild id.
+
+    Raises:
+        RuntimeError: If any command raised an error, as the queue engine would.
+    """
+    discord_bot = importlib.import_module("discord_bot")
+    bot = discord_bot.create_bot(scraper=scraper)
+    bot.recorder = None
+    # Never post status messages during the replay, so only the commands are timed.
+    bot.status_debounce = 3600
+    for guild_id, (state, _) in streams.items():
+        if state is not None:
+            await discord_bot.db.save_queue(guild_id, state)
+        else:
+            await discord_bot.db.delete_queue(guild_id)
+
+    channels, authors, timings = {}, {}, {}
+    # Commands that raised, which the bot reports and carries on from, but a replay must not.
+    crashes = []
+
+    async def record_crash(ctx, error):
+        if isinstance(error, CommandInvokeError):
+            crashes.append(f"{ctx.message.content}: {type(error.original).__name__}: {error.original}")
+    bot.add_listener(record_crash, "on_command_error")
+
+    async def replay_command(command):
+        channel_key = (command["guild_id"], command["channel_id"])
+        if channel_key not in channels:
+            channels[channel_key] = Fake_Channel(command["channel_id"], guild=Fake_Guild(command["guild_id"]))
+        if command["author_id"] not in authors:
+            authors[command["author_id"]] = Fake_Author(command["author"], command["author_id"])
+        bot.settings.cache[command["guild_id"]] = Guild_Settings.from_dict(command.get("settings", {}))
+        start = time.perf_counter()
+        await invoke_command(bot, authors[command["author_id"]], channels[channel_key], command["content"])
+        timings.setdefault(command["content"].split()[0], []).append(time.perf_counter() - start)
+
+    async def replay_guild(commands):
+        for command in commands:
+            await replay_command(command)
+
+    if parallel_guilds:
+        await asyncio.gather(*(replay_guild(commands) for _, commands in streams.values()))
+    else:
+        await replay_guild(merge_streams(streams))
+    # Let the error handlers dispatched for the last commands run.
+    await asyncio.sleep(0)
+    if crashes:
+        raise RuntimeError(f"{len(crashes)} command(s) raised during the replay, the first: {crashes[0]}")
+
+    final_states = {}
+    for guild_id in streams:
+        guild_queue = bot.guild_queues.get(guild_id)
+        if guild_queue is not None:
+            final_states[str(guild_id)] = guild_state(guild_queue)
+            await guild_queue.status_message.close()
+    return timings, final_states
+
+
+def run_bot_replay(streams: dict, parallel_guilds: bool = False) -> tuple:
+    """
+    Replays the streams through the bot, with a local stand-in for the patch notes site.
+    Must be run with the working directory set to a scratch folder, as the bot writes its database there.
+
+    Returns:
+        timings (dict): The times in seconds taken by each command, keyed by command name.
+        final_states (dict): The state of each guild's queues after the replay, keyed by guild id.
+    """
+    patch_site = Fake_Patch_Site().start()
+    try:
+        scraper = Overwatch_Patch_Scraper(live_patches_url=patch_site.url("/live"),
+                                          experimental_patches_url=patch_site.url("/experimental"))
+        return asyncio.run(replay_through_bot(streams, scraper, parallel_guilds))
+    finally:
+        patch_site.stop()
+
+
+def summarise_replay(engine: str, timings: dict) -> dict:
+    """
+    Summarises a replay's throughput and the latency of each command.
+
+    Returns:
+        result (dict): The engine, commands run, commands/sec, and a latency summary per command.
+    """
+    samples = [seconds for command_samples in timings.values() for seconds in command_samples]
+    result = {"engine": engine, "commands": len(samples),
+              "commands_per_sec": len(samples) / sum(samples) if samples else 0.0,
+              "by_command": {command: dict(count=len(command_samples), **summarise_timings(command_samples))
+                             for command, command_samples in sorted(timings.items())}}
+    if samples:
+        result.update(summarise_timings(samples))
+    return result
+
+
+def print_result(result: dict):
+    print(f"\n{result['engine']}: {result['commands']} commands, {result['commands_per_sec']:.1f} commands/sec")
+    print(f"{'command':<14}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for command, summary in result["by_command"].items():
+        print(f"{command:<14}{summary['count']:>8}{summary['mean_ms']:>10.4f}{summary['p50_ms']:>10.4f}"
+              f"{summary['p95_ms']:>10.4f}{summary['p99_ms']:>10.4f}")
+
+
+def print_differences(title: str, differences: list):
+    print(f"\n{title}: {len(differences)} difference(s)")
+    for difference in differences:
+        print(f"\t{difference}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded or synthetic queue commands offline.")
+    parser.add_argument("recordings", nargs="*", help="Recording files, or folders of them, to replay.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Replay this many generated commands instead.")
+    parser.add_argument("--guilds", type=int, default=100, help="Queues the generated commands are spread over.")
+    parser.add_argument("--players", type=int, default=15, help="Players using each generated queue.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the generated commands.")
+    parser.add_argument("--engine", choices=ENGINES + ["both"], default="bot",
+                        help="What to replay the commands through. 'both' also compares their final queues.")
+    parser.add_argument("--parallel-guilds", action="store_true",
+                        help="Replay each guild's commands alongside the others' through the bot.")
+    parser.add_argument("--save-state", dest="save_state_fpath", help="Write the final queues to this file.")
+    parser.add_argument("--expect-state", dest="expect_state_fpath",
+                        help="Compare the final queues against those saved in this file.")
+    parser.add_argument("--json", dest="json_fpath", help="Also write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        streams = generate_commands(args.synthetic, args.guilds, args.players, args.seed)
+    elif args.recordings:
+        streams = load_recordings(list(args.recordings))
+    else:
+        parser.error("give recordings to replay, or --synthetic")
+
+    # Paths are used from the scratch folder the bot runs in.
+    args.save_state_fpath = args.save_state_fpath and os.path.abspath(args.save_state_fpath)
+    args.expect_state_fpath = args.expect_state_fpath and os.path.abspath(args.expect_state_fpath)
+    args.json_fpath = args.json_fpath and os.path.abspath(args.json_fpath)
+
+    results, final_states = [], {}
+    for engine in (ENGINES if args.engine == "both" else [args.engine]):
+        if engine == "bot":
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                os.chdir(tmp_dir)
+                timings, final_states[engine] = run_bot_replay(streams, args.parallel_guilds)
+                os.chdir(ROOT_DIR)
+        else:
+            timings, final_states[engine] = replay_through_queue(streams)
+        results.append(summarise_replay(engine, timings))
+        print_result(results[-1])
+
+    differences = []
+    if args.engine == "both":
+        print_differences("bot against queue", diff_states(final_states["bot"], final_states["queue"]))
+    final_state = final_states["bot" if args.engine == "both" else args.engine]
+    if args.expect_state_fpath:
+        with open(args.expect_state_fpath, "r") as f:
+            differences = diff_states(json.load(f), final_state)
+        print_differences(f"against {args.expect_state_fpath}", differences)
+    if args.save_state_fpath:
+        with open(args.save_state_fpath, "w") as f:
+            json.dump(final_state, f, indent=2, sort_keys=True)
+    if args.json_fpath:
+        write_results(args.json_fpath, "replay_commands", results)
+    if differences:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
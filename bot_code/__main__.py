@@ -1,11 +1,20 @@
 from dotenv import load_dotenv
 from discord_bot import create_bot
+from patch_schedule import DEFAULT_POLLS_PER_DAY
+from sharding import run_shards
 from os import getenv
 
-# Load in Discord token.
+# Load in Discord token, and how many processes (shards) to split the bot's guilds between.
 load_dotenv()
 TOKEN = getenv('DISCORD_TOKEN')
+SHARD_COUNT = int(getenv('SHARD_COUNT', '1'))
+# The most polls of the patch notes site to plan for in a day, each one request per feed.
+PATCH_POLLS_PER_DAY = int(getenv('PATCH_POLLS_PER_DAY', str(DEFAULT_POLLS_PER_DAY)))
 
-# Create bot and run.
-bot = create_bot()
-bot.run(TOKEN)
\ No newline at end of file
+# Create bot and run. Shard processes import this module too, so only start the bot when run directly.
+if __name__ == '__main__':
+    if SHARD_COUNT > 1:
+        run_shards(TOKEN, SHARD_COUNT, PATCH_POLLS_PER_DAY)
+    else:
+        bot = create_bot(patch_polls_per_day=PATCH_POLLS_PER_DAY)
+        bot.run(TOKEN)
\ No newline at end of file
@@ -1,3 +1,7 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import regex
 import over_stats
 
@@ -13,7 +17,6 @@ class Battlenet_Account():
         self.name = name
         self.error = ''
         self.valid_battletag = self.validate_battletag()
-        self.public_check = self.public_lookup()
 
     def validate_battletag(self) -> bool:
         """
@@ -28,17 +31,167 @@ class Battlenet_Account():
             self.error += 'Incorrect battle tag format ensure you have include the # and the number following it.\n' 
             return False
 
-    async def public_lookup(self) -> bool:
+    async def public_lookup(self, fetcher: "Profile_Fetcher") -> bool:
         """
-        Checks the account is publicly availible so that stats can be scraped
+        Checks the account is publicly availible so that stats can be scraped.
+        The profile is fetched in a thread by fetcher, so the bot is not held up while it loads.
         """
-        if(self.valid_battletag):
-            player_data = over_stats.PlayerProfile(self.name)
-            # hacky way of determining if profile is public or not checks for prescence of game mode stats should have qp and comp if private will be empty list
-            public = not (len(player_data.modes()) == 0)
-            if not public:
-                self.error += 'Could not find profile, ensure that it public.\n'
+        if not self.valid_battletag:
+            return False
+        try:
+            player_data = await fetcher.fetch_profile(self.name)
+        except asyncio.TimeoutError:
+            self.error += 'Timed out looking up the profile, try again in a minute.\n'
+            return False
+        # hacky way of determining if profile is public or not checks for prescence of game mode stats should have qp and comp if private will be empty list
+        public = not (len(player_data.modes()) == 0)
+        if not public:
+            self.error += 'Could not find profile, ensure that it public.\n'
         return public
-    
 
 
+def load_player_profile(battletag: str) -> over_stats.PlayerProfile:
+    """
+    Downloads and parses a player's profile. Slow and blocking, so run it in a thread.
+    """
+    profile = over_stats.PlayerProfile(battletag)
+    profile.load_data()
+    return profile
+
+
+class Profile_Fetcher():
+    """
+    Fetches many players' profiles at once, sharing a cache of recently fetched profiles.
+
+    Profiles are scraped in threads, at most concurrency at a time, and a fetch taking longer than
+    timeout seconds, including any wait for a free slot, is given up on so a batch is never held up
+    by one slow profile. A profile being fetched is shared with anyone else asking for it rather
+    than fetched twice.
+    """
+
+    def __init__(self, concurrency: int = 4, timeout: float = 15.0, cache_ttl: float = 600.0,
+                 load_profile=load_player_profile):
+        """
+        Initialise a Profile_Fetcher with an empty cache.
+
+        Args:
+            concurrency (int): The most profiles scraped at once.
+            timeout (float): Seconds to wait for a profile before giving up on it.
+            cache_ttl (float): Seconds a fetched profile is reused for.
+            load_profile (callable): Function taking a battletag and returning its loaded profile.
+        """
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.load_profile = load_profile
+        self.cache = {}
+        self.fetch_count = 0
+        self.__executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="profile-fetch")
+        self.__slots = None
+        self.__in_flight = {}
+
+    async def fetch_profile(self, battletag: str):
+        """
+        Gets a player's profile from the cache, or fetches it.
+
+        Args:
+            battletag (str): The player's battletag, e.g. Name#1234.
+
+        Returns:
+            over_stats.PlayerProfile
+
+        Raises:
+            asyncio.TimeoutError: If the profile took longer than timeout to fetch.
+        """
+        cached = self.cache.get(battletag)
+        if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+            return cached[1]
+        fetch = self.__in_flight.get(battletag)
+        if fetch is None:
+            fetch = self.__in_flight[battletag] = asyncio.ensure_future(self.__fetch(battletag))
+            fetch.add_done_callback(lambda _: self.__in_flight.pop(battletag, None))
+        # Shielded so one caller giving up does not cancel the fetch for the others.
+        return await asyncio.shield(fetch)
+
+    async def fetch_profiles(self, battletags: list) -> tuple:
+        """
+        Fetches many players' profiles at once, returning those that could be fetched.
+
+        Args:
+            battletags (list): The players' battletags.
+
+        Returns:
+            profiles (dict): The profile of each battletag fetched.
+            errors (dict): The reason each other battletag could not be fetched.
+        """
+        battletags = list(dict.fromkeys(battletags))
+        results = await asyncio.gather(*(self.fetch_profile(battletag) for battletag in battletags),
+                                       return_exceptions=True)
+        profiles, errors = {}, {}
+        for battletag, result in zip(battletags, results):
+            if isinstance(result, asyncio.TimeoutError):
+                errors[battletag] = "timed out"
+            elif isinstance(result, Exception):
+                errors[battletag] = f"{type(result).__name__}: {result}"
+            else:
+                profiles[battletag] = result
+        return profiles, errors
+
+    async def fetch_player_profiles(self, storage, discord_names: list) -> tuple:
+        """
+        Fetches the profiles of the battletags linked to discord users, e.g. everyone in a queue.
+
+        Args:
+            storage (Storage): The storage the battletags are linked in.
+            discord_names (list): The discord names of the players.
+
+        Returns:
+            profiles (dict): The profile of each discord name whose profile was fetched.
+            errors (dict): The reason each other discord name's profile could not be fetched.
+        """
+        battletags = await storage.get_battletags(discord_names)
+        profiles, errors = await self.fetch_profiles(list(battletags.values()))
+        player_profiles, player_errors = {}, {}
+        for discord_name in discord_names:
+            battletag = battletags.get(discord_name)
+            if battletag is None:
+                player_errors[discord_name] = "no linked battle net account"
+            elif battletag in profiles:
+                player_profiles[discord_name] = profiles[battletag]
+            else:
+                player_errors[discord_name] = errors[battletag]
+        return player_profiles, player_errors
+
+    async def __fetch(self, battletag: str):
+        """
+        Private function. Scrapes a profile in a thread, once a slot is free, and caches it.
+        Called in fetch_profile.
+
+        The timeout covers waiting for a slot too, so a fetch queued behind scrapes that never
+        return is given up on like one that is slow itself.
+        """
+        if self.__slots is None:
+            self.__slots = asyncio.Semaphore(self.concurrency)
+        return await asyncio.wait_for(self.__scrape(battletag), self.timeout)
+
+    async def __scrape(self, battletag: str):
+        """
+        Private function. Waits for a slot, then scrapes a profile in a thread.
+        Called in __fetch.
+        """
+        await self.__slots.acquire()
+        self.fetch_count += 1
+        scrape = asyncio.get_running_loop().run_in_executor(self.__executor, self.load_profile, battletag)
+        # The slot is only freed when the scrape finishes, even if it is given up on, as the thread
+        # cannot be stopped - otherwise slow scrapes could pile up past the concurrency cap.
+        scrape.add_done_callback(lambda _: self.__slots.release())
+        scrape.add_done_callback(lambda future: self.__cache_profile(battletag, future))
+        return await asyncio.shield(scrape)
+
+    def __cache_profile(self, battletag: str, scrape: asyncio.Future):
+        """
+        Private function. Caches a scraped profile, including one that finished after being given up on.
+        Called when a scrape in __fetch finishes.
+        """
+        if not scrape.cancelled() and scrape.exception() is None:
+            self.cache[battletag] = (time.monotonic(), scrape.result())
@@ -0,0 +1,104 @@
+"""
+Class for recording the stream of commands each guild's queues receive, so they can be replayed offline.
+
+Each guild's commands are appended to their own JSON lines file, in the order its queues ran them.
+The first line written for a guild by a recorder holds the state of all its queues before the
+first recorded command, so a replay can start from where the queues were rather than from empty.
+Each command is recorded with the channel it was sent in, which chooses the queue it runs on, and
+the guild's settings when it ran, which give its prefix and how many players !next swaps.
+"""
+
+# Standard library imports
+import json
+import os
+import time
+
+
+class Command_Recorder():
+    """
+    Appends the commands each guild's queues run to a file per guild.
+
+    Attributes:
+        directory (str): The folder the recordings are written to.
+        recorded_queues (set): The ids of the guilds whose queues' starting state has been recorded.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Initialise a recorder, creating its folder if needed.
+
+        Args:
+            directory (str): The folder to write the recordings to.
+        """
+        self.directory = directory
+        self.recorded_queues = set()
+        os.makedirs(directory, exist_ok=True)
+
+
+    def get_recording_fpath(self, guild_id: int) -> str:
+        """
+        Gets the file a guild's commands are recorded to.
+
+        Args:
+            guild_id (int): The id of the guild, or of the channel for direct messages.
+
+        Returns:
+            fpath (str): The path of the recording file.
+        """
+        return os.path.join(self.directory, f"{guild_id}.jsonl")
+
+
+    def record(self, ctx, guild_queue, settings):
+        """
+        Records a command about to be run on a guild's queues.
+
+        Args:
+            ctx (commands.Context): The context the command was invoked with.
+            guild_queue (Guild_Queue): The guild's queues, whose state is recorded before its first recorded command.
+            settings (Guild_Settings): The guild's settings the command runs with.
+        """
+        guild_id = guild_queue.guild_id
+        lines = []
+        if guild_id not in self.recorded_queues:
+            self.recorded_queues.add(guild_id)
+            lines.append({"guild_id": guild_id, "state": guild_queue.to_dict()})
+        lines.append({"time": time.time(),
+                      "guild_id": guild_id,
+                      "channel_id": ctx.channel.id,
+                      "author": ctx.message.author.name,
+                      "author_id": ctx.message.author.id,
+                      "content": ctx.message.content,
+                      "settings": settings.to_dict()})
+        with open(self.get_recording_fpath(guild_id), "a") as f:
+            f.writelines(json.dumps(line) + "\n" for line in lines)
+
+
+
+def read_recording(fpath: str) -> tuple:
+    """
+    Reads a recording file written by Command_Recorder.
+
+    If the file was appended to by several runs of the bot, the starting state is the first one
+    recorded.
+
+    Args:
+        fpath (str): The path of the recording file.
+
+    Returns:
+        state (dict): The state of the guild's queues before the first command, from Guild_Queue.to_dict,
+            or of its one queue in recordings made before named queues, or None if not recorded.
+        commands (list): The recorded commands, as dicts, in the order they ran.
+    """
+    state = None
+    commands = []
+    with open(fpath, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "state" in record:
+                if state is None:
+                    state = record["state"]
+            else:
+                commands.append(record)
+    return state, commands
@@ -3,14 +3,29 @@ Discord bot to implement the Overwatch Queue from overwatch_order.py.
 """
 
 # Standard library imports.
+import asyncio
+import functools
+import gc
 import os
-from pathlib import Path
+import time
+import traceback
 
 # Local import
-from overwatch_queue import Player, Overwatch_Queue
-from battlenet_interface import Battlenet_Account
-from patch_scraper import Overwatch_Patch_Scraper
+from overwatch_queue import Player, join_names
+from battlenet_interface import Battlenet_Account, Profile_Fetcher
+from command_recorder import Command_Recorder
+from dispatcher import Outbound_Dispatcher, REPLY, BROADCAST
+from guild_settings import Settings_Store
+from guild_queue import Guild_Queue, STATUS_PAGE_SIZE, DEFAULT_QUEUE_NAME, QUEUE_NAME_PATTERN, get_no_queue_response
+from metrics import Bot_Metrics, get_resident_memory
+from name_index import parse_mention
+from sharding import get_instance_id
+from patch_schedule import Patch_Schedule, DEFAULT_POLLS_PER_DAY
+from profiler import Sampling_Profiler, MAX_PROFILE_SECONDS
+from patch_scraper import Overwatch_Patch_Scraper, PATCH_FEEDS
+from stats_history import Stats_Snapshotter, STAT_CODES, format_trend
 from storage_layer import Storage
+from team_balancer import Rated_Player, Team_Balancer, ROLES
 
 # Third party imports.
 from discord.ext import commands, tasks
@@ -18,61 +33,427 @@ from discord.ext import commands, tasks
 # Create global variables
 db = Storage()
 
+class Dispatched_Context(commands.Context):
+    """
+    A command context whose replies are sent through the bot's dispatcher, ahead of status message
+    edits and patch note broadcasts.
+    """
+
+    async def send(self, content: str = None, **kwargs):
+        parent_send = super().send
+        return await self.bot.dispatcher.submit(self.channel.id, REPLY, lambda: parent_send(content, **kwargs))
+
+
+
+class Prefixed_Help_Command(commands.DefaultHelpCommand):
+    """
+    The default help command, with each '{prefix}' in the commands' help written as the prefix help
+    was asked with, as each guild chooses its own.
+    """
+
+    def shorten_text(self, text: str) -> str:
+        # Written in before shortening, so a long line is never cut in the middle of '{prefix}'.
+        return super().shorten_text(text.replace("{prefix}", self.clean_prefix))
+
+
+    async def send_pages(self):
+        destination = self.get_destination()
+        for page in self.paginator.pages:
+            await destination.send(page.replace("{prefix}", self.clean_prefix))
+
+
+
 class Overwatch_Bot(commands.Bot):
     """
     Class for Overwatch Discord Bot, inherits from a Discord bot with
-    a added Overwatch_Queue and scraper objects attached.
+    a added Overwatch_Queue per guild and scraper objects attached.
 
     :param commands.Bot Discord class for an Overwatch bot
     """
 
-    def __init__(self, command_prefix: str):
+    def __init__(self, command_prefix, scraper: Overwatch_Patch_Scraper = None,
+                 shard_id: int = None, shard_count: int = None, patch_polls_per_day: int = DEFAULT_POLLS_PER_DAY):
         """
         Initialises the Overwatch_Bot
 
-        :param command_preix (str) The character that identifies a message as a command to the bot.
+        :param command_preix (str or callable) The character that identifies a message as a command to the bot,
+            or a function of the bot and the message returning it.
+        :param scraper (Overwatch_Patch_Scraper) The patch scraper to use, or None to create one for the live site.
+        :param shard_id (int) The shard this bot runs, or None if it is the only process.
+        :param shard_count (int) The total number of shards, or None if it is the only process.
+        :param patch_polls_per_day (int) The most polls of the patch notes site to plan for in a day.
         """
         super().__init__(command_prefix=command_prefix, 
-                         help_command=commands.DefaultHelpCommand(no_category='Commands'))
-        self.queue = Overwatch_Queue(mode=2)
-        self.no_queue_response = "There is no queue. Type \'!queue\' to create one."
-        self.scraper = Overwatch_Patch_Scraper()
+                         help_command=Prefixed_Help_Command(no_category='Commands'),
+                         shard_id=shard_id, shard_count=shard_count)
+        self.guild_queues = {}
+        # Queues unused for this many seconds are saved and dropped from memory, until next used.
+        self.queue_idle_ttl = 6 * 60 * 60
+        self.evicted_queue_count = 0
+        self.scraper = scraper if scraper is not None else Overwatch_Patch_Scraper()
+        # Patch channels used to be kept in this file, before moving into the database.
         self.patch_channel_fpath = os.path.join("db", "patchchannels")
+        self.instance_id = get_instance_id(shard_id)
+        self.patch_leader = False
+        self.leader_lease_ttl = 180
+        # Learns when patches come out, so the patch notes site is polled most around then.
+        self.patch_schedule_fpath = os.path.join("db", "patchschedule.json")
+        self.patch_polls_per_day = patch_polls_per_day
+        self.patch_schedule = Patch_Schedule.load(self.patch_schedule_fpath, polls_per_day=patch_polls_per_day)
+        # Each guild's settings, read from memory and reloaded as they change.
+        self.settings = Settings_Store(db)
+        self.metrics = Bot_Metrics()
+        # Every outgoing request goes through the dispatcher, so replies are not held up by broadcasts.
+        self.dispatcher = Outbound_Dispatcher(metrics=self.metrics)
+        self.profile_fetcher = Profile_Fetcher()
+        self.stats_snapshotter = Stats_Snapshotter(db, self.profile_fetcher)
+        metrics_fname = "metrics.prom" if shard_id is None else f"metrics-shard{shard_id}.prom"
+        self.metrics_fpath = os.path.join("db", metrics_fname)
+        # The profile running from !profile, if any, and where profiles are written.
+        self.profiler = None
+        self.profile_dir = os.path.join("db", "profiles")
+        self.status_debounce = 1.5
+        self.status_pointer = "See the pinned queue status message for who is playing."
+        # Record each queue's commands for replaying offline, if a folder is given for them.
+        recording_dir = os.getenv("COMMAND_RECORDING_DIR")
+        self.recorder = Command_Recorder(recording_dir) if recording_dir else None
+
+
+    async def get_patch_channels(self, feed: str = "live"):
+        """
+        Gets the current patch channels of a feed
+
+        Returns:
+            list
+        """
+        current_patch_channels = await db.get_patch_channels(feed)
+        return current_patch_channels
+
+
+    async def import_patch_channels_file(self):
+        """
+        Moves any patch channels from the old patch channels file into the database.
+        """
         if not os.path.exists(self.patch_channel_fpath):
-            Path(self.patch_channel_fpath).touch()
+            return
+        with open(self.patch_channel_fpath, "r") as f:
+            channel_ids = [line.strip() for line in f.readlines()]
+        for channel_id in channel_ids:
+            if channel_id.isdigit():
+                await db.add_patch_channel(int(channel_id))
+        os.replace(self.patch_channel_fpath, self.patch_channel_fpath + ".imported")
+
 
+    async def send_to_channel(self, channel_id: int, message: str):
+        """
+        Broadcasts a message to a channel, which may be in a guild belonging to another shard.
+        Sent through the dispatcher after any replies and status message edits waiting to be sent.
 
-    def get_patch_channels(self):
+        Args:
+            channel_id (int): The id of the channel.
+            message (str): The message to send.
         """
-        Gets the current patch channels
+        channel = self.get_channel(channel_id)
+        if channel is not None:
+            await self.dispatcher.submit(channel_id, BROADCAST, lambda: channel.send(message))
+        else:
+            # Not cached by this shard, so send through the API directly.
+            await self.dispatcher.submit(channel_id, BROADCAST, lambda: self.http.send_message(channel_id, message))
+
+
+    async def post_new_patches(self) -> int:
+        """
+        Checks every patch notes feed for a new patch, posting each new patch to the channels subscribed to its feed.
 
         Returns:
-            list
+            int: The number of messages posted.
         """
-        with open(self.patch_channel_fpath, "r") as f:
-            current_patch_channels = f.readlines()
-        return current_patch_channels
+        with self.metrics.time_operation("scraper.check_feeds"):
+            new_messages = await self.scraper.check_feeds()
+        # Edits to a patch are posted too, but only a patch with a date not seen before is a new release.
+        found_release = any(self.scraper.patch_dates.get(feed) not in self.patch_schedule.release_dates
+                            for feed in new_messages)
+        self.record_patch_poll(found_release)
+        sends = []
+        posted_count = 0
+        for feed, messages in new_messages.items():
+            for patch_channel in await self.get_patch_channels(feed):
+                sends.append(self.send_patch_notes(patch_channel, messages))
+                posted_count += len(messages)
+        # Each channel gets its messages in order, while the channels are sent to side by side.
+        await asyncio.gather(*sends)
+        return posted_count
+
+
+    def record_patch_poll(self, found_patch: bool):
+        """
+        Records a poll for patches in the patch schedule, saving what it has learned for whichever
+        process polls next, and its statistics in the metrics.
+
+        Args:
+            found_patch (bool): Whether the poll found a patch released since the last poll on any feed.
+        """
+        self.patch_schedule.record_poll(found_patch)
+        self.patch_schedule.learn_dates(self.scraper.patch_archive)
+        self.patch_schedule.save(self.patch_schedule_fpath)
+        stats = self.patch_schedule.get_stats()
+        self.metrics.set_gauge("patch_polls_last_day", stats["polls_last_day"],
+                               "Polls for patches in the last day, each one request per feed.")
+        self.metrics.set_gauge("patch_planned_polls_per_day", stats["planned_polls_per_day"],
+                               "Polls for patches a day planned by the patch schedule.")
+        if stats["releases_detected"]:
+            self.metrics.set_gauge("patch_detection_latency_seconds", stats["mean_detection_latency"],
+                                   "Mean of the most seconds each detected patch could have gone unnoticed.")
+
+
+    async def send_patch_notes(self, channel_id: int, messages: list):
+        """
+        Broadcasts a patch's messages to a channel, one after another.
 
+        Args:
+            channel_id (int): The id of the channel.
+            messages (list): The patch's messages.
+        """
+        for message in messages:
+            await self.send_to_channel(channel_id, message)
+
+
+    async def renew_leadership(self) -> bool:
+        """
+        Takes or renews the lease making this process the one that polls for patches.
+
+        On taking over, the patch schedule is loaded again, as the last leader has polled and
+        learned of releases since this process loaded it.
+
+        Returns:
+            bool: Whether this process is the patch poller.
+        """
+        was_leader = self.patch_leader
+        self.patch_leader = await db.acquire_lease("patch_poller", self.instance_id, self.leader_lease_ttl)
+        if self.patch_leader and not was_leader:
+            self.patch_schedule = Patch_Schedule.load(self.patch_schedule_fpath, polls_per_day=self.patch_polls_per_day)
+        return self.patch_leader
+
+
+    async def close(self):
+        """
+        Hands over patch polling to another process, if this one has it, then disconnects.
+        """
+        if self.patch_leader:
+            await db.release_lease("patch_poller", self.instance_id)
+            self.patch_leader = False
+        await self.dispatcher.close()
+        await super().close()
+
+
+    async def get_context(self, message, *, cls=Dispatched_Context):
+        """
+        Gets the context of a command message, sending its replies through the dispatcher unless another
+        context class is given.
+        """
+        return await super().get_context(message, cls=cls)
+
+
+    def get_guild_queue(self, ctx: commands.Context) -> Guild_Queue:
+        """
+        Gets the queue of the guild a command was used in, creating it if the guild has none.
 
-    def get_queue_mode(self):
+        Direct messages each get a queue of their own channel.
+
+        Returns:
+            Guild_Queue
+        """
+        guild_id = ctx.guild.id if ctx.guild else ctx.channel.id
+        guild_queue = self.guild_queues.get(guild_id)
+        if guild_queue is None:
+            guild_queue = Guild_Queue(guild_id, mode=self.settings.get(guild_id).mode,
+                                      status_debounce=self.status_debounce, dispatcher=self.dispatcher,
+                                      get_prefix=lambda: self.settings.get(guild_id).prefix)
+            self.guild_queues[guild_id] = guild_queue
+        guild_queue.last_used = time.monotonic()
+        return guild_queue
+
+
+    def get_patch_feeds(self, ctx: commands.Context, feed: str = "") -> tuple:
         """
-        Gets the mode of the queue.
+        Gets the patch notes feeds a command is for: the one given, else those in the guild's settings.
+
+        Args:
+            feed (str): The feed typed after the command, or an empty string if none was.
 
         Returns:
-            int
+            tuple
+        """
+        if feed:
+            return (feed.lower(), )
+        return self.settings.get(ctx.guild.id if ctx.guild else None).feeds
+
+
+    async def load_guild_queue(self, ctx: commands.Context) -> Guild_Queue:
         """
-        queue_mode = 2 if self.queue.player_cutoff == 5 else 1
-        return queue_mode
+        Gets the queue of the guild a command was used in, loading it from the database if this
+        process has not used it yet (e.g. it was used by another shard, or before a restart).
 
+        Returns:
+            Guild_Queue
+        """
+        guild_id = ctx.guild.id if ctx.guild else ctx.channel.id
+        if guild_id not in self.guild_queues:
+            state = await db.load_queue(guild_id)
+            if state is not None and guild_id not in self.guild_queues:
+                self.guild_queues[guild_id] = Guild_Queue.from_dict(guild_id, state,
+                                                                    status_debounce=self.status_debounce,
+                                                                    dispatcher=self.dispatcher,
+                                                                    get_prefix=lambda: self.settings.get(guild_id).prefix)
+        return self.get_guild_queue(ctx)
+
+
+    async def save_guild_queue(self, guild_queue: Guild_Queue):
+        """
+        Saves a guild's queues to the database, if they have changed since they were last saved.
 
-def create_bot() -> Overwatch_Bot:
+        Args:
+            guild_queue (Guild_Queue): The queues to save.
+        """
+        version = guild_queue.get_version()
+        if version != guild_queue.saved_version:
+            await db.save_queue(guild_queue.guild_id, guild_queue.to_dict())
+            guild_queue.saved_version = version
+
+
+    async def evict_idle_queues(self, now: float = None) -> int:
+        """
+        Saves the queues unused for longer than queue_idle_ttl and drops them from memory, with their
+        undo backups and status messages. An evicted queue is loaded again by its guild's next command,
+        though it can then no longer undo.
+
+        Resident memory before and after is printed and recorded in the bot's metrics.
+
+        Args:
+            now (float): The current time from time.monotonic, or None for now.
+
+        Returns:
+            evicted (int): The number of queues evicted.
+        """
+        now = time.monotonic() if now is None else now
+        resident_before = get_resident_memory()
+        evicted = 0
+        for guild_id, guild_queue in list(self.guild_queues.items()):
+            last_used = guild_queue.last_used
+            if now - last_used < self.queue_idle_ttl or guild_queue.lock.locked():
+                continue
+            async with guild_queue.lock:
+                await self.save_guild_queue(guild_queue)
+                # A command waiting for the lock has already used the queue, so keep it for that command,
+                # with its status message still pinned.
+                if guild_queue.last_used != last_used or self.guild_queues.get(guild_id) is not guild_queue:
+                    continue
+                # Dropped before closing the status message, so a command arriving meanwhile loads the saved queue.
+                del self.guild_queues[guild_id]
+                await guild_queue.status_message.close()
+                evicted += 1
+        if evicted:
+            # Guild queues and their status messages refer to each other, so free them now rather than wait for gc.
+            gc.collect()
+        resident_after = get_resident_memory()
+        self.evicted_queue_count += evicted
+        self.metrics.set_gauge("guild_queues", len(self.guild_queues), "Guild queues held in memory.")
+        self.metrics.set_gauge("guild_queues_evicted", self.evicted_queue_count,
+                               "Idle guild queues saved and dropped from memory since starting.")
+        if resident_after is not None:
+            self.metrics.set_gauge("resident_memory_bytes", resident_after, "Resident memory after the last queue sweep.")
+        print(f"Evicted {evicted} idle queues, {len(self.guild_queues)} left in memory. Resident memory: "
+              f"{format_megabytes(resident_before)} before, {format_megabytes(resident_after)} after.")
+        return evicted
+
+
+def get_guild_prefix(bot: Overwatch_Bot, message) -> str:
+    """
+    Gets the command prefix of the guild a message was sent in. Called for every message, so read
+    from the bot's settings cache rather than the database.
+
+    Returns:
+        str: The guild's prefix, or the default prefix for direct messages.
+    """
+    return bot.settings.get(message.guild.id if message.guild else None).prefix
+
+
+def get_guild_label(ctx: commands.Context) -> str:
+    """
+    Gets the label to record a command's guild under in the bot's metrics.
+
+    Returns:
+        str: The guild id, or 'dm' for direct messages.
+    """
+    return str(ctx.guild.id) if ctx.guild else "dm"
+
+
+def format_megabytes(size: int) -> str:
+    """
+    Formats a size in bytes, from get_resident_memory, in megabytes.
+    """
+    return "unknown" if size is None else f"{size / 2**20:.1f} MB"
+
+
+def format_team(title: str, team: list) -> str:
+    """
+    Formats a team from Team_Balancer for a Discord message.
+
+    Args:
+        title (str): The name of the team.
+        team (list): The Rated_Player objects in the team.
+
+    Returns:
+        str
+    """
+    known_srs = [player.sr for player in team if player.sr is not None]
+    message = f"**{title}**" + (f" (average SR {round(sum(known_srs) / len(known_srs))}):" if known_srs else ":")
+    for player in team:
+        rating = ", ".join(str(value) for value in (player.sr, player.role) if value is not None)
+        message += f"\n\t{player.name}" + (f" ({rating})" if rating else " (unrated)")
+    return message
+
+
+def serialise_queue_command(command):
+    """
+    Decorator for commands that use the guild's queue, so that they run one at a time per queue.
+
+    Without this, commands could interleave around their awaits and leave the queue, or its undo
+    backup, half changed. Commands in different guilds still run in parallel.
+    The queue is loaded from the database before the command, and saved after it if changed.
+    The command's guild_queue.queue is the queue its channel uses, and the index of each player's
+    queues is updated after it.
+    Commands are recorded here, if recording, so they are recorded in the order each queue ran them.
+    """
+    @functools.wraps(command)
+    async def serialised_command(ctx, *args, **kwargs):
+        guild_queue = await ctx.bot.load_guild_queue(ctx)
+        async with guild_queue.lock:
+            guild_queue.select_queue(ctx.channel.id)
+            if ctx.bot.recorder is not None:
+                ctx.bot.recorder.record(ctx, guild_queue, ctx.bot.settings.get(guild_queue.guild_id))
+            await command(ctx, *args, **kwargs)
+            guild_queue.update_index()
+            await ctx.bot.save_guild_queue(guild_queue)
+    return serialised_command
+
+
+def create_bot(scraper: Overwatch_Patch_Scraper = None, shard_id: int = None,
+               shard_count: int = None, patch_polls_per_day: int = DEFAULT_POLLS_PER_DAY) -> Overwatch_Bot:
     """
     Create the Overwatch queue bot and give it all the commands.
 
+    Args:
+        scraper (Overwatch_Patch_Scraper): The patch scraper to use, or None to create one for the live site.
+        shard_id (int): The shard this bot runs, or None if it is the only process.
+        shard_count (int): The total number of shards, or None if it is the only process.
+        patch_polls_per_day (int): The most polls of the patch notes site to plan for in a day.
+
     Returns:
         bot (Overwatch_Bot): A bot initialised with all the commands we need.
     """
-    bot = Overwatch_Bot(command_prefix='!')
+    bot = Overwatch_Bot(command_prefix=get_guild_prefix, scraper=scraper, shard_id=shard_id, shard_count=shard_count,
+                        patch_polls_per_day=patch_polls_per_day)
 
     # The commands that can be given to the bot.
 
@@ -84,10 +465,12 @@ def create_bot() -> Overwatch_Bot:
         name -- the battlenet name with format DisplayName#0000    
         """
         acc = Battlenet_Account(name)
-        pub_chk = await acc.public_check
+        with bot.metrics.time_operation("battlenet.public_lookup"):
+            pub_chk = await acc.public_lookup(bot.profile_fetcher)
         response = ''
         if(acc.valid_battletag and pub_chk ):
-            await db.upsert_player(ctx.message.author.name, name)
+            with bot.metrics.time_operation("storage.upsert_player"):
+                await db.upsert_player(ctx.message.author.name, name)
             response += f"{ctx.message.author.name} is now linked to {name}"
         else:
             response += f"Something went wrong with error/s:\n {acc.error}"
@@ -95,42 +478,135 @@ def create_bot() -> Overwatch_Bot:
         await ctx.send(response)
 
 
-    # Start queue when requested.
-    @bot.command(name='queue', help='Starts an Overwatch queue.')
-    async def start_queue(ctx):
-        if bot.queue.find_player(ctx.message.author.name):
-            response = message + f"{ctx.message.author.name} is already in the queue."
-        elif bot.queue.players:
-            message = "A queue already exists.\n" if bot.queue.players else ""
-            response = message + bot.queue.add_player(Player(ctx.message.author.name))
+    # Record the skill rating and main role of your linked battle net account
+    @bot.command(name='rank', help='Set your SR and main role (tank, damage or support) for balancing teams.')
+    async def set_rank(ctx, sr: str = "", role: str = ""):
+        battle_tag = await db.get_battltag(ctx.message.author.name)
+        if not sr.isdigit() or (role and role.lower() not in ROLES):
+            response = f"Type '{ctx.prefix}rank ' followed by your SR, and optionally your main role (tank, damage or support)."
+        elif not battle_tag:
+            response = f"{ctx.message.author.name} has no linked battle net account. Type '{ctx.prefix}link ' followed by your battle tag first."
         else:
-            mode = bot.get_queue_mode()
-            message = f"Queue has been created for Overwatch {mode}. Type \'!join\' to be added to the queue.\n"
-            response = message + bot.queue.add_player(Player(ctx.message.author.name))
+            await db.set_rating(battle_tag[0], int(sr), role.lower() or None)
+            response = f"{battle_tag[0]} is now rated {sr}" + (f" as {role.lower()}." if role else ".")
+        await ctx.send(response)
+
+
+    # Check the battle net profiles of everyone in the queue at once
+    @bot.command(name='profiles', help='Check the linked battle net profiles of everyone in the queue.')
+    async def check_profiles(ctx):
+        # Not serialised with the queue's other commands, so slow profiles do not hold up the queue.
+        guild_queue = await bot.load_guild_queue(ctx)
+        queue = guild_queue.queues[guild_queue.get_channel_queue_name(ctx.channel.id)]
+        player_names = [player.name for player in queue.players]
+        if not player_names:
+            await ctx.send(get_no_queue_response(ctx.prefix))
+            return
+        with bot.metrics.time_operation("battlenet.fetch_player_profiles"):
+            profiles, errors = await bot.profile_fetcher.fetch_player_profiles(db, player_names)
+        response = "Battle net profiles of the players in the queue:"
+        for name in player_names:
+            if name in profiles:
+                status = "public" if profiles[name].modes() else "private"
+            else:
+                status = errors[name]
+            response += f"\n\t{name}: {status}"
+        if "no linked battle net account" in errors.values():
+            response += f"\nType \'{ctx.prefix}link\' followed by your battle tag to link your account."
+        await ctx.send(response)
+
+
+    # See how a stat of your linked account has changed
+    @bot.command(name='trend', help='See how your SR, playtime or wins have changed, e.g. {prefix}trend sr 30.')
+    async def stat_trend(ctx, stat: str = "sr", days: str = "30"):
+        player_id = await db.get_player_id(ctx.message.author.name)
+        if stat not in STAT_CODES or not days.isdigit():
+            response = f"Type \'{ctx.prefix}trend \' followed by one of {', '.join(STAT_CODES)} and optionally a number of days."
+        elif player_id is None:
+            response = f"{ctx.message.author.name} has no linked battle net account. Type \'{ctx.prefix}link \' followed by your battle tag first."
+        else:
+            end = int(time.time())
+            samples = await db.get_stat_samples(player_id, STAT_CODES[stat], end - int(days) * 24 * 60 * 60, end)
+            response = format_trend(ctx.message.author.name, stat, samples, int(days))
+        await ctx.send(response)
+
+
+    # Start queue when requested, or choose a named queue for this channel and start that.
+    @bot.command(name='queue', help='Starts an Overwatch queue. Add a name to run another queue in this channel.')
+    @serialise_queue_command
+    async def start_queue(ctx, name=""):
+        guild_queue = bot.get_guild_queue(ctx)
+        name = name.lower()
+        if name and not QUEUE_NAME_PATTERN.match(name):
+            await ctx.send("Queue names can only have up to 20 letters, numbers, dashes and underscores.")
+            return
+        switched = ""
+        if name and name != guild_queue.queue_name:
+            guild_queue.use_queue(ctx.channel.id, name, mode=bot.settings.get(guild_queue.guild_id).mode)
+            switched = f"This channel is now using the {name} queue.\n"
+        if guild_queue.queue.find_player(ctx.message.author.name):
+            response = f"{ctx.message.author.name} is already in the queue."
+        elif guild_queue.queue.players:
+            message = "A queue already exists.\n" if guild_queue.queue.players else ""
+            response = message + guild_queue.queue.add_player(Player(ctx.message.author.name, user_id=ctx.message.author.id), ctx.prefix)
+        else:
+            mode = guild_queue.get_queue_mode()
+            message = f"Queue has been created for Overwatch {mode}. Type \'{ctx.prefix}join\' to be added to the queue.\n"
+            response = message + guild_queue.queue.add_player(Player(ctx.message.author.name, user_id=ctx.message.author.id), ctx.prefix)
+        guild_queue.refresh_status(ctx.channel)
+        await ctx.send(switched + response)
+
+
+    # List the queues in this server
+    @bot.command(name='queues', help='List the queues in this server, and which one this channel uses.')
+    @serialise_queue_command
+    async def list_queues(ctx):
+        guild_queue = bot.get_guild_queue(ctx)
+        response = "The queues in this server are:"
+        for name, queue in guild_queue.queues.items():
+            response += (f"\n\t{name}: Overwatch {guild_queue.get_queue_mode(queue)}, {len(queue.players)} players"
+                         + (" (this channel)" if name == guild_queue.queue_name else ""))
+        response += f"\nType \'{ctx.prefix}queue \' followed by a name to use or create another queue in this channel."
         await ctx.send(response)
 
 
     # Join queue when requested.
     @bot.command(name='join', help='Join the Overwatch queue.')
+    @serialise_queue_command
     async def join_queue(ctx):
-        mode = bot.get_queue_mode()
-        message = f"Queue has been created for Overwatch {mode}. Type \'!join\' to be added to the queue.\n" if not bot.queue.players else ""
-        if bot.queue.find_player(ctx.message.author.name):
+        guild_queue = bot.get_guild_queue(ctx)
+        mode = guild_queue.get_queue_mode()
+        message = f"Queue has been created for Overwatch {mode}. Type \'{ctx.prefix}join\' to be added to the queue.\n" if not guild_queue.queue.players else ""
+        if guild_queue.queue.find_player(ctx.message.author.name):
             response = f"{ctx.message.author.name} is already in the queue."
         else:
-            response = message + bot.queue.add_player(Player(ctx.message.author.name))
+            response = message + guild_queue.queue.add_player(Player(ctx.message.author.name, user_id=ctx.message.author.id), ctx.prefix)
+            guild_queue.refresh_status(ctx.channel)
         await ctx.send(response)
 
 
     # Leave queue when requested.
-    @bot.command(name='leave', help='Leave the Overwatch queue.')
-    async def leave_queue(ctx):
-        if not bot.queue.players:
-            response = bot.no_queue_response
+    @bot.command(name='leave', help='Leave the Overwatch queue. Type \'{prefix}leave all\' to leave every queue you are in.')
+    @serialise_queue_command
+    async def leave_queue(ctx, arg=""):
+        guild_queue = bot.get_guild_queue(ctx)
+        if arg == "all":
+            queue_names = guild_queue.get_player_queues(ctx.message.author.name)
+            for name in queue_names:
+                queue = guild_queue.queues[name]
+                queue.delete_player(queue.find_player(ctx.message.author.name))
+            if queue_names:
+                guild_queue.refresh_status(ctx.channel)
+                response = f"{ctx.message.author.name} has been removed from the {', '.join(queue_names)} queues."
+            else:
+                response = f"{ctx.message.author.name} is not a player in any queue."
+        elif not guild_queue.queue.players:
+            response = get_no_queue_response(ctx.prefix)
         else:
-            player = bot.queue.find_player(ctx.message.author.name)
+            player = guild_queue.queue.find_player(ctx.message.author.name)
             if player:
-                bot.queue.delete_player(player)
+                guild_queue.queue.delete_player(player)
+                guild_queue.refresh_status(ctx.channel)
                 response = f"{ctx.message.author.name} has been removed from the queue."
             else:
                 response = f"{ctx.message.author.name} was not in the queue."
@@ -139,78 +615,131 @@ def create_bot() -> Overwatch_Bot:
 
     # Switch to the next game.
     @bot.command(name='next', help='Update the queue for the next game.')
+    @serialise_queue_command
     async def next_game_for_queue(ctx):
-        if not bot.queue.players:
-            response = bot.no_queue_response
+        guild_queue = bot.get_guild_queue(ctx)
+        if not guild_queue.queue.players:
+            response = get_no_queue_response(ctx.prefix)
         else:
-            response = bot.queue.update_queue()
+            guild_queue.queue.update_queue(max_swaps=bot.settings.get(guild_queue.guild_id).swaps)
+            guild_queue.refresh_status(ctx.channel)
+            response = "The queue has been updated for the next game. " + bot.status_pointer
         await ctx.send(response)
 
 
     # See the status of the queue.
-    @bot.command(name='status', help='See the status of the queue.')
-    async def status_queue(ctx):
-        if not bot.queue.players:
-            response = bot.no_queue_response
+    @bot.command(name='status', help='See the status of the queue. Add a page number, or \'me\' to find your place.')
+    @serialise_queue_command
+    async def status_queue(ctx, arg=""):
+        guild_queue = bot.get_guild_queue(ctx)
+        if not guild_queue.queue.players:
+            response = get_no_queue_response(ctx.prefix)
+        elif arg == "me":
+            player = guild_queue.queue.find_player(ctx.message.author.name)
+            if player:
+                response = guild_queue.get_queue_status(guild_queue.queue.find_player_page(player, STATUS_PAGE_SIZE),
+                                                        show_estimates=True)
+            else:
+                response = f"{ctx.message.author.name} is not a member of the queue. Type \'{ctx.prefix}join\' to join the queue."
+        elif arg.isdigit():
+            response = guild_queue.get_queue_status(int(arg), show_estimates=True)
         else:
-            response = bot.queue.print_players()
+            response = guild_queue.get_queue_status(show_estimates=True)
         await ctx.send(response)
 
 
     # See the wait of a player.
     @bot.command(name='wait', help='See how long until your next game.')
+    @serialise_queue_command
     async def wait_queue(ctx):
-        player = bot.queue.find_player(ctx.message.author.name)
-        if not bot.queue.players:
-            response = bot.no_queue_response
+        guild_queue = bot.get_guild_queue(ctx)
+        player = guild_queue.queue.find_player(ctx.message.author.name)
+        queue_names = guild_queue.get_player_queues(ctx.message.author.name)
+        if len(queue_names) > 1 or (queue_names and not player):
+            # In queues other than this channel's, so show the wait in each of them.
+            response = "\n".join(f"{name}: " + guild_queue.queues[name].print_player_wait(
+                                      guild_queue.queues[name].find_player(ctx.message.author.name))
+                                  for name in queue_names)
+        elif not guild_queue.queue.players:
+            response = get_no_queue_response(ctx.prefix)
         elif player:
-            response = bot.queue.print_player_wait(player)
+            response = guild_queue.queue.print_player_wait(player)
         else:
-            response = f"{ctx.message.author.name} is not a member of the queue. Type \'!join\' to join the queue."
+            response = f"{ctx.message.author.name} is not a member of the queue. Type \'{ctx.prefix}join\' to join the queue."
         await ctx.send(response)
 
     
-    # Add a player to the queue.
-    @bot.command(name='add', help='Add a player to the queue.')
-    async def kick_player(ctx, arg=""):
-        message = "Overwatch queue has been created. Type \'!join\' to be added to the queue.\n" if not bot.queue.players else ""
-        if bot.queue.find_player(arg):
-            response = f"{arg} is already in the queue."
+    # Add players to the queue.
+    @bot.command(name='add', help='Add players to the queue, e.g. {prefix}add a b c.')
+    @serialise_queue_command
+    async def add_players(ctx, *names):
+        guild_queue = bot.get_guild_queue(ctx)
+        message = f"Overwatch queue has been created. Type \'{ctx.prefix}join\' to be added to the queue.\n" if not guild_queue.queue.players else ""
+        if not names:
+            response = f"Type \'{ctx.prefix}add \' followed by the Discord names of the players to add them."
         else:
-            response = message + bot.queue.add_player(Player(arg))
-        if not arg:
-            response = "Type \'!add \' followed by the Discord name of the player to add them."
+            # Mentioned players are added under their Discord name, and can be found by mention later.
+            mentioned = {member.id: member for member in ctx.message.mentions}
+            players = []
+            for name in dict.fromkeys(names):
+                member = mentioned.get(parse_mention(name))
+                players.append(Player(member.name, user_id=member.id) if member is not None else Player(name))
+            version = guild_queue.queue.version
+            response = guild_queue.queue.add_players(players, ctx.prefix)
+            if guild_queue.queue.version != version:
+                response = message + response
+                guild_queue.refresh_status(ctx.channel)
         await ctx.send(response)
 
 
-    # Kick a player from the queue.
-    @bot.command(name='kick', help='Remove a player from the queue.')
-    async def kick_player(ctx, arg=""):
-        if not bot.queue.players:
-            response = bot.no_queue_response
-        elif not arg:
-            response = "Type \'!kick \' followed by the Discord name of the player to remove them."
+    # Kick players from the queue.
+    @bot.command(name='kick', help='Remove players from the queue by name, mention or a unique start of their name, e.g. {prefix}kick a @b luc.')
+    @serialise_queue_command
+    async def kick_players(ctx, *names):
+        guild_queue = bot.get_guild_queue(ctx)
+        if not guild_queue.queue.players:
+            response = get_no_queue_response(ctx.prefix)
+        elif not names:
+            response = f"Type \'{ctx.prefix}kick \' followed by the Discord names of the players to remove them."
         else:
-            player = bot.queue.find_player(arg)
-            if player:
-                bot.queue.delete_player(player)
-                response = f"{arg} has been removed from the queue."
-            else:
-                response = f"{arg} is not a player in the queue."
+            # Players can be given by mention, name, the start of their name or a near-miss of it.
+            players, missing, ambiguous = [], [], []
+            for name in dict.fromkeys(names):
+                matches = guild_queue.queue.resolve_player(name)
+                if len(matches) == 1 and matches[0] not in players:
+                    players.append(matches[0])
+                elif not matches:
+                    missing.append(name)
+                elif len(matches) > 1:
+                    ambiguous.append(f"{name} could be any of {join_names([player.name for player in matches])}.")
+            guild_queue.queue.delete_players(players)
+            messages = []
+            if players:
+                guild_queue.refresh_status(ctx.channel)
+                removed = [player.name for player in players]
+                messages.append(f"{join_names(removed)} {'has' if len(removed) == 1 else 'have'} been removed from the queue.")
+            if missing:
+                messages.append(f"{join_names(missing)} {'is not a player' if len(missing) == 1 else 'are not players'} in the queue.")
+            messages.extend(ambiguous)
+            response = "\n".join(messages)
         await ctx.send(response)
 
     
     # Delay your position in the queue when requested.
     @bot.command(name='delay', help='Temporarily no longer join current players until rejoined.')
+    @serialise_queue_command
     async def delay_player(ctx):
-        if not bot.queue.players:
-            response = bot.no_queue_response
+        guild_queue = bot.get_guild_queue(ctx)
+        if not guild_queue.queue.players:
+            response = get_no_queue_response(ctx.prefix)
         else:
-            player = bot.queue.find_player(ctx.message.author.name)
-            if player:
-                message = bot.queue.delay_player(player)
-                response = f"{ctx.message.author.name} is now delaying their games. Type \'!rejoin\' to stop."
-                response += ("\n\n" + message)
+            player = guild_queue.queue.find_player(ctx.message.author.name)
+            if player and player.delaying:
+                response = f"{ctx.message.author.name} is already delaying their games."
+            elif player:
+                guild_queue.queue.delay_player(player)
+                guild_queue.refresh_status(ctx.channel)
+                response = f"{ctx.message.author.name} is now delaying their games. Type \'{ctx.prefix}rejoin\' to stop."
             else:
                 response = f"{ctx.message.author.name} is not a player in the queue."
         await ctx.send(response)
@@ -218,15 +747,17 @@ def create_bot() -> Overwatch_Bot:
     
     # Rejoin your position in the queue after delaying.
     @bot.command(name='rejoin', help='Stop delaying games and be able to join current players again.')
+    @serialise_queue_command
     async def rejoin_player(ctx):
-        if not bot.queue.players:
-            response = bot.no_queue_response
+        guild_queue = bot.get_guild_queue(ctx)
+        if not guild_queue.queue.players:
+            response = get_no_queue_response(ctx.prefix)
         else:
-            player = bot.queue.find_player(ctx.message.author.name)
+            player = guild_queue.queue.find_player(ctx.message.author.name)
             if player and player.delaying:
-                message = bot.queue.rejoin_player(player)
+                guild_queue.queue.rejoin_player(player)
+                guild_queue.refresh_status(ctx.channel)
                 response = f"{ctx.message.author.name} is no longer delaying their games."
-                response += ("\n\n" + message)
             elif player and not player.delaying:
                 response = f"{ctx.message.author.name} was not delaying games."
             else:
@@ -234,70 +765,185 @@ def create_bot() -> Overwatch_Bot:
         await ctx.send(response)
 
 
+    # Split everyone in the queue, except those delaying, into two balanced teams
+    @bot.command(name='teams', help='Split the players in the queue into two teams balanced by SR and role.')
+    @serialise_queue_command
+    async def split_teams(ctx):
+        guild_queue = bot.get_guild_queue(ctx)
+        lobby = [player for player in list(guild_queue.queue.current_players) + list(guild_queue.queue.waiting_players)
+                 if not player.delaying]
+        if not guild_queue.queue.players:
+            response = get_no_queue_response(ctx.prefix)
+        elif len(lobby) < 2:
+            response = "There are not enough players in the queue to split into teams."
+        else:
+            ratings = await db.get_ratings([player.name for player in lobby])
+            rated_players = [Rated_Player(player.name, *ratings.get(player.name, (None, None)))
+                             for player in lobby]
+            team_one, team_two = Team_Balancer().balance(rated_players)
+            response = format_team("Team 1", team_one) + "\n" + format_team("Team 2", team_two)
+            if any(player.sr is None for player in rated_players):
+                response += f"\nUnrated players count as the average SR. Type '{ctx.prefix}rank' to set yours."
+        await ctx.send(response)
+
+
     # Undo the previous command
     @bot.command(name='undo', help='Reset the queue to the previous state.')
+    @serialise_queue_command
     async def undo_queue(ctx):
-        message = bot.queue.undo_command()
-        response = "Previous command has been undone. The status of the queue now is:\n\n"
-        response = response + message
+        guild_queue = bot.get_guild_queue(ctx)
+        guild_queue.queue.undo_command()
+        guild_queue.refresh_status(ctx.channel)
+        response = "Previous command has been undone. " + bot.status_pointer
+        await ctx.send(response)
+
+
+    # See who has played and waited the most this session
+    @bot.command(name='session', help='See how many games everyone has played and how long they waited this session.')
+    @serialise_queue_command
+    async def session_stats(ctx):
+        guild_queue = bot.get_guild_queue(ctx)
+        if not guild_queue.queue.session.players:
+            response = get_no_queue_response(ctx.prefix)
+        else:
+            response = guild_queue.queue.session.summary()
         await ctx.send(response)
 
 
     # Change between Overwatch 1 and 2
     @bot.command(name='game', help='Switch the queue between Overwatch 1 and Overwatch 2.')
+    @serialise_queue_command
     async def switch_queue(ctx, arg=""):
+        guild_queue = bot.get_guild_queue(ctx)
         if arg == "1":
-            bot.queue.player_cutoff = 6
+            guild_queue.queue.set_mode(1)
             response = "Switching to a queue of 6 players for Overwatch 1."
         elif arg == "2":
-            bot.queue.player_cutoff = 5
+            guild_queue.queue.set_mode(2)
             response = "Switching to a queue of 5 players for Overwatch 2."
         else:
-            response = "Type \'!game \' followed by \'1\' or \'2\' to swtich between Overwatch 1 or 2."
+            response = f"Type \'{ctx.prefix}game \' followed by \'1\' or \'2\' to swtich between Overwatch 1 or 2."
         await ctx.send(response)    
         
 
     # End the queue.
     @bot.command(name='end', help='End (empty) the current queue.')
+    @serialise_queue_command
     async def end_queue(ctx):
-        if not bot.queue.players:
+        guild_queue = bot.get_guild_queue(ctx)
+        if not guild_queue.queue.players:
             response = "There is no queue to end (the queue has already been ended)."
         else:
-            bot.queue.empty_queue()
-            response = "The queue has been ended. Type \'!queue\' to start a new queue."
+            guild_queue.queue.empty_queue()
+            await db.archive_session(guild_queue.guild_id, guild_queue.queue.last_session)
+            response = f"The queue has been ended. Type \'{ctx.prefix}queue\' to start a new queue."
+            if guild_queue.queue_name != DEFAULT_QUEUE_NAME:
+                response = f"The {guild_queue.queue_name} queue has been ended. This channel is now using the {DEFAULT_QUEUE_NAME} queue."
+                guild_queue.remove_queue(guild_queue.queue_name)
+            if any(queue.players for queue in guild_queue.queues.values()):
+                guild_queue.refresh_status(ctx.channel)
+            else:
+                await guild_queue.status_message.close(final_content=response)
         await ctx.send(response)
 
     
     # Ask for patches to be posted into this channel
-    @bot.command(name='patchnotes', help='The bot will post Overwatch patch notes to this channel.')
-    async def add_patch_channel(ctx: commands.Context):
-        current_patch_channels = bot.get_patch_channels()
-        current_channel = str(ctx.channel.id)
-        if current_channel in current_patch_channels:
-            response = "This channel already has patches posted here."
-        else:
-            current_patch_channels.append(current_channel)
-            with open(bot.patch_channel_fpath, "w") as f:
-                f.writelines(current_patch_channels)
-            response = "This channel will now have patches posted here."
-        await ctx.send(response)
+    @bot.command(name='patchnotes', help='The bot will post Overwatch patch notes to this channel. '
+                                         'Add \'experimental\' for the experimental patch notes.')
+    async def add_patch_channel(ctx: commands.Context, feed: str = ""):
+        responses = []
+        for feed in bot.get_patch_feeds(ctx, feed):
+            if feed not in PATCH_FEEDS:
+                responses.append(f"There are no {feed} patch notes. Choose from: {', '.join(PATCH_FEEDS)}.")
+            elif await db.add_patch_channel(ctx.channel.id, feed):
+                responses.append(f"This channel will now have {feed} patches posted here.")
+            else:
+                responses.append(f"This channel already has {feed} patches posted here.")
+        await ctx.send("\n".join(responses))
 
 
     # Ask for patches to stop being posted into this channel
-    @bot.command(name='stoppatchnotes', help='The bot will stop posting Overwatch patch notes to this channel.')
-    async def remove_patch_channel(ctx: commands.Context):
-        current_patch_channels = bot.get_patch_channels()
-        current_channel = str(ctx.channel.id)
-        current_patch_channels.remove(current_channel)
-        with open(bot.patch_channel_fpath, "w") as f:
-            f.writelines(current_patch_channels)
-        response = "This channel will no longer have patches posted here."
+    @bot.command(name='stoppatchnotes', help='The bot will stop posting Overwatch patch notes to this channel. '
+                                             'Add \'experimental\' for the experimental patch notes.')
+    async def remove_patch_channel(ctx: commands.Context, feed: str = ""):
+        responses = []
+        for feed in bot.get_patch_feeds(ctx, feed):
+            if feed not in PATCH_FEEDS:
+                responses.append(f"There are no {feed} patch notes. Choose from: {', '.join(PATCH_FEEDS)}.")
+            elif await db.remove_patch_channel(ctx.channel.id, feed):
+                responses.append(f"This channel will no longer have {feed} patches posted here.")
+            else:
+                responses.append(f"This channel does not have {feed} patches posted here.")
+        await ctx.send("\n".join(responses))
+
+
+    # See or change this server's settings
+    @bot.command(name='settings', help='See or change this server\'s settings, e.g. {prefix}settings prefix ? (admin only).')
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def change_settings(ctx, name: str = "", *values):
+        if not name:
+            response = "This server's settings are:\n" + bot.settings.get(ctx.guild.id).describe()
+            response += f"\nType \'{ctx.prefix}settings \' followed by a setting and its new value to change it."
+        else:
+            try:
+                settings = await bot.settings.update(ctx.guild.id, name.lower(), " ".join(values))
+                response = f"The {name.lower()} setting has been changed. This server's settings are now:\n{settings.describe()}"
+            except ValueError as error:
+                response = str(error)
         await ctx.send(response)
 
-    
+
+    # See how the bot's commands are performing
+    @bot.command(name='botstats', help='See how long commands take and how often they fail (admin only).')
+    @commands.has_permissions(administrator=True)
+    async def bot_stats(ctx):
+        bot.metrics.write_prometheus(bot.metrics_fpath)
+        for message in bot.metrics.summary_messages():
+            await ctx.send(message)
+
+
+    # Profile what the bot spends its time and memory on
+    @bot.command(name='profile', help='Profile the bot for some seconds, e.g. {prefix}profile 30 (admin only).')
+    @commands.has_permissions(administrator=True)
+    async def profile(ctx, seconds: float = 30):
+        if bot.profiler is not None:
+            await ctx.send("The bot is already being profiled.")
+            return
+        seconds = min(max(seconds, 1), MAX_PROFILE_SECONDS)
+        profiler = bot.profiler = Sampling_Profiler()
+        profiler.start()
+        await ctx.send(f"Profiling for {seconds:g} seconds...")
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+            bot.profiler = None
+        folded_fpath, summary_fpath = profiler.write(bot.profile_dir)
+        print(f"Wrote profile to {folded_fpath} and {summary_fpath}")
+        await ctx.send(f"{profiler.summary(top_n=5)}\n\nFlame graph stacks written to {folded_fpath}.")
+
+
+    # Time each command
+    @bot.before_invoke
+    async def start_command_timer(ctx):
+        ctx.command_start_time = time.perf_counter()
+
+
+    @bot.after_invoke
+    async def stop_command_timer(ctx):
+        seconds = time.perf_counter() - ctx.command_start_time
+        bot.metrics.observe_command(ctx.command.qualified_name, get_guild_label(ctx), seconds, ctx.command_failed)
+
+
     # Error handling for commands
     @bot.event
     async def on_command_error(ctx, error):
+        original_error = getattr(error, "original", error)
+        command_name = ctx.command.qualified_name if ctx.command else "unknown"
+        bot.metrics.record_command_error(command_name, original_error)
+        if isinstance(error, commands.errors.CommandInvokeError):
+            traceback.print_exception(type(original_error), original_error, original_error.__traceback__)
         if isinstance(error, commands.CommandNotFound):
             await ctx.send("**Invalid command. Try using** `help` **to figure out commands!**")
         if isinstance(error, commands.MissingRequiredArgument):
@@ -308,20 +954,64 @@ def create_bot() -> Overwatch_Bot:
             await ctx.send("**There was aconnection error somewhere, why don't you try again in a few seconds?**")
 
 
-    # Check for any new patch each hour
-    @tasks.loop(hours=1)
+    # Check for any new patch when the patch schedule says to, only in the process elected to poll for patches
+    @tasks.loop(minutes=1)
     async def check_patch():
-        if bot.scraper.check_for_new_live_patch():
-            messages = bot.scraper.prepare_new_live_patch_notes()
-            for message in messages:
-                for patch_channel in bot.get_patch_channels():
-                    await bot.get_channel(int(patch_channel)).send(message)
+        if not bot.patch_leader or not bot.patch_schedule.is_due():
+            return
+        await bot.post_new_patches()
+
+
+    # Elect one process to poll for patches, renewing the lease well before it expires
+    @tasks.loop(minutes=1)
+    async def renew_leadership():
+        await bot.renew_leadership()
+
+
+    # Record linked players' stats every few hours, only in the process elected to poll for patches
+    @tasks.loop(hours=6)
+    async def snapshot_stats():
+        if not bot.patch_leader:
+            return
+        with bot.metrics.time_operation("stats.snapshot"):
+            await bot.stats_snapshotter.snapshot()
+        with bot.metrics.time_operation("stats.downsample"):
+            await bot.stats_snapshotter.downsample()
+
+
+    # Save and drop queues that have not been used for a while, to free their memory
+    @tasks.loop(minutes=10)
+    async def evict_idle_queues():
+        with bot.metrics.time_operation("queues.evict_idle"):
+            await bot.evict_idle_queues()
+
+
+    # Export the metrics for Prometheus each minute
+    @tasks.loop(minutes=1)
+    async def export_metrics():
+        bot.metrics.write_prometheus(bot.metrics_fpath)
+
+
+    # Pick up settings changed by other processes, or in the database
+    @tasks.loop(seconds=30)
+    async def reload_settings():
+        changed = await bot.settings.refresh()
+        if changed:
+            print(f"Reloaded the settings of {len(changed)} guilds, now at version {bot.settings.version}.")
 
 
     @bot.event
     async def on_ready():
         print(f"Bot created as: {bot.user.name}")
+        await bot.settings.refresh()
+        reload_settings.start()
+        await bot.import_patch_channels_file()
+        await bot.renew_leadership()
+        renew_leadership.start()
         check_patch.start()
+        snapshot_stats.start()
+        evict_idle_queues.start()
+        export_metrics.start()
 
     
     return bot
@@ -0,0 +1,256 @@
+"""
+Class for sending all of the bot's outgoing Discord requests through one place, so that replies
+to commands are not held up behind status message edits or patch note broadcasts.
+
+Each request is given a priority class and the channel it is for. Requests for a channel are
+made one at a time, in the order they were submitted, so messages never arrive out of order.
+Across channels, the channel with the most urgent request goes next, oldest first within a
+class. A token bucket spaces the requests out to stay within Discord's rate limits: it refills
+at a steady rate up to a burst size, and each request takes one token.
+"""
+
+# Standard library imports
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+
+# The priority classes, most urgent first.
+REPLY = 0
+STATUS = 1
+BROADCAST = 2
+PRIORITY_NAMES = {REPLY: "reply", STATUS: "status", BROADCAST: "broadcast"}
+# Discord allows 50 requests a second across the bot, so stay well within that.
+DEFAULT_RATE = 20.0
+DEFAULT_BURST = 20
+
+
+class Token_Bucket():
+    """
+    A token bucket rate limiter.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (float): The most tokens the bucket holds, i.e. the largest burst allowed.
+        tokens (float): The tokens currently in the bucket.
+        clock (callable): Returns the current time in seconds.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock=time.monotonic):
+        """
+        Initialise a full token bucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float): The most tokens the bucket holds.
+            clock (callable): Returns the current time in seconds.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.__last_refill = clock()
+
+
+    def take(self) -> float:
+        """
+        Takes a token if there is one.
+
+        Returns:
+            wait (float): 0 if a token was taken, else the seconds until there will be one.
+        """
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.__last_refill) * self.rate)
+        self.__last_refill = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+
+class Outbound_Request():
+    """
+    A request waiting to be sent by an Outbound_Dispatcher.
+
+    Attributes:
+        priority (int): The priority class, e.g. REPLY.
+        operation (callable): Returns an awaitable making the request, e.g. lambda: channel.send(text).
+        future (asyncio.Future): Set to the request's result, or exception, once made.
+        submitted (float): When the request was submitted, from time.monotonic.
+    """
+
+    def __init__(self, priority: int, operation, future: asyncio.Future):
+        self.priority = priority
+        self.operation = operation
+        self.future = future
+        self.submitted = time.monotonic()
+
+
+
+class Outbound_Dispatcher():
+    """
+    Sends the bot's Discord requests by priority class, in order per channel, within a rate limit.
+
+    Attributes:
+        bucket (Token_Bucket): The rate limit shared by every request.
+        metrics (Bot_Metrics): Where back-pressure is recorded, or None.
+        pending (dict): The number of requests waiting to be sent, keyed by priority class.
+        most_pending (dict): The most requests that have been waiting at once, keyed by priority class.
+        sent_count (dict): The number of requests made, keyed by priority class.
+        throttled_count (int): The number of times a request waited for the rate limit.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, metrics=None):
+        """
+        Initialise a dispatcher. Its worker is started by the first request.
+
+        Args:
+            rate (float): Requests allowed per second.
+            burst (int): Requests allowed at once after a quiet spell.
+            metrics (Bot_Metrics): Where back-pressure is recorded, or None.
+        """
+        self.bucket = Token_Bucket(rate, burst)
+        self.metrics = metrics
+        self.pending = {priority: 0 for priority in PRIORITY_NAMES}
+        self.most_pending = {priority: 0 for priority in PRIORITY_NAMES}
+        self.sent_count = {priority: 0 for priority in PRIORITY_NAMES}
+        self.throttled_count = 0
+        # Each channel's waiting requests, oldest first.
+        self.__channels = {}
+        # Channels with a request in flight, which wait for it to finish before their next.
+        self.__busy = set()
+        # Heap of (priority, order, channel) for the channels ready to send, with the entry each is
+        # scheduled under in __scheduled. Entries no longer matching __scheduled are skipped.
+        self.__ready = []
+        self.__scheduled = {}
+        self.__order = itertools.count()
+        self.__wakeup = None
+        self.__worker = None
+
+
+    async def submit(self, channel_id: int, priority: int, operation):
+        """
+        Queues a request and waits for it to be made.
+
+        Args:
+            channel_id (int): The channel the request is for, which orders it after the channel's earlier requests.
+            priority (int): The priority class, e.g. REPLY.
+            operation (callable): Returns an awaitable making the request, e.g. lambda: channel.send(text).
+
+        Returns:
+            The result of the request, e.g. the sent discord.Message.
+        """
+        loop = asyncio.get_running_loop()
+        if self.__worker is None or self.__worker.done():
+            self.__wakeup = asyncio.Event()
+            self.__worker = asyncio.ensure_future(self.__run())
+        request = Outbound_Request(priority, operation, loop.create_future())
+        self.__channels.setdefault(channel_id, deque()).append(request)
+        self.pending[priority] += 1
+        self.most_pending[priority] = max(self.most_pending[priority], self.pending[priority])
+        self.__record_pending(priority)
+        if channel_id not in self.__busy:
+            self.__schedule(channel_id, priority)
+        return await request.future
+
+
+    async def close(self):
+        """
+        Stops the worker. Requests still waiting are cancelled.
+        """
+        if self.__worker is not None:
+            self.__worker.cancel()
+            self.__worker = None
+        for requests in self.__channels.values():
+            for request in requests:
+                request.future.cancel()
+        self.__channels.clear()
+        self.__ready.clear()
+        self.__scheduled.clear()
+
+
+    def __schedule(self, channel_id: int, priority: int):
+        """
+        Private function. Makes a channel ready to send under a priority class, unless it is already
+        ready under a more urgent one. A channel takes the priority of its most urgent waiting request,
+        so an urgent request is not left behind a less urgent one ahead of it in the same channel.
+        Called when a request is submitted, and when a channel's request in flight finishes.
+        """
+        scheduled = self.__scheduled.get(channel_id)
+        if scheduled is not None and scheduled[0] <= priority:
+            return
+        entry = (priority, next(self.__order), channel_id)
+        self.__scheduled[channel_id] = entry
+        heapq.heappush(self.__ready, entry)
+        self.__wakeup.set()
+
+
+    async def __run(self):
+        """
+        Private function. Sends the most urgent ready channel's next request whenever the rate limit allows.
+        Started by submit.
+        """
+        while True:
+            while not self.__ready:
+                self.__wakeup.clear()
+                await self.__wakeup.wait()
+            entry = self.__ready[0]
+            if self.__scheduled.get(entry[2]) is not entry:
+                heapq.heappop(self.__ready)
+                continue
+            wait = self.bucket.take()
+            if wait > 0:
+                self.throttled_count += 1
+                if self.metrics is not None:
+                    self.metrics.set_gauge("outbound_throttled", self.throttled_count,
+                                           "Times an outgoing request waited for the rate limit.")
+                # Sleep, then pick again, as a more urgent request may have come in meanwhile.
+                await asyncio.sleep(wait)
+                continue
+            heapq.heappop(self.__ready)
+            channel_id = entry[2]
+            del self.__scheduled[channel_id]
+            request = self.__channels[channel_id].popleft()
+            self.__busy.add(channel_id)
+            asyncio.ensure_future(self.__send(channel_id, request))
+
+
+    async def __send(self, channel_id: int, request: Outbound_Request):
+        """
+        Private function. Makes a request, then readies the channel's next request.
+        Called by __run.
+        """
+        self.pending[request.priority] -= 1
+        self.__record_pending(request.priority)
+        if self.metrics is not None:
+            self.metrics.observe_operation(f"outbound.{PRIORITY_NAMES[request.priority]}.wait",
+                                           time.monotonic() - request.submitted)
+        try:
+            if not request.future.cancelled():
+                result = await request.operation()
+                if not request.future.cancelled():
+                    request.future.set_result(result)
+        except Exception as e:
+            if not request.future.cancelled():
+                request.future.set_exception(e)
+        finally:
+            self.sent_count[request.priority] += 1
+            self.__busy.discard(channel_id)
+            requests = self.__channels.get(channel_id)
+            if requests:
+                self.__schedule(channel_id, min(waiting.priority for waiting in requests))
+            elif requests is not None:
+                del self.__channels[channel_id]
+
+
+    def __record_pending(self, priority: int):
+        """
+        Private function. Records the number of requests waiting in a priority class in the metrics.
+        """
+        if self.metrics is not None:
+            name = PRIORITY_NAMES[priority]
+            self.metrics.set_gauge(f"outbound_{name}_pending", self.pending[priority],
+                                   f"Outgoing {name} requests waiting to be sent.")
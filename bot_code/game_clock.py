@@ -0,0 +1,125 @@
+"""
+Class for timing a queue's games, to estimate when waiting players will get their next game.
+
+Each '!next' marks the end of one game and the start of another, so the time between two is a
+game's length. The estimate is an exponentially weighted moving average of those lengths: each new
+game moves it part of the way towards that game's length, so it follows a group whose games get
+longer or shorter without keeping every past game. Gaps too short or too long to be a real game,
+such as a mistaken '!next' or a break, are left out.
+"""
+
+# Standard library imports
+import time
+
+
+# The weight given to the latest game's length when updating the estimate.
+SMOOTHING = 0.3
+# The estimate used before any game has been timed.
+DEFAULT_GAME_SECONDS = 15 * 60
+# Gaps between games outside these bounds are not counted as games.
+MIN_GAME_SECONDS = 3 * 60
+MAX_GAME_SECONDS = 60 * 60
+
+
+class Game_Clock():
+    """
+    The timing of a queue's games and a rolling estimate of how long a game lasts.
+
+    Attributes:
+        game_started (float): When the current game started, in seconds since the epoch, or None if not yet known.
+        estimate (float): The estimated length of a game in seconds, or None if no game has been timed.
+        games_timed (int): The number of games counted in the estimate.
+        clock (callable): Returns the current time in seconds since the epoch.
+    """
+
+    def __init__(self, clock=time.time):
+        """
+        Initialise a Game_Clock with no games timed.
+
+        Args:
+            clock (callable): Returns the current time in seconds since the epoch.
+        """
+        self.clock = clock
+        self.game_started = None
+        self.estimate = None
+        self.games_timed = 0
+
+
+    def start_game(self):
+        """
+        Records that a game has ended and the next has started, updating the estimate with its length.
+        """
+        now = self.clock()
+        if self.game_started is not None:
+            length = now - self.game_started
+            if MIN_GAME_SECONDS <= length <= MAX_GAME_SECONDS:
+                self.estimate = length if self.estimate is None else SMOOTHING * length + (1 - SMOOTHING) * self.estimate
+                self.games_timed += 1
+        self.game_started = now
+
+
+    def stop(self):
+        """
+        Stops timing the current game, e.g. when the queue is ended, keeping the estimate for next time.
+        """
+        self.game_started = None
+
+
+    def get_game_seconds(self) -> float:
+        """
+        Returns the estimated length of a game in seconds, or DEFAULT_GAME_SECONDS if no game has been timed.
+        """
+        return DEFAULT_GAME_SECONDS if self.estimate is None else self.estimate
+
+
+    def seconds_until(self, games_after_this: int) -> float:
+        """
+        Estimates the seconds until a number of games after the current one have been played.
+
+        Args:
+            games_after_this (int): The number of games to wait for after the current game.
+
+        Returns:
+            seconds (float): The estimated seconds, or None if the current game has no start time.
+        """
+        if self.game_started is None:
+            return None
+        game_seconds = self.get_game_seconds()
+        remaining = max(0.0, game_seconds - (self.clock() - self.game_started))
+        return remaining + games_after_this * game_seconds
+
+
+    def to_dict(self) -> dict:
+        """
+        Returns the game clock as a dict of plain types, e.g. to save as JSON.
+        """
+        return {"game_started": self.game_started, "estimate": self.estimate, "games_timed": self.games_timed}
+
+
+    @classmethod
+    def from_dict(cls, state: dict, clock=time.time):
+        """
+        Creates a game clock from the dict returned by to_dict.
+        """
+        game_clock = cls(clock=clock)
+        game_clock.game_started = state["game_started"]
+        game_clock.estimate = state["estimate"]
+        game_clock.games_timed = state["games_timed"]
+        return game_clock
+
+
+
+def format_eta(seconds: float) -> str:
+    """
+    Formats an estimated wait in seconds to the nearest minute, e.g. 'in about 1 hour 5 minutes'.
+    """
+    minutes = int(round(seconds / 60))
+    if minutes < 1:
+        return "any moment now"
+    hours, minutes = divmod(minutes, 60)
+    parts = []
+    if hours:
+        parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
+    if minutes:
+        parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
+    return "in about " + " ".join(parts)
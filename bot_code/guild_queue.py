@@ -0,0 +1,357 @@
+"""
+Class for the Overwatch queues of a single Discord server (guild), with the state the bot keeps
+alongside them.
+
+Each Guild_Queue has its own lock, so commands changing one server's queues run one at a time while
+different servers' queues are changed in parallel.
+
+A server can run several named queues at once, e.g. one for Overwatch 1 and one for Overwatch 2.
+Each channel uses one of them, the main queue unless chosen with '!queue <name>'. An index of the
+queues each player is in is kept alongside, so commands across a player's queues only look at
+those queues.
+"""
+
+# Standard library imports
+import asyncio
+import re
+import time
+
+# Local imports
+from guild_settings import DEFAULT_PREFIX
+from overwatch_queue import Overwatch_Queue
+from status_message import Live_Status_Message
+
+
+# Queues longer than this are shown a page at a time, to keep messages within Discord's 2000 character limit.
+STATUS_PAGE_SIZE = 20
+# The queue channels use until they choose another.
+DEFAULT_QUEUE_NAME = "main"
+QUEUE_NAME_PATTERN = re.compile(r"^[a-z0-9_-]{1,20}$")
+
+
+def get_no_queue_response(prefix: str) -> str:
+    """
+    Gets the reply for when there is no queue, telling users how to create one.
+
+    Args:
+        prefix (str): The guild's command prefix.
+
+    Returns:
+        str
+    """
+    return f"There is no queue. Type \'{prefix}queue\' to create one."
+
+
+
+class Guild_Queue():
+    """
+    The Overwatch queues of one guild, its pinned status message and the lock serialising its commands.
+
+    Attributes:
+        guild_id (int): The id of the guild, or of the channel for direct messages.
+        queues (dict): The guild's queues (Overwatch_Queue objects), keyed by name.
+        queue_name (str): The name of the queue chosen by select_queue, used by queue.
+        channel_queues (dict): The name of the queue each channel uses, keyed by channel id, if not the main queue.
+        player_queues (dict): The names of the queues each player is in, keyed by player name.
+        status_message (Live_Status_Message): The guild's pinned queue status message.
+        get_prefix (callable): Returns the guild's current command prefix, for the commands its messages suggest.
+        lock (asyncio.Lock): Held while a command uses the queues.
+        saved_version (tuple): The version of the queues last saved to storage.
+        last_used (float): When the queues were last used by a command, from time.monotonic.
+    """
+
+    def __init__(self, guild_id: int, mode: int = 2, status_debounce: float = 1.5,
+                 queue: Overwatch_Queue = None, dispatcher=None, get_prefix=None):
+        """
+        Initialise a Guild_Queue with only a main queue, empty unless given a queue.
+
+        Args:
+            guild_id (int): The id of the guild.
+            mode (int): Whether playing Overwatch 1 or 2.
+            status_debounce (float): Seconds to wait after a change before editing the status message.
+            queue (Overwatch_Queue): A main queue to use, e.g. restored from storage, or None for a new queue.
+            dispatcher (Outbound_Dispatcher): Sends the status message's requests, or None to send directly.
+            get_prefix (callable): Returns the guild's current command prefix, or None to use the default prefix.
+                Read each time a message is made, as the prefix can change while the queues are in memory.
+        """
+        self.guild_id = guild_id
+        self.get_prefix = get_prefix if get_prefix is not None else lambda: DEFAULT_PREFIX
+        self.queues = {DEFAULT_QUEUE_NAME: queue if queue is not None else Overwatch_Queue(mode=mode)}
+        self.queue_name = DEFAULT_QUEUE_NAME
+        self.channel_queues = {}
+        self.player_queues = {}
+        # The version and players of each queue when last indexed, keyed by queue name.
+        self.__indexed_queues = {}
+        # Increased when a queue is added or removed, or a channel changes queue.
+        self.__layout_version = 0
+        self.update_index()
+        self.saved_version = self.get_version()
+        self.status_message = Live_Status_Message(render=self.get_live_status, debounce=status_debounce,
+                                                  dispatcher=dispatcher)
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+    @property
+    def queue(self) -> Overwatch_Queue:
+        """
+        The queue chosen by select_queue, i.e. the one used by the channel of the command being run.
+        """
+        return self.queues[self.queue_name]
+
+
+    def get_version(self) -> tuple:
+        """
+        Gets a version of the guild's queues, which differs after any change to them.
+
+        Returns:
+            tuple
+        """
+        return (self.__layout_version,) + tuple(queue.version for queue in self.queues.values())
+
+
+    def get_channel_queue_name(self, channel_id: int) -> str:
+        """
+        Gets the name of the queue a channel uses.
+
+        Returns:
+            str
+        """
+        return self.channel_queues.get(channel_id, DEFAULT_QUEUE_NAME)
+
+
+    def select_queue(self, channel_id: int):
+        """
+        Chooses the queue used by a channel as the queue for the command being run.
+
+        Args:
+            channel_id (int): The id of the channel the command was used in.
+        """
+        self.queue_name = self.get_channel_queue_name(channel_id)
+
+
+    def use_queue(self, channel_id: int, name: str, mode: int = 2) -> bool:
+        """
+        Makes a channel use the named queue, creating it if the guild does not have it, and selects it.
+
+        Args:
+            channel_id (int): The id of the channel.
+            name (str): The name of the queue, matching QUEUE_NAME_PATTERN.
+            mode (int): Whether a created queue is for Overwatch 1 or 2.
+
+        Returns:
+            created (bool): Whether the queue was created.
+        """
+        created = name not in self.queues
+        if created:
+            self.queues[name] = Overwatch_Queue(mode=mode)
+        if name == DEFAULT_QUEUE_NAME:
+            self.channel_queues.pop(channel_id, None)
+        else:
+            self.channel_queues[channel_id] = name
+        self.queue_name = name
+        self.__layout_version += 1
+        return created
+
+
+    def remove_queue(self, name: str):
+        """
+        Removes a named queue, moving the channels using it back to the main queue.
+        The main queue is never removed.
+
+        Args:
+            name (str): The name of the queue.
+        """
+        if name == DEFAULT_QUEUE_NAME or name not in self.queues:
+            return
+        del self.queues[name]
+        self.__index_players(name, set(), None)
+        del self.__indexed_queues[name]
+        self.channel_queues = {channel_id: queue_name for channel_id, queue_name in self.channel_queues.items()
+                               if queue_name != name}
+        if self.queue_name == name:
+            self.queue_name = DEFAULT_QUEUE_NAME
+        self.__layout_version += 1
+
+
+    def update_index(self):
+        """
+        Brings the index of the queues each player is in up to date with any queues that have changed.
+        Called after each command, so only the queues the command changed are looked through.
+        """
+        for name, queue in self.queues.items():
+            indexed = self.__indexed_queues.get(name)
+            if indexed is None or indexed[0] != queue.version:
+                self.__index_players(name, {player.name for player in queue.players}, queue.version)
+
+
+    def get_player_queues(self, player_name: str) -> list:
+        """
+        Gets the names of the queues a player is in, from the index.
+
+        Args:
+            player_name (str): The name of the player.
+
+        Returns:
+            list
+        """
+        return sorted(self.player_queues.get(player_name, ()))
+
+
+    def __index_players(self, name: str, player_names: set, version: int):
+        """
+        Private function. Records that a queue's players are now player_names at a version of the
+        queue, updating only the players who have joined or left it since it was last indexed.
+        Called in update_index and remove_queue.
+        """
+        indexed = self.__indexed_queues.get(name)
+        indexed_names = indexed[1] if indexed is not None else set()
+        for player_name in player_names - indexed_names:
+            self.player_queues.setdefault(player_name, set()).add(name)
+        for player_name in indexed_names - player_names:
+            self.player_queues[player_name].discard(name)
+            if not self.player_queues[player_name]:
+                del self.player_queues[player_name]
+        self.__indexed_queues[name] = (version, player_names)
+
+
+    def get_queue_mode(self, queue: Overwatch_Queue = None) -> int:
+        """
+        Gets the mode of a queue.
+
+        Args:
+            queue (Overwatch_Queue): The queue, or None for the selected queue.
+
+        Returns:
+            int
+        """
+        queue = self.queue if queue is None else queue
+        queue_mode = 2 if queue.player_cutoff == 5 else 1
+        return queue_mode
+
+
+    def get_queue_status(self, page: int = 1, show_estimates: bool = False, queue: Overwatch_Queue = None) -> str:
+        """
+        Gets the status of a queue, split into pages if there are too many players for one message.
+
+        Args:
+            page (int): The page to show if the queue is split into pages.
+            show_estimates (bool): Whether to estimate when each waiting player shown will next play.
+                The pinned status message leaves these out, as it is only edited when the queue changes.
+            queue (Overwatch_Queue): The queue, or None for the selected queue.
+
+        Returns:
+            str
+        """
+        queue = self.queue if queue is None else queue
+        if len(queue.players) <= STATUS_PAGE_SIZE:
+            message = queue.print_players()
+            return message + queue.print_wait_estimates() if show_estimates else message
+        message = queue.print_players_page(page, STATUS_PAGE_SIZE)
+        prefix = self.get_prefix()
+        message += (f" Type \'{prefix}status\' followed by a page number to see another page,"
+                    f" or \'{prefix}status me\' to find your place.")
+        if show_estimates:
+            message += queue.print_wait_estimates(page, STATUS_PAGE_SIZE)
+        return message
+
+
+    def get_live_status(self, max_length: int = 2000) -> str:
+        """
+        Gets the content of the pinned queue status message, showing every named queue with players.
+
+        The status is a single Discord message, so once the queues shown would make it max_length or
+        longer, the rest are left out and counted at the end instead.
+
+        Args:
+            max_length (int): The length the message must be shorter than.
+
+        Returns:
+            str
+        """
+        named_queues = [(name, queue) for name, queue in self.queues.items()
+                        if queue.players and name != DEFAULT_QUEUE_NAME]
+        if not named_queues:
+            main_queue = self.queues[DEFAULT_QUEUE_NAME]
+            if not main_queue.players:
+                return get_no_queue_response(self.get_prefix())
+            sections = [self.get_queue_status(queue=main_queue)]
+        else:
+            sections = [f"**{name}** (Overwatch {self.get_queue_mode(queue)}):\n{self.get_queue_status(queue=queue)}"
+                        for name, queue in self.queues.items() if queue.players]
+        message = "\n\n".join(sections)
+        if len(message) < max_length:
+            return message
+
+        # Keep room for the note, written with the most queues it could count.
+        note_length = len(self.__left_out_note(len(sections)))
+        shown, length = [], 0
+        for section in sections:
+            if length + len(section) + 2 + note_length >= max_length:
+                break
+            shown.append(section)
+            length += len(section) + 2
+        if not shown:
+            # A queue too long to show in full, e.g. of very long names, is cut short.
+            shown.append(sections[0][:max_length - note_length - 6] + "...")
+        if len(shown) == len(sections):
+            return "\n\n".join(shown)
+        return "\n\n".join(shown + [self.__left_out_note(len(sections) - len(shown))])
+
+
+    def __left_out_note(self, count: int) -> str:
+        """
+        Private function. Gets the note ending the pinned status message when count queues did not fit
+        in it. Called in get_live_status.
+        """
+        return (f"{count} more {'queue is' if count == 1 else 'queues are'} not shown."
+                f" Type \'{self.get_prefix()}queues\' to list every queue.")
+
+
+    def refresh_status(self, channel):
+        """
+        Schedules the pinned queue status message to be updated after the queue has changed.
+
+        Args:
+            channel (discord.abc.Messageable): The channel the queue was changed from.
+        """
+        self.status_message.request_update(channel)
+
+
+    def to_dict(self) -> dict:
+        """
+        Returns the state of the guild's queues as a dict of plain types, e.g. to save as JSON.
+
+        Returns:
+            state (dict): The state of the queues.
+        """
+        return {"queues": {name: queue.to_dict() for name, queue in self.queues.items()},
+                "channel_queues": {str(channel_id): name for channel_id, name in self.channel_queues.items()}}
+
+
+    @classmethod
+    def from_dict(cls, guild_id: int, state: dict, status_debounce: float = 1.5, dispatcher=None,
+                  get_prefix=None):
+        """
+        Creates a Guild_Queue from the state returned by to_dict.
+
+        Args:
+            guild_id (int): The id of the guild.
+            state (dict): The state of the queues, or of a single queue saved before named queues.
+            status_debounce (float): Seconds to wait after a change before editing the status message.
+            dispatcher (Outbound_Dispatcher): Sends the status message's requests, or None to send directly.
+            get_prefix (callable): Returns the guild's current command prefix, or None to use the default prefix.
+
+        Returns:
+            guild_queue (Guild_Queue): The restored queues.
+        """
+        if "queues" not in state:
+            state = {"queues": {DEFAULT_QUEUE_NAME: state}, "channel_queues": {}}
+        queues = {name: Overwatch_Queue.from_dict(queue_state) for name, queue_state in state["queues"].items()}
+        guild_queue = cls(guild_id, status_debounce=status_debounce, queue=queues.pop(DEFAULT_QUEUE_NAME),
+                          dispatcher=dispatcher, get_prefix=get_prefix)
+        guild_queue.queues.update(queues)
+        guild_queue.channel_queues = {int(channel_id): name for channel_id, name in state["channel_queues"].items()}
+        guild_queue.update_index()
+        guild_queue.saved_version = guild_queue.get_version()
+        return guild_queue
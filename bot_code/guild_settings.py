@@ -0,0 +1,178 @@
+"""
+Classes for each guild's settings - its command prefix, the game mode of new queues, how many
+players swap out each game, and the patch notes feeds it follows - kept in the database and
+served from memory.
+
+Every process holds all saved settings in a cache, so reading a guild's settings, e.g. its prefix
+for every message, never touches the database. Each save gives the guild's settings the next
+version number. Processes pick up settings saved elsewhere, e.g. by another shard, by reading only
+the rows with a version above the highest they have, so changes apply without a restart.
+"""
+
+# Local imports
+from patch_scraper import PATCH_FEEDS
+
+
+DEFAULT_PREFIX = "!"
+MAX_PREFIX_LENGTH = 5
+# The settings that can be changed, and what each holds.
+SETTING_HELP = {"prefix": f"the characters commands start with, up to {MAX_PREFIX_LENGTH}",
+                "mode": "the Overwatch game (1 or 2) new queues are for",
+                "swaps": "the most players swapped out of the current players each game (1 to 3)",
+                "feeds": f"the patch notes the patchnotes command posts, from: {', '.join(PATCH_FEEDS)}"}
+
+
+class Guild_Settings():
+    """
+    The settings of a guild. Never changed once made, so a cached copy can be read at any time.
+
+    Attributes:
+        prefix (str): The characters commands start with, e.g. '!'.
+        mode (int): Whether new queues are for Overwatch 1 or 2.
+        swaps (int): The most players swapped out of the current players each game.
+        feeds (tuple): The patch notes feeds !patchnotes and !stoppatchnotes use when not given one.
+    """
+
+    def __init__(self, prefix: str = DEFAULT_PREFIX, mode: int = 2, swaps: int = 3, feeds: tuple = ("live", )):
+        self.prefix = prefix
+        self.mode = mode
+        self.swaps = swaps
+        self.feeds = tuple(feeds)
+
+
+    def with_setting(self, name: str, value: str) -> "Guild_Settings":
+        """
+        Makes a copy of the settings with one setting changed, from what was typed.
+
+        Args:
+            name (str): The setting, one of SETTING_HELP.
+            value (str): The new value, e.g. '?' for the prefix or 'live experimental' for the feeds.
+
+        Returns:
+            Guild_Settings: The changed copy.
+
+        Raises:
+            ValueError: If there is no such setting, or the value is not allowed, with a message to reply with.
+        """
+        state = self.to_dict()
+        if name == "prefix":
+            if not value or len(value) > MAX_PREFIX_LENGTH or any(character.isspace() for character in value):
+                raise ValueError(f"The prefix must be 1 to {MAX_PREFIX_LENGTH} characters, without spaces.")
+            state["prefix"] = value
+        elif name == "mode":
+            if value not in ("1", "2"):
+                raise ValueError("The mode must be 1 or 2, for Overwatch 1 or 2.")
+            state["mode"] = int(value)
+        elif name == "swaps":
+            if value not in ("1", "2", "3"):
+                raise ValueError("The number of swaps must be 1, 2 or 3.")
+            state["swaps"] = int(value)
+        elif name == "feeds":
+            feeds = [feed.lower() for feed in value.split()]
+            if not feeds or any(feed not in PATCH_FEEDS for feed in feeds):
+                raise ValueError(f"Choose the feeds from: {', '.join(PATCH_FEEDS)}.")
+            state["feeds"] = [feed for feed in PATCH_FEEDS if feed in feeds]
+        else:
+            raise ValueError(f"There is no {name} setting. Choose from: {', '.join(SETTING_HELP)}.")
+        return Guild_Settings.from_dict(state)
+
+
+    def describe(self) -> str:
+        """
+        Describes the settings for a Discord message.
+
+        Returns:
+            message (str)
+        """
+        values = {"prefix": self.prefix, "mode": self.mode, "swaps": self.swaps, "feeds": " ".join(self.feeds)}
+        return "\n".join(f"\t{name}: {values[name]} - {description}" for name, description in SETTING_HELP.items())
+
+
+    def to_dict(self) -> dict:
+        """
+        Returns the settings as a JSON-serialisable dict.
+        """
+        return {"prefix": self.prefix, "mode": self.mode, "swaps": self.swaps, "feeds": list(self.feeds)}
+
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "Guild_Settings":
+        """
+        Creates settings from a dict made by to_dict. Settings missing from it, e.g. added since it
+        was saved, are left at their defaults.
+        """
+        return cls(**{name: value for name, value in state.items() if name in SETTING_HELP})
+
+
+
+class Settings_Store():
+    """
+    A cache of every guild's saved settings, kept up to date with the database by version.
+
+    Attributes:
+        storage (Storage): The database the settings are saved in.
+        cache (dict): The Guild_Settings of each guild with saved settings, keyed by guild id.
+        version (int): The highest settings version loaded.
+        defaults (Guild_Settings): The settings of guilds that have saved none.
+    """
+
+    def __init__(self, storage):
+        """
+        Initialise an empty store. Call refresh to load the saved settings.
+
+        Args:
+            storage (Storage): The database the settings are saved in.
+        """
+        self.storage = storage
+        self.cache = {}
+        self.version = 0
+        self.defaults = Guild_Settings()
+
+
+    def get(self, guild_id: int) -> Guild_Settings:
+        """
+        Gets a guild's settings from the cache.
+
+        Args:
+            guild_id (int): The guild, or None for a direct message.
+
+        Returns:
+            Guild_Settings: The guild's settings, or the defaults if it has saved none.
+        """
+        return self.cache.get(guild_id, self.defaults)
+
+
+    async def refresh(self) -> list:
+        """
+        Loads the settings saved since the last refresh, by this process or any other.
+
+        Returns:
+            guild_ids (list): The guilds whose settings changed.
+        """
+        rows = await self.storage.get_changed_guild_settings(self.version)
+        for guild_id, state, version in rows:
+            self.cache[guild_id] = Guild_Settings.from_dict(state)
+            self.version = max(self.version, version)
+        return [guild_id for guild_id, _, _ in rows]
+
+
+    async def update(self, guild_id: int, name: str, value: str) -> Guild_Settings:
+        """
+        Changes one of a guild's settings, saving it and applying it in this process straight away.
+
+        Args:
+            guild_id (int): The guild.
+            name (str): The setting, one of SETTING_HELP.
+            value (str): The new value, as typed.
+
+        Returns:
+            Guild_Settings: The guild's new settings.
+
+        Raises:
+            ValueError: If the setting or value is not allowed, with a message to reply with.
+        """
+        settings = self.get(guild_id).with_setting(name, value)
+        await self.storage.save_guild_settings(guild_id, settings.to_dict())
+        # Load it, with anything else saved meanwhile, so the cache's version never skips a change.
+        await self.refresh()
+        return self.get(guild_id)
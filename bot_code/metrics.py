@@ -0,0 +1,379 @@
+"""
+Class for recording the bot's command and operation metrics, with helpers to export them.
+
+Metrics are kept in memory as plain counters and fixed-bucket histograms, so recording one is a
+couple of dict lookups and a bisect. They can be exported in the Prometheus text format, or
+summarised as a Discord message.
+"""
+
+# Standard library imports
+import datetime
+import os
+import time
+from bisect import bisect_left
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+
+# Latency histogram bucket upper bounds, in seconds.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram():
+    """
+    A histogram of observed values with fixed bucket upper bounds.
+
+    Attributes:
+        buckets (tuple): The bucket upper bounds, in increasing order.
+        bucket_counts (list): The count of observations in each bucket, with a final +Inf bucket.
+        count (int): The number of observations.
+        sum (float): The total of all observations.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Initialise an empty histogram.
+
+        Args:
+            buckets (tuple): The bucket upper bounds, in increasing order.
+        """
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+
+    def observe(self, value: float):
+        """
+        Records a single observation.
+
+        Args:
+            value (float): The value to record.
+        """
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls into.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            value (float): The bucket upper bound, infinity if in the last bucket, or 0 if empty.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+
+class Operation_Timer():
+    """
+    Context manager that records the latency, and any exception, of an operation into Bot_Metrics.
+    """
+
+    def __init__(self, metrics, operation: str):
+        self.metrics = metrics
+        self.operation = operation
+
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe_operation(self.operation, time.perf_counter() - self.start, exc_type)
+        # Never suppress the exception.
+        return False
+
+
+
+class Bot_Metrics():
+    """
+    Metrics of the commands the bot has run and of its slower operations (scraper, storage).
+
+    Attributes:
+        start_time (datetime.datetime): When metrics started being recorded.
+        command_latency (dict): A Histogram of latency in seconds for each command name.
+        command_counts (dict): A count for each (command, guild, outcome) where outcome is success or error.
+        command_errors (dict): A count for each (command, error type).
+        operation_latency (dict): A Histogram of latency in seconds for each operation name.
+        operation_errors (dict): A count for each (operation, error type).
+        gauges (dict): The latest value of each gauge, e.g. resident memory, keyed by name.
+        gauge_help (dict): The description of each gauge, keyed by name.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Initialise empty metrics.
+
+        Args:
+            buckets (tuple): The latency histogram bucket upper bounds, in seconds.
+        """
+        self.buckets = buckets
+        self.start_time = datetime.datetime.now()
+        self.command_latency = {}
+        self.command_counts = {}
+        self.command_errors = {}
+        self.operation_latency = {}
+        self.operation_errors = {}
+        self.gauges = {}
+        self.gauge_help = {}
+
+
+    def observe_command(self, command: str, guild: str, seconds: float, failed: bool):
+        """
+        Records that a command has finished running.
+
+        Args:
+            command (str): The name of the command.
+            guild (str): The id of the guild the command was used in, or 'dm'.
+            seconds (float): How long the command took to run.
+            failed (bool): Whether the command raised an error.
+        """
+        histogram = self.command_latency.get(command)
+        if histogram is None:
+            histogram = self.command_latency[command] = Histogram(self.buckets)
+        histogram.observe(seconds)
+        key = (command, guild, "error" if failed else "success")
+        self.command_counts[key] = self.command_counts.get(key, 0) + 1
+
+
+    def record_command_error(self, command: str, error: Exception):
+        """
+        Records an error raised by (or before running) a command.
+
+        Args:
+            command (str): The name of the command, or 'unknown' if no command was found.
+            error (Exception): The error raised, unwrapped from any CommandInvokeError.
+        """
+        key = (command, type(error).__name__)
+        self.command_errors[key] = self.command_errors.get(key, 0) + 1
+
+
+    def observe_operation(self, operation: str, seconds: float, error_type: type = None):
+        """
+        Records that an operation, such as a scraper or storage call, has finished.
+
+        Args:
+            operation (str): The name of the operation, e.g. 'scraper.check_for_new_live_patch'.
+            seconds (float): How long the operation took.
+            error_type (type): The type of exception the operation raised, or None.
+        """
+        histogram = self.operation_latency.get(operation)
+        if histogram is None:
+            histogram = self.operation_latency[operation] = Histogram(self.buckets)
+        histogram.observe(seconds)
+        if error_type is not None:
+            key = (operation, error_type.__name__)
+            self.operation_errors[key] = self.operation_errors.get(key, 0) + 1
+
+
+    def set_gauge(self, name: str, value: float, description: str):
+        """
+        Records the latest value of a gauge, a measurement that can go up or down.
+
+        Args:
+            name (str): The name of the gauge, e.g. 'resident_memory_bytes'.
+            value (float): The value measured.
+            description (str): What the gauge measures, for the Prometheus help text.
+        """
+        self.gauges[name] = value
+        self.gauge_help[name] = description
+
+
+    def time_operation(self, operation: str) -> Operation_Timer:
+        """
+        Returns a context manager that times the operation in its with block.
+
+        Args:
+            operation (str): The name of the operation.
+
+        Returns:
+            timer (Operation_Timer): The context manager.
+        """
+        return Operation_Timer(self, operation)
+
+
+    def to_prometheus(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+
+        Returns:
+            text (str): The metrics text.
+        """
+        lines = []
+        lines.append("# HELP overwatch_bot_commands_total Commands run, by command, guild and outcome.")
+        lines.append("# TYPE overwatch_bot_commands_total counter")
+        for (command, guild, outcome), count in sorted(self.command_counts.items()):
+            labels = format_labels(command=command, guild=guild, outcome=outcome)
+            lines.append(f"overwatch_bot_commands_total{labels} {count}")
+
+        lines.append("# HELP overwatch_bot_command_errors_total Command errors, by command and error type.")
+        lines.append("# TYPE overwatch_bot_command_errors_total counter")
+        for (command, error), count in sorted(self.command_errors.items()):
+            lines.append(f"overwatch_bot_command_errors_total{format_labels(command=command, error=error)} {count}")
+
+        lines.append("# HELP overwatch_bot_command_duration_seconds Time taken to run each command.")
+        lines.append("# TYPE overwatch_bot_command_duration_seconds histogram")
+        for command, histogram in sorted(self.command_latency.items()):
+            lines.extend(format_histogram("overwatch_bot_command_duration_seconds", histogram, command=command))
+
+        lines.append("# HELP overwatch_bot_operation_errors_total Scraper and storage errors, by operation and error type.")
+        lines.append("# TYPE overwatch_bot_operation_errors_total counter")
+        for (operation, error), count in sorted(self.operation_errors.items()):
+            labels = format_labels(operation=operation, error=error)
+            lines.append(f"overwatch_bot_operation_errors_total{labels} {count}")
+
+        lines.append("# HELP overwatch_bot_operation_duration_seconds Time taken by scraper and storage operations.")
+        lines.append("# TYPE overwatch_bot_operation_duration_seconds histogram")
+        for operation, histogram in sorted(self.operation_latency.items()):
+            lines.extend(format_histogram("overwatch_bot_operation_duration_seconds", histogram, operation=operation))
+
+        for name, value in sorted(self.gauges.items()):
+            lines.append(f"# HELP overwatch_bot_{name} {self.gauge_help[name]}")
+            lines.append(f"# TYPE overwatch_bot_{name} gauge")
+            lines.append(f"overwatch_bot_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+    def write_prometheus(self, fpath: str):
+        """
+        Writes the metrics to a file for the Prometheus node exporter's textfile collector.
+
+        The file is written alongside and then moved into place, so it is never read half written.
+
+        Args:
+            fpath (str): The file to write to.
+        """
+        tmp_fpath = fpath + ".tmp"
+        with open(tmp_fpath, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_fpath, fpath)
+
+
+    def summary(self) -> str:
+        """
+        Returns a Discord-friendly summary of the metrics.
+
+        Returns:
+            message (str): The summary message.
+        """
+        message = f"Bot stats since {self.start_time.strftime('%d %B, %Y %H:%M')}:"
+        if not self.command_latency and not self.command_errors:
+            message += "\nNo commands have been run yet."
+        for command, histogram in sorted(self.command_latency.items()):
+            errors = sum(count for (name, _, outcome), count in self.command_counts.items()
+                         if name == command and outcome == "error")
+            message += (f"\n\t!{command}: {histogram.count} run, {errors} failed, "
+                        f"mean {1000 * histogram.sum / histogram.count:.1f} ms, "
+                        f"p95 < {format_bound(histogram.quantile(0.95))}")
+        if self.command_errors:
+            message += "\n\nErrors:"
+            for (command, error), count in sorted(self.command_errors.items()):
+                message += f"\n\t!{command}: {error} x{count}"
+        if self.operation_latency:
+            message += "\n\nOperations:"
+            for operation, histogram in sorted(self.operation_latency.items()):
+                errors = sum(count for (name, _), count in self.operation_errors.items() if name == operation)
+                message += (f"\n\t{operation}: {histogram.count} run, {errors} failed, "
+                            f"mean {1000 * histogram.sum / histogram.count:.1f} ms")
+        if self.gauges:
+            message += "\n\nGauges:"
+            for name, value in sorted(self.gauges.items()):
+                message += f"\n\t{name}: {value:g}"
+        return message
+
+
+    def summary_messages(self, max_length: int = 2000) -> list:
+        """
+        Splits the summary into Discord messages each shorter than max_length, between lines, as a
+        bot running many commands has a summary longer than one message allows.
+
+        Args:
+            max_length (int): The length every message must be shorter than.
+
+        Returns:
+            messages (list): The summary's messages, in order.
+        """
+        messages = [""]
+        for line in self.summary().split("\n"):
+            # A line too long for a message of its own, e.g. a long error, is cut short.
+            if len(line) >= max_length:
+                line = line[:max_length - 4] + "..."
+            if messages[-1] and len(messages[-1]) + 1 + len(line) >= max_length:
+                messages.append("")
+            messages[-1] = f"{messages[-1]}\n{line}" if messages[-1] else line
+        return [message.strip("\n") for message in messages if message.strip()]
+
+
+
+def get_resident_memory() -> int:
+    """
+    Returns the resident memory of this process in bytes.
+
+    Read from /proc on Linux. Elsewhere, falls back to the peak resident memory, which never goes
+    down, or None if that is not available either.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes.
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def format_labels(**labels) -> str:
+    """
+    Formats labels as a Prometheus label set, escaping the values.
+    """
+    escaped = (f'{name}="{escape_label_value(str(value))}"' for name, value in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+
+def escape_label_value(value: str) -> str:
+    """
+    Escapes backslashes, double quotes and new lines in a Prometheus label value.
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_histogram(name: str, histogram: Histogram, **labels) -> list:
+    """
+    Formats a histogram as Prometheus cumulative bucket, sum and count lines.
+    """
+    lines = []
+    cumulative = 0
+    for bound, bucket_count in zip(histogram.buckets + (float("inf"),), histogram.bucket_counts):
+        cumulative += bucket_count
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append(f"{name}_bucket{format_labels(**labels, le=le)} {cumulative}")
+    lines.append(f"{name}_sum{format_labels(**labels)} {histogram.sum}")
+    lines.append(f"{name}_count{format_labels(**labels)} {histogram.count}")
+    return lines
+
+
+def format_bound(seconds: float) -> str:
+    """
+    Formats a histogram bucket bound in seconds for display.
+    """
+    if seconds == float("inf"):
+        return "inf"
+    return f"{1000 * seconds:g} ms" if seconds < 1 else f"{seconds:g} s"
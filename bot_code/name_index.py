@@ -0,0 +1,245 @@
+"""
+Class for finding players in a queue from what someone typed: a Discord mention, the player's
+name, or a shortened or slightly misspelt version of it.
+
+Names are normalised (accents, case and punctuation removed) and kept in a trie, whose nodes count
+the names below them, so a unique prefix is found by walking the typed name and then the one path
+below it. Near-misses are found by storing each name with every single character deleted: two
+names one deletion, insertion, substitution or swap apart share one of these. Every lookup takes
+time proportional to the length of the typed name rather than the number of players, and the
+index is updated as each player joins or leaves.
+"""
+
+# Standard library imports
+import re
+import unicodedata
+
+
+MENTION_PATTERN = re.compile(r"^<@!?(\d+)>$")
+# Shorter names are not matched to near-misses, as almost every short name is near another.
+MIN_FUZZY_LENGTH = 3
+# The most players listed when a name matches several.
+MAX_CANDIDATES = 5
+
+
+class Trie_Node():
+    """
+    A node of the name trie.
+
+    Attributes:
+        children (dict): The child nodes, keyed by character.
+        count (int): The number of names ending at or below this node.
+        is_name (bool): Whether a name ends at this node.
+    """
+
+    def __init__(self):
+        self.children = {}
+        self.count = 0
+        self.is_name = False
+
+
+
+class Name_Index():
+    """
+    An index of the players in a queue by name, normalised name, name prefix and Discord user id.
+
+    Attributes:
+        by_name (dict): Each player, keyed by exact name.
+        by_user_id (dict): Each player with a known Discord user id, keyed by the id.
+        by_key (dict): The players with each normalised name, keyed by it.
+        root (Trie_Node): The root of the trie of normalised names.
+        deletes (dict): The normalised names that each string is the name with one character deleted from.
+    """
+
+    def __init__(self, players=()):
+        """
+        Initialise an index of players.
+
+        Args:
+            players (iterable): The Player objects to index.
+        """
+        self.by_name = {}
+        self.by_user_id = {}
+        self.by_key = {}
+        self.root = Trie_Node()
+        self.deletes = {}
+        for player in players:
+            self.add(player)
+
+
+    def add(self, player):
+        """
+        Adds a player to the index.
+
+        Args:
+            player (Player): The player joining the queue.
+        """
+        self.by_name[player.name] = player
+        if player.user_id is not None:
+            self.by_user_id[player.user_id] = player
+        key = normalise_name(player.name)
+        if not key:
+            return
+        players = self.by_key.setdefault(key, [])
+        players.append(player)
+        if len(players) > 1:
+            return
+        node = self.root
+        node.count += 1
+        for character in key:
+            node = node.children.setdefault(character, Trie_Node())
+            node.count += 1
+        node.is_name = True
+        for deleted in get_deletions(key):
+            self.deletes.setdefault(deleted, set()).add(key)
+
+
+    def remove(self, player):
+        """
+        Removes a player from the index.
+
+        Args:
+            player (Player): The player leaving the queue.
+        """
+        if self.by_name.get(player.name) is player:
+            del self.by_name[player.name]
+        if player.user_id is not None and self.by_user_id.get(player.user_id) is player:
+            del self.by_user_id[player.user_id]
+        key = normalise_name(player.name)
+        players = self.by_key.get(key)
+        if not players or player not in players:
+            return
+        players.remove(player)
+        if players:
+            return
+        del self.by_key[key]
+        node = self.root
+        node.count -= 1
+        for character in key:
+            child = node.children[character]
+            child.count -= 1
+            if child.count == 0:
+                # Nothing else is below here, so drop the rest of the path.
+                del node.children[character]
+                break
+            node = child
+        else:
+            node.is_name = False
+        for deleted in get_deletions(key):
+            keys = self.deletes[deleted]
+            keys.discard(key)
+            if not keys:
+                del self.deletes[deleted]
+
+
+    def resolve(self, text: str) -> list:
+        """
+        Finds the players someone meant by text, trying in turn a mention, the exact name, the normalised
+        name, a unique prefix of normalised names, and near-misses of the normalised name.
+
+        Args:
+            text (str): What was typed, e.g. '<@1234>', 'Lúcio', 'luc' or 'lucoi'.
+
+        Returns:
+            players (list): The one player meant, several players if text could mean any of them, or none.
+        """
+        user_id = parse_mention(text)
+        if user_id is not None:
+            player = self.by_user_id.get(user_id)
+            return [player] if player is not None else []
+        if text in self.by_name:
+            return [self.by_name[text]]
+        key = normalise_name(text)
+        if not key:
+            return []
+        if key in self.by_key:
+            return list(self.by_key[key])
+        prefix_keys = self.__find_prefix_keys(key)
+        if prefix_keys:
+            return [player for prefix_key in prefix_keys for player in self.by_key[prefix_key]]
+        if len(key) >= MIN_FUZZY_LENGTH:
+            near_keys = self.__find_near_keys(key)
+            return [player for near_key in sorted(near_keys)[:MAX_CANDIDATES] for player in self.by_key[near_key]]
+        return []
+
+
+    def __find_prefix_keys(self, prefix: str) -> list:
+        """
+        Private function. Finds the normalised names starting with prefix, walking the one path down
+        if there is only one, else listing up to MAX_CANDIDATES of them.
+        """
+        node = self.root
+        for character in prefix:
+            node = node.children.get(character)
+            if node is None:
+                return []
+        if node.count == 1:
+            key = prefix
+            while not node.is_name:
+                character, node = next(iter(node.children.items()))
+                key += character
+            return [key]
+        keys = []
+        stack = [(prefix, node)]
+        while stack and len(keys) < MAX_CANDIDATES:
+            key, node = stack.pop()
+            if node.is_name:
+                keys.append(key)
+            stack.extend((key + character, child) for character, child in sorted(node.children.items(), reverse=True))
+        return keys
+
+
+    def __find_near_keys(self, key: str) -> set:
+        """
+        Private function. Finds the normalised names one deletion, insertion, substitution or swap from key.
+        """
+        near_keys = set(self.deletes.get(key, ()))
+        for deleted in get_deletions(key):
+            if deleted in self.by_key:
+                near_keys.add(deleted)
+            near_keys |= self.deletes.get(deleted, set())
+        near_keys.discard(key)
+        return near_keys
+
+
+
+def normalise_name(name: str) -> str:
+    """
+    Normalises a name for matching, removing accents, case, spaces and punctuation, e.g. 'Lúcio!' to 'lucio'.
+
+    Args:
+        name (str): The name.
+
+    Returns:
+        str: The normalised name, empty if it has no letters or digits.
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    return "".join(character for character in decomposed.casefold()
+                   if character.isalnum() and not unicodedata.combining(character))
+
+
+def get_deletions(key: str) -> set:
+    """
+    Gets every string made by deleting one character from key.
+
+    Args:
+        key (str): A normalised name.
+
+    Returns:
+        set
+    """
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+def parse_mention(text: str):
+    """
+    Gets the Discord user id from a mention, e.g. '<@1234>'.
+
+    Args:
+        text (str): What was typed.
+
+    Returns:
+        int: The user id, or None if text is not a mention.
+    """
+    mention = MENTION_PATTERN.match(text)
+    return int(mention.group(1)) if mention else None
@@ -7,8 +7,14 @@ Below these classes are common funtions for interacting with these classes.
 # Standard library imports
 import datetime
 from collections import deque
-from copy import deepcopy
-from math import floor
+from copy import copy, deepcopy
+from itertools import chain, islice
+from math import ceil, floor
+
+# Local imports
+from game_clock import Game_Clock, format_eta
+from name_index import Name_Index
+from session_stats import Session_Stats, PLAYING, WAITING, DELAYING
 
 
 class Player():
@@ -18,21 +24,25 @@ class Player():
     Attributes:
         name (str): The name of the Player.
         playing (bool): Whether a Player is currently playing a game.
+        user_id (int): The Discord user id of the Player, or None if not known.
     """
 
-    def __init__(self, name: str):
+    def __init__(self, name: str, user_id: int = None):
         """
         Initialise an Overwatch player.
 
         Args:
             name (str): The name of the Player.
+            user_id (int): The Discord user id of the Player, e.g. to find them from a mention.
         """
         self.name = name
+        self.user_id = user_id
         self.playing = False
         self.delaying = False
 
 
 
+
 class Overwatch_Queue():
     """
     A queue of Overwatch players (Player objects)
@@ -41,9 +51,14 @@ class Overwatch_Queue():
         players (list): The list of all players (Player objects).
         current_players (collections.deque): A deque of players (Player objects) currently playing
         waiting_players (collections.deque): A deque of players (Player objects) waiting to play
+        version (int): A counter increased by every change to the queue, used to cache its status message.
+        session (Session_Stats): The analytics of the queue's current session.
+        last_session (dict): The analytics of the session ended by empty_queue, or None.
+        game_clock (Game_Clock): The timing of the queue's games, to estimate waits.
+        name_index (Name_Index): The players indexed by name and user id, for finding them.
     """
 
-    def __init__(self, mode=1, players=[]):
+    def __init__(self, mode=1, players=None):
         """
         Initialise an Overwatch Queue with a list of players.
 
@@ -54,6 +69,8 @@ class Overwatch_Queue():
             mode (int): Whether playing Overwatch 1 or 2
             players (list): The list of players (Player objects) to start the queue.
         """
+        # Default to a new list, as a shared default list would be shared between every queue.
+        players = players if players is not None else []
         self.players = players
         self.delayed_players = []
         self.start_time = datetime.datetime.now()
@@ -71,14 +88,43 @@ class Overwatch_Queue():
         for player in self.waiting_players:
             player.playing = False
 
+        # Start the session analytics with the players given.
+        self.session = self.__new_session()
+        self.last_session = None
+        self.game_clock = Game_Clock()
+        self.__name_index = Name_Index(players)
+
         # Setup backup lists for undo-ing actions
         self.__backup_players = self.players
         self.__backup_delayed_players = self.delayed_players
         self.__backup_current_players = self.current_players
         self.__backup_waiting_players = self.waiting_players
+        self.__backup_session = self.session
+        self.__backup_game_clock = self.game_clock
+
+        # Setup the cached status message, rendered at __rendered_version
+        self.version = 0
+        self.__rendered_version = -1
+        self.__rendered_players = ""
+
+
+    @property
+    def name_index(self) -> Name_Index:
+        """
+        The players indexed by name and user id. Undo leaves it to be rebuilt here when next used,
+        rather than on every undo.
+        """
+        if self.__name_index is None:
+            self.__name_index = Name_Index(self.players)
+        return self.__name_index
+
+
+    @name_index.setter
+    def name_index(self, name_index: Name_Index):
+        self.__name_index = name_index
     
 
-    def add_player(self, player: Player) -> str:
+    def add_player(self, player: Player, prefix: str = "!") -> str:
         """
         Adds a player to the queue.
 
@@ -88,6 +134,7 @@ class Overwatch_Queue():
 
         Args:
             player (Player): A Player object to add to the queue.
+            prefix (str): The guild's command prefix, for the command the message suggests.
 
         Returns:
             message (str): A message saying whether the player has been added.
@@ -98,22 +145,86 @@ class Overwatch_Queue():
             message = (f"{player.name} is already a player in the queue.")
             return message
         # Add player to queue and current or waiting players.
+        was_rendered = self.__rendered_version == self.version
         self.players.append(player)
+        self.name_index.add(player)
         if len(self.current_players) < self.player_cutoff:
             self.current_players.append(player)
             player.playing = True
         else:
             self.waiting_players.append(player)
             player.playing = False
+        self.__update_session(player)
+        self.__mark_changed()
+
+        # Players are added at the end of the message, so extend the cached message rather than re-render it.
+        if was_rendered and (player.playing and not self.waiting_players):
+            self.__rendered_players += "\n\t" + player.name
+            self.__rendered_version = self.version
+        elif was_rendered and not player.playing:
+            if len(self.waiting_players) == 1:
+                self.__rendered_players += "\n\nThe players in the waiting queue are: "
+            self.__rendered_players += "\n\t" + player.name
+            self.__rendered_version = self.version
 
         message = f"{player.name} has been added to the queue."
         
         # If twelve players, recommend you have a six v. six.
         if len(self.players) == self.player_cutoff*2:
-            message += (f"\nOh damn! {player.name} is the {self.player_cutoff*2}th player - is it time for two teams?")
+            message += (f"\nOh damn! {player.name} is the {self.player_cutoff*2}th player - is it time for two teams? Type \'{prefix}teams\' to split the queue into balanced teams.")
         return message
 
 
+    def add_players(self, players: list, prefix: str = "!") -> str:
+        """
+        Adds several players to the queue at once, as add_player would one at a time.
+
+        The queue is backed up once, so a single undo removes the whole batch, and its status message
+        is rendered at most once afterwards rather than after each player.
+
+        Args:
+            players (list): The Player objects to add, in order. Players already in the queue are skipped.
+            prefix (str): The guild's command prefix, for the command the message suggests.
+
+        Returns:
+            message (str): A message saying which players have been added.
+        """
+        names_in_queue = set()
+        new_players, skipped = [], []
+        for player in players:
+            if player.name in self.name_index.by_name or player.name in names_in_queue:
+                skipped.append(player.name)
+            else:
+                names_in_queue.add(player.name)
+                new_players.append(player)
+        if new_players:
+            self.__backup_queue()
+        player_count = len(self.players)
+        for player in new_players:
+            self.players.append(player)
+            self.name_index.add(player)
+            if len(self.current_players) < self.player_cutoff:
+                self.current_players.append(player)
+                player.playing = True
+            else:
+                self.waiting_players.append(player)
+                player.playing = False
+            self.__update_session(player)
+        if new_players:
+            self.__mark_changed()
+
+        messages = []
+        if new_players:
+            names = [player.name for player in new_players]
+            messages.append(f"{join_names(names)} {'has' if len(names) == 1 else 'have'} been added to the queue.")
+        if skipped:
+            messages.append(f"{join_names(skipped)} {'is' if len(skipped) == 1 else 'are'} already in the queue.")
+        # If the batch took the queue to twelve players, recommend you have a six v. six.
+        if player_count < self.player_cutoff*2 <= len(self.players):
+            messages.append(f"Oh damn! There are {len(self.players)} players - is it time for two teams? Type \'{prefix}teams\' to split the queue into balanced teams.")
+        return "\n".join(messages)
+
+
     def delete_player(self, player: Player):
         """
         Removes a player from the queue.
@@ -128,6 +239,7 @@ class Overwatch_Queue():
         """
         self.__backup_queue()
         self.players.remove(player)
+        self.name_index.remove(player)
         if player in self.current_players:
             self.current_players.remove(player)
             # If we have a player waiting who is not delaying, then add them to the current_players list.
@@ -135,6 +247,39 @@ class Overwatch_Queue():
                 self.__rotate_queue_once()
         elif player in self.waiting_players:
             self.waiting_players.remove(player)
+        if player in self.delayed_players:
+            self.delayed_players.remove(player)
+        self.session.update_player(player.name, None)
+        self.__mark_changed()
+
+
+    def delete_players(self, players: list):
+        """
+        Removes several players from the queue at once, as delete_player would one at a time.
+
+        The queue is backed up once, each deque is filtered once, and then the waiting players
+        replace the removed current players in a single pass.
+
+        Args:
+            players (list): The Player objects in the queue to remove.
+        """
+        if not players:
+            return
+        self.__backup_queue()
+        removing = set(players)
+        current_count = len(self.current_players)
+        self.players = [player for player in self.players if player not in removing]
+        self.current_players = deque(player for player in self.current_players if player not in removing)
+        self.waiting_players = deque(player for player in self.waiting_players if player not in removing)
+        self.delayed_players = [player for player in self.delayed_players if player not in removing]
+        # Each removed current player is replaced by the next waiting player who is not delaying, if any.
+        available = sum(1 for player in self.waiting_players if not player.delaying)
+        for _ in range(min(current_count - len(self.current_players), available)):
+            self.__rotate_queue_once()
+        for player in players:
+            self.name_index.remove(player)
+            self.session.update_player(player.name, None)
+        self.__mark_changed()
 
     
     def delay_player(self, player: Player):
@@ -158,6 +303,8 @@ class Overwatch_Queue():
             if len(list(filter(lambda x: not x.delaying, self.waiting_players))):
                 self.__rotate_queue_once()
             self.waiting_players.appendleft(player)
+        self.__update_session(player)
+        self.__mark_changed()
         message = self.print_players()
         return message
 
@@ -176,6 +323,8 @@ class Overwatch_Queue():
             self.current_players.append(player)
             self.waiting_players.remove(player)
             player.playing = True
+        self.__update_session(player)
+        self.__mark_changed()
         message = self.print_players()
         return message
     
@@ -184,24 +333,107 @@ class Overwatch_Queue():
         """
         Returns a message showing the currently playing players and the waiting players.
 
+        The message is cached until the queue next changes, so repeated calls are free.
+
         Returns:
             message (str): The message of current and waiting players' status.
         """
+        if self.__rendered_version != self.version:
+            self.__rendered_players = self.__render_players()
+            self.__rendered_version = self.version
+        return self.__rendered_players
+
+
+    def __render_players(self) -> str:
+        """
+        Private function. Renders the message of current and waiting players' status.
+        Called in print_players when the cached message is out of date.
+        """
         # Print players in the next/current game.
-        message = "The players in the next game are: "
-        for player in self.current_players:
-            message += ("\n\t" + player.name)
+        fragments = ["The players in the next game are: "]
+        fragments.extend("\n\t" + player.name for player in self.current_players)
         # Print players waiting for a game.
         if self.waiting_players:
-            message += "\n\nThe players in the waiting queue are: "
-            for player in self.waiting_players:
-                message += ("\n\t" + player.name)
+            fragments.append("\n\nThe players in the waiting queue are: ")
+            fragments.extend("\n\t" + player.name + (" (Currently delaying)" if player.delaying else "")
+                             for player in self.waiting_players)
+        return "".join(fragments)
+
+
+    def page_count(self, page_size: int = 20) -> int:
+        """
+        Returns the number of pages of players that print_players_page splits the queue into.
+
+        Args:
+            page_size (int): The number of players on each page.
+
+        Returns:
+            pages (int): The number of pages, at least one.
+        """
+        return max(1, ceil((len(self.current_players) + len(self.waiting_players)) / page_size))
+
+
+    def find_player_page(self, player: Player, page_size: int = 20) -> int:
+        """
+        Returns the page of print_players_page that a player is on.
+
+        The players are walked once in queue order, so the cost grows with the player's place in the queue.
+
+        Args:
+            player (Player): A Player object to find.
+            page_size (int): The number of players on each page.
+
+        Returns:
+            page (int): The page the player is on, or 0 if they are not in the queue.
+        """
+        for position, queued_player in enumerate(chain(self.current_players, self.waiting_players)):
+            if queued_player is player:
+                return position // page_size + 1
+        return 0
+
+
+    def print_players_page(self, page: int = 1, page_size: int = 20) -> str:
+        """
+        Returns a message showing one page of the current and waiting players, numbered by their place
+        in the queue.
+
+        Only the players on the page are rendered, walked with islice rather than by indexing the
+        current_players and waiting_players deques player by player. Reaching a page still steps over
+        the players before it, so later pages of long queues cost more than the first.
+
+        Args:
+            page (int): The page to show, starting from 1. Out of range pages show the nearest page.
+            page_size (int): The number of players on each page.
+
+        Returns:
+            message (str): The message of the page of players' status.
+        """
+        pages = self.page_count(page_size)
+        page = min(max(page, 1), pages)
+        current_count = len(self.current_players)
+        start = (page - 1) * page_size
+        stop = min(start + page_size, current_count + len(self.waiting_players))
+
+        fragments = []
+        if start < current_count:
+            fragments.append("The players in the next game are: ")
+            for position, player in enumerate(islice(self.current_players, start, stop), start=start + 1):
+                fragments.append(f"\n\t{position}. {player.name}")
+        if stop > current_count:
+            # Start the waiting section at the first waiting player on this page.
+            fragments.append("\n\nThe players in the waiting queue are: " if fragments
+                             else "The players in the waiting queue are: ")
+            waiting_start = max(start, current_count)
+            for position, player in enumerate(islice(self.waiting_players, waiting_start - current_count,
+                                                     stop - current_count), start=waiting_start + 1):
+                fragments.append(f"\n\t{position}. {player.name}")
                 if player.delaying:
-                    message += " (Currently delaying)"
-        return message
+                    fragments.append(" (Currently delaying)")
+        fragments.append(f"\n\nPage {page} of {pages}.")
+        return "".join(fragments)
 
 
-    def update_queue(self) -> str:
+    def update_queue(self, max_swaps: int = 3) -> str:
         """
         Changes the current players in the queue for the next game.
 
@@ -209,37 +441,72 @@ class Overwatch_Queue():
         If there are seven players, then the oldest player is moved to waiting_players and the
         longest waiting player is moved to current_players.
         If there are more than seven players, then the two oldest players are moved to waiting_players
-        and the two longest waiting players are moved to current_players.
+        and the two longest waiting players are moved to current_players, or three for longer queues.
+        No more than max_swaps players are swapped.
+
+        Args:
+            max_swaps (int): The most players to swap, from the guild's settings.
 
         Returns:
             message (str): The message from self.print_players()
         """
         self.__backup_queue()
+        if self.current_players:
+            self.session.complete_game()
+        self.game_clock.start_game()
         if (len(self.players) - len(self.delayed_players)) <= self.player_cutoff:
             # No players to swap out
-            pass
+            swaps = 0
         elif (len(self.players) - len(self.delayed_players)) == self.player_cutoff + 1:
             # Only a single player to swap
-            self.__rotate_queue_once()
+            swaps = 1
         elif (len(self.players) - len(self.delayed_players)) <= self.player_cutoff * 2 - 2:
             # Two players to swap
-            self.__rotate_queue_once()
-            self.__rotate_queue_once()
+            swaps = 2
         else:
             # Three players to swap
+            swaps = 3
+        for _ in range(min(swaps, max_swaps)):
             self.__rotate_queue_once()
-            self.__rotate_queue_once()
-            self.__rotate_queue_once()
+        self.__mark_changed()
 
         # Get a message of who the current/waiting players now.
         message = self.print_players()
         return message
 
     
+    def set_mode(self, mode: int):
+        """
+        Switches the queue between Overwatch 1 (six players a team) and Overwatch 2 (five players a team).
+
+        Current players past the new team size are the first to wait, and a place opened by a larger
+        team size is filled by the next waiting player who is not delaying.
+
+        Args:
+            mode (int): Whether playing Overwatch 1 or 2.
+        """
+        self.player_cutoff = 6 if mode == 1 else 5
+        while len(self.current_players) > self.player_cutoff:
+            player = self.current_players.pop()
+            self.waiting_players.appendleft(player)
+            player.playing = False
+            self.__update_session(player)
+        while (len(self.current_players) < self.player_cutoff
+               and any(not player.delaying for player in self.waiting_players)):
+            self.__rotate_queue_once()
+        self.__mark_changed()
+
+
     def print_player_wait(self, player: Player) -> str:
         """
         Returns a message of the queue status of the Player and how many games they have left/to wait.
 
+        Once a game has been started with update_queue, the message also estimates how long that is,
+        from the games left and the game clock's estimated game length.
+
+        The player's place is found by looking through the current or waiting players deque, so this
+        takes time in proportion to the length of the queue.
+
         Args:
             player (Player): A Player object to return its status.
 
@@ -250,15 +517,55 @@ class Overwatch_Queue():
         if player in self.current_players:
             games_left = int(floor(self.current_players.index(player)/2))
             message = f"{player.name} is currently playing/queuing for a game. They have {games_left} games left after this one."
+            seconds = self.game_clock.seconds_until(0)
+            if seconds is not None:
+                message += f" This game should finish {format_eta(seconds)}."
         # If player waiting for a game, return how many games they have to wait for.
         elif player in self.waiting_players:
             games_left = int(floor(self.waiting_players.index(player)/2))
             message = f"{player.name} has to wait for {games_left} games after this one."
+            seconds = self.game_clock.seconds_until(games_left)
+            if seconds is not None and not player.delaying:
+                message += f" Their next game should start {format_eta(seconds)}."
         else:
             message = f"{player.name} is not currently in the queue."
         return message
 
 
+    def print_wait_estimates(self, page: int = None, page_size: int = 20) -> str:
+        """
+        Returns a message estimating when each waiting player's next game will start.
+
+        A waiting player's games to wait follow from their place in the queue, so no games are played
+        out to estimate them. Reaching the first player of a page still steps over the waiting players
+        before it, so later pages of long queues cost more than the first.
+
+        Args:
+            page (int): Only estimate for the waiting players on this page of print_players_page, or None for all.
+            page_size (int): The number of players on each page.
+
+        Returns:
+            message (str): The message of estimates, empty if none are waiting or no game has been started.
+        """
+        if not self.waiting_players or self.game_clock.game_started is None:
+            return ""
+        first, last = 0, len(self.waiting_players)
+        if page is not None:
+            page = min(max(page, 1), self.page_count(page_size))
+            first = max(0, (page - 1) * page_size - len(self.current_players))
+            last = min(last, page * page_size - len(self.current_players))
+        if first >= last:
+            return ""
+        game_minutes = round(self.game_clock.get_game_seconds() / 60)
+        fragments = [f"\n\nEstimated start of each waiting player's next game, with games taking about {game_minutes} minutes:"]
+        for index, player in enumerate(islice(self.waiting_players, first, last), start=first):
+            if player.delaying:
+                fragments.append(f"\n\t{player.name}: delaying")
+            else:
+                fragments.append(f"\n\t{player.name}: {format_eta(self.game_clock.seconds_until(index // 2))}")
+        return "".join(fragments)
+
+
     def find_player(self, player_name: str):
         """
         Returns a Player object from the queue, given a player name as a string.
@@ -269,22 +576,43 @@ class Overwatch_Queue():
         Returns:
             player (Player): A Player object with the same name as player_name in the queue, empty string if none.
         """
-        for player in self.players:
-            if player.name == player_name:
-                return player
-        return ""
+        return self.name_index.by_name.get(player_name, "")
+
+
+    def resolve_player(self, text: str) -> list:
+        """
+        Finds the players in the queue someone meant, from a mention, a name, or a unique prefix or
+        near-miss of a name, ignoring case and accents.
+
+        Args:
+            text (str): What was typed, e.g. '<@1234>', 'Lúcio' or 'luc'.
+
+        Returns:
+            players (list): The one player meant, several players if text could mean any of them, or none.
+        """
+        return self.name_index.resolve(text)
 
   
     def empty_queue(self):
         """
-        Empties the queue of all players.
+        Empties the queue of all players, ending its session.
+
+        The ended session's analytics are kept in last_session.
         """
         self.__backup_queue()
         for player in self.players:
             del(player)
         self.players = []
+        self.delayed_players = []
         self.current_players = deque()
         self.waiting_players = deque()
+        self.name_index = Name_Index()
+        # End the session, keeping its analytics to be archived, and start a new one.
+        self.last_session = self.session.end()
+        self.start_time = datetime.datetime.now()
+        self.session = self.__new_session()
+        self.game_clock.stop()
+        self.__mark_changed()
 
 
     def undo_command(self):
@@ -300,6 +628,11 @@ class Overwatch_Queue():
         self.delayed_players = self.__backup_delayed_players
         self.current_players = self.__backup_current_players
         self.waiting_players = self.__backup_waiting_players
+        self.session = self.__backup_session
+        self.game_clock = self.__backup_game_clock
+        # The backups are copies, so the restored players are indexed afresh when next looked up.
+        self.name_index = None
+        self.__mark_changed()
 
         # Return current state of queue
         message = self.print_players()
@@ -314,31 +647,127 @@ class Overwatch_Queue():
         players_delaying = []
 
         # Remove any delayed players into holding position
-        for player in self.delayed_players:
-            if player == self.waiting_players[0]:
-                players_delaying.append(self.waiting_players.popleft())
+        while self.waiting_players and self.waiting_players[0].delaying:
+            players_delaying.append(self.waiting_players.popleft())
+
+        # If every waiting player is delaying, nobody can swap in, so leave the queue as it was
+        if not self.waiting_players:
+            self.waiting_players.extendleft(reversed(players_delaying))
+            return
 
         # Swap out player
         new_player = self.waiting_players.popleft()
         self.current_players.append(new_player)
         new_player.playing = True              
+        self.__update_session(new_player)
 
         if len(self.current_players) > self.player_cutoff:
             old_player = self.current_players.popleft()
             self.waiting_players.append(old_player)
             old_player.playing = False
+            self.__update_session(old_player)
 
-        # Replace any players holding position
-        for player in players_delaying:
-            self.waiting_players.appendleft(player)
+        # Replace any players holding position, in the same order
+        self.waiting_players.extendleft(reversed(players_delaying))
 
     
+    def to_dict(self) -> dict:
+        """
+        Returns the state of the queue as a dict of plain types, e.g. to save as JSON.
+
+        The undo backup is not included, so a queue restored with from_dict cannot undo.
+
+        Returns:
+            state (dict): The state of the queue.
+        """
+        return {"player_cutoff": self.player_cutoff,
+                "start_time": self.start_time.isoformat(),
+                "players": [{"name": player.name, "delaying": player.delaying, "user_id": player.user_id}
+                            for player in self.players],
+                "current_players": [player.name for player in self.current_players],
+                "waiting_players": [player.name for player in self.waiting_players],
+                "delayed_players": [player.name for player in self.delayed_players],
+                "session": self.session.to_dict(),
+                "game_clock": self.game_clock.to_dict()}
+
+
+    @classmethod
+    def from_dict(cls, state: dict):
+        """
+        Creates a queue from the state returned by to_dict.
+
+        Args:
+            state (dict): The state of the queue.
+
+        Returns:
+            queue (Overwatch_Queue): The restored queue.
+        """
+        queue = cls(mode=1 if state["player_cutoff"] == 6 else 2)
+        queue.player_cutoff = state["player_cutoff"]
+        queue.start_time = datetime.datetime.fromisoformat(state["start_time"])
+        players_by_name = {}
+        for player_state in state["players"]:
+            player = Player(player_state["name"], user_id=player_state.get("user_id"))
+            player.delaying = player_state["delaying"]
+            players_by_name[player.name] = player
+            queue.players.append(player)
+            queue.name_index.add(player)
+        queue.current_players.extend(players_by_name[name] for name in state["current_players"])
+        queue.waiting_players.extend(players_by_name[name] for name in state["waiting_players"])
+        queue.delayed_players.extend(players_by_name[name] for name in state["delayed_players"])
+        for player in queue.current_players:
+            player.playing = True
+        # Queues saved before session analytics start a new session.
+        queue.session = Session_Stats.from_dict(state["session"]) if "session" in state else queue.__new_session()
+        if "game_clock" in state:
+            queue.game_clock = Game_Clock.from_dict(state["game_clock"])
+        return queue
+
+
+    def __new_session(self) -> Session_Stats:
+        """
+        Private function. Starts the analytics of a session at start_time with the players in the queue.
+        Called when the queue is created or emptied.
+        """
+        session = Session_Stats(start_time=self.start_time.timestamp())
+        for player in self.players:
+            session.update_player(player.name, DELAYING if player.delaying else PLAYING if player.playing else WAITING)
+        return session
+
+
+    def __update_session(self, player: Player):
+        """
+        Private function. Records a player's state in the session analytics after it may have changed.
+        Called wherever a player in the queue starts or stops playing or delaying.
+        """
+        self.session.update_player(player.name, DELAYING if player.delaying else PLAYING if player.playing else WAITING)
+
+
+    def __mark_changed(self):
+        """
+        Private function. Records that the queue has changed, so its cached status message is out of date.
+        Called at the end of every action that changes the queue.
+        """
+        self.version += 1
+
+
     def __backup_queue(self):
         """
         Private function. Backs up the current state of the queue in backup properties.
         Called when performing an action, to allow undo-ing the most recent command.
         """
-        self.__backup_players = deepcopy(self.players)
-        self.__backup_delayed_players = deepcopy(self.delayed_players)
-        self.__backup_current_players = deepcopy(self.current_players)
-        self.__backup_waiting_players = deepcopy(self.waiting_players)
\ No newline at end of file
+        # Copy all four together, so each player is copied once and is the same object in every copy.
+        (self.__backup_players, self.__backup_delayed_players, self.__backup_current_players,
+         self.__backup_waiting_players) = deepcopy(
+            (self.players, self.delayed_players, self.current_players, self.waiting_players))
+        # The session and game clock hold no players, so shallow snapshots of them are enough.
+        self.__backup_session = self.session.snapshot()
+        self.__backup_game_clock = copy(self.game_clock)
+
+
+
+def join_names(names: list) -> str:
+    """
+    Joins names for a message, e.g. 'a, b and c'.
+    """
+    return names[0] if len(names) == 1 else ", ".join(names[:-1]) + " and " + names[-1]
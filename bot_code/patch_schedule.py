@@ -0,0 +1,296 @@
+"""
+Class for deciding when to poll the patch notes site, polling more often in the hours of the week
+patches are usually released in and less often at other times, within a budget of polls a day.
+
+The week is split into its 168 hours, each weighted by the patches released in it. A release the
+bot detected counts towards its hour, and half as much towards the hours either side. The date of
+a patch on the site has no time, so it counts a little towards every hour of its day of the week.
+Every hour is polled at least every max_interval, and the rest of the budget is shared out between
+the hours by weight, polling no more often than every min_interval.
+"""
+
+# Standard library imports
+import json
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+
+HOURS_PER_WEEK = 7 * 24
+DEFAULT_POLLS_PER_DAY = 24
+MIN_INTERVAL = 5 * 60
+MAX_INTERVAL = 4 * 60 * 60
+# The weight of every hour before any releases, small so a few releases soon stand out.
+PRIOR_WEIGHT = 0.1
+# Only the most recent releases and detection latencies are kept.
+MAX_RELEASES = 100
+
+
+class Patch_Schedule():
+    """
+    Learns when patches are released, and from that when to next poll for them.
+
+    Attributes:
+        polls_per_day (int): The most polls to plan for in a day on average over the week, each costing
+            one request per feed. Days patches usually come out get more of them.
+        min_interval (float): The fewest seconds between polls, in the busiest hours.
+        max_interval (float): The most seconds between polls, in the quietest hours.
+        clock (callable): Returns the current time in seconds since the epoch.
+        releases (list): When each detected release was made, as the midpoint of the poll that found it
+            and the poll before.
+        release_dates (set): The dates of the patches seen on the site, e.g. '23 February, 2021'.
+        last_poll (float): When the site was last polled, or None.
+        poll_count (int): The number of polls made.
+        detection_latencies (list): For each detected release, the most seconds it could have gone unnoticed.
+    """
+
+    def __init__(self, polls_per_day: int = DEFAULT_POLLS_PER_DAY, min_interval: float = MIN_INTERVAL,
+                 max_interval: float = MAX_INTERVAL, clock=time.time):
+        """
+        Initialise a schedule that has not yet seen any patches, so polls evenly.
+
+        Args:
+            polls_per_day (int): The most polls to plan for in a day.
+            min_interval (float): The fewest seconds between polls.
+            max_interval (float): The most seconds between polls.
+            clock (callable): Returns the current time in seconds since the epoch.
+        """
+        self.polls_per_day = polls_per_day
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.clock = clock
+        self.releases = []
+        self.release_dates = set()
+        self.last_poll = None
+        self.poll_count = 0
+        self.detection_latencies = []
+        # When each poll in the last day was made, oldest first.
+        self.__recent_polls = deque()
+        # The seconds between polls in each hour of the week, worked out again after a release.
+        self.__intervals = None
+
+
+    def get_weights(self) -> list:
+        """
+        Gets how likely a patch is to be released in each hour of the week, from Monday 00:00 UTC, unnormalised.
+
+        Returns:
+            weights (list): 168 weights, every one at least PRIOR_WEIGHT.
+        """
+        weights = [PRIOR_WEIGHT] * HOURS_PER_WEEK
+        for released in self.releases:
+            hour = get_hour_of_week(released)
+            weights[hour] += 1
+            weights[(hour - 1) % HOURS_PER_WEEK] += 0.5
+            weights[(hour + 1) % HOURS_PER_WEEK] += 0.5
+        for release_date in self.release_dates:
+            try:
+                weekday = datetime.strptime(release_date, "%d %B, %Y").weekday()
+            except ValueError:
+                continue
+            for hour in range(weekday * 24, weekday * 24 + 24):
+                weights[hour] += 1 / 24
+        return weights
+
+
+    def get_intervals(self) -> list:
+        """
+        Gets the seconds between polls in each hour of the week, sharing the weekly budget of polls
+        between the hours by weight.
+
+        Returns:
+            intervals (list): 168 intervals in seconds.
+        """
+        if self.__intervals is not None:
+            return self.__intervals
+        weekly_polls = self.polls_per_day * 7
+        least_polls = 3600 / self.max_interval
+        most_polls = 3600 / self.min_interval
+        spare_polls = weekly_polls - least_polls * HOURS_PER_WEEK
+        if spare_polls <= 0:
+            # The budget does not cover polling every max_interval, so poll evenly within it.
+            self.__intervals = [HOURS_PER_WEEK * 3600 / weekly_polls] * HOURS_PER_WEEK
+            return self.__intervals
+        weights = self.get_weights()
+        hourly_polls = [least_polls] * HOURS_PER_WEEK
+        uncapped = set(range(HOURS_PER_WEEK))
+        # Share the spare polls by weight, capping hours at most_polls and sharing out again what they could not use.
+        while spare_polls > 1e-9 and uncapped:
+            total_weight = sum(weights[hour] for hour in uncapped)
+            left_over = 0.0
+            for hour in list(uncapped):
+                hourly_polls[hour] += spare_polls * weights[hour] / total_weight
+                if hourly_polls[hour] >= most_polls:
+                    left_over += hourly_polls[hour] - most_polls
+                    hourly_polls[hour] = most_polls
+                    uncapped.discard(hour)
+            spare_polls = left_over
+        self.__intervals = [3600 / polls for polls in hourly_polls]
+        return self.__intervals
+
+
+    def get_next_poll(self) -> float:
+        """
+        Gets when the site should next be polled.
+
+        Returns:
+            float: The time of the next poll, in seconds since the epoch.
+        """
+        if self.last_poll is None:
+            return self.clock()
+        intervals = self.get_intervals()
+        hour = get_hour_of_week(self.last_poll)
+        next_poll = self.last_poll + intervals[hour]
+        # Move up to the start of the next hour if it is polled more often than this one.
+        next_hour_start = (self.last_poll // 3600 + 1) * 3600
+        if next_poll > next_hour_start:
+            next_hour = (hour + 1) % HOURS_PER_WEEK
+            next_poll = min(next_poll, max(next_hour_start, self.last_poll + intervals[next_hour]))
+        return next_poll
+
+
+    def is_due(self) -> bool:
+        """
+        Gets whether it is time to poll the site.
+
+        Returns:
+            bool
+        """
+        return self.clock() >= self.get_next_poll()
+
+
+    def record_poll(self, found_patch: bool):
+        """
+        Records a poll of the site, and whether it found a new patch.
+
+        Args:
+            found_patch (bool): Whether the poll found a new patch on any feed.
+        """
+        now = self.clock()
+        if found_patch and self.last_poll is not None:
+            # The patch came out at some point since the last poll.
+            latency = now - self.last_poll
+            self.detection_latencies = (self.detection_latencies + [latency])[-MAX_RELEASES:]
+            self.releases = (self.releases + [now - latency / 2])[-MAX_RELEASES:]
+            self.__intervals = None
+        self.last_poll = now
+        self.poll_count += 1
+        self.__recent_polls.append(now)
+        while self.__recent_polls[0] <= now - 24 * 60 * 60:
+            self.__recent_polls.popleft()
+
+
+    def learn_dates(self, release_dates):
+        """
+        Adds the dates of patches seen on the site to those the schedule learns from.
+
+        Args:
+            release_dates (iterable): Patch dates, e.g. '23 February, 2021'.
+        """
+        new_dates = set(release_dates) - self.release_dates
+        if new_dates:
+            self.release_dates |= new_dates
+            self.__intervals = None
+
+
+    def get_stats(self) -> dict:
+        """
+        Gets statistics showing the trade-off between requests made and how quickly patches are detected.
+
+        Returns:
+            stats (dict): The polls made, in total and in the last day, the polls per day planned and allowed,
+                the shortest and longest planned intervals, and the releases detected with the mean and most
+                seconds each could have gone unnoticed.
+        """
+        intervals = self.get_intervals()
+        planned_polls_per_day = sum(3600 / interval for interval in intervals) / 7
+        latencies = self.detection_latencies
+        return {"polls": self.poll_count,
+                "polls_last_day": len(self.__recent_polls),
+                "planned_polls_per_day": planned_polls_per_day,
+                "budget_polls_per_day": self.polls_per_day,
+                "shortest_interval": min(intervals),
+                "longest_interval": max(intervals),
+                "releases_detected": len(latencies),
+                "mean_detection_latency": sum(latencies) / len(latencies) if latencies else None,
+                "max_detection_latency": max(latencies) if latencies else None}
+
+
+    def to_dict(self) -> dict:
+        """
+        Returns what the schedule has learned as a dict of plain types, e.g. to save as JSON.
+
+        Returns:
+            state (dict): The state of the schedule.
+        """
+        return {"releases": self.releases,
+                "release_dates": sorted(self.release_dates),
+                "last_poll": self.last_poll,
+                "poll_count": self.poll_count,
+                "detection_latencies": self.detection_latencies}
+
+
+    @classmethod
+    def from_dict(cls, state: dict, **kwargs):
+        """
+        Creates a Patch_Schedule from the state returned by to_dict.
+
+        Args:
+            state (dict): The state of the schedule.
+            **kwargs: Passed on to Patch_Schedule, e.g. polls_per_day.
+
+        Returns:
+            schedule (Patch_Schedule): The restored schedule.
+        """
+        schedule = cls(**kwargs)
+        schedule.releases = list(state["releases"])
+        schedule.release_dates = set(state["release_dates"])
+        schedule.last_poll = state["last_poll"]
+        schedule.poll_count = state["poll_count"]
+        schedule.detection_latencies = list(state["detection_latencies"])
+        return schedule
+
+
+    def save(self, fpath: str):
+        """
+        Writes what the schedule has learned to a JSON file.
+
+        Args:
+            fpath (str): The file to write to.
+        """
+        with open(fpath, "w") as f:
+            json.dump(self.to_dict(), f)
+
+
+    @classmethod
+    def load(cls, fpath: str, **kwargs):
+        """
+        Creates a Patch_Schedule from a file written by save, or a new one if there is no such file.
+
+        Args:
+            fpath (str): The file to read.
+            **kwargs: Passed on to Patch_Schedule, e.g. polls_per_day.
+
+        Returns:
+            schedule (Patch_Schedule)
+        """
+        try:
+            with open(fpath, "r") as f:
+                return cls.from_dict(json.load(f), **kwargs)
+        except (OSError, ValueError, KeyError):
+            return cls(**kwargs)
+
+
+
+def get_hour_of_week(timestamp: float) -> int:
+    """
+    Gets the hour of the week a time falls in, counting from Monday 00:00 UTC.
+
+    Args:
+        timestamp (float): Seconds since the epoch.
+
+    Returns:
+        int: Between 0 and 167.
+    """
+    moment = datetime.fromtimestamp(timestamp, timezone.utc)
+    return moment.weekday() * 24 + moment.hour
@@ -3,32 +3,80 @@
 """
 
 # Standard library imports
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import os
+import hashlib
+import threading
 import requests
 
 # Third party imorts
 from bs4 import BeautifulSoup
 
+# Local imports
+from storage_layer import Storage
+
+
+# The patch notes feeds channels can subscribe to.
+PATCH_FEEDS = ("live", "experimental")
+
+
 class Overwatch_Patch_Scraper():
     """
     Class for a scraper that gets patch details from the Overwatch patch-notes and 
     converts this into discord-friendly messages that display nicely.
+
+    The live and experimental feeds are polled side by side in threads, over one keep-alive session,
+    so a poll of both costs one request per feed on connections already open.
+
+    Each feed's latest patch is hashed section by section (or hero by hero), so edits to a patch
+    already posted are found and posted as an update of just the sections that changed. A page
+    unchanged since the last poll is not parsed again.
     """
 
-    def __init__(self):
+    def __init__(self,
+                 live_patches_url: str = 'https://playoverwatch.com/en-us/news/patch-notes/live',
+                 experimental_patches_url: str = 'https://playoverwatch.com/en-us/news/patch-notes/experimental',
+                 timeout: float = 30.0,
+                 storage: Storage = None):
         """
-        Initialises the scraper by setting up the urls and file containing last patch date.
+        Initialises the scraper by setting up the urls and the stored date of each feed's last patch.
+
+        Params:
+            live_patches_url (str) The url of the live patch notes page.
+            experimental_patches_url (str) The url of the experimental patch notes page.
+            timeout (float) Seconds to wait for a patch notes page before giving up on it.
+            storage (Storage) The database each feed's last patch is stored in, shared by every process, or
+                None to open a connection to it for the scraper's threads.
         """
-        self.live_patches_url = 'https://playoverwatch.com/en-us/news/patch-notes/live'
-        self.experimental_patches_url = 'https://playoverwatch.com/en-us/news/patch-notes/experimental'
-        self.live_patch_date_fpath = os.path.join("db", ".livepatchdate")
-        latest_live_patch_date = self.__get_patch_date(self.get_latest_patch(self.live_patches_url))
-        # Create a patch date file with the date of latest patch
-        if not os.path.exists("db"):
-            os.mkdir("db")
-        with open(self.live_patch_date_fpath, "w") as f:
-            f.write(latest_live_patch_date)
+        self.live_patches_url = live_patches_url
+        self.experimental_patches_url = experimental_patches_url
+        self.feed_urls = {"live": live_patches_url, "experimental": experimental_patches_url}
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.__executor = ThreadPoolExecutor(max_workers=len(PATCH_FEEDS), thread_name_prefix="patch-feed")
+        self.__dates_lock = threading.Lock()
+        self.storage = storage if storage is not None else Storage(check_same_thread=False)
+        # The dates of every patch seen on the feeds' pages, e.g. for learning when patches come out.
+        self.patch_archive = set()
+        # The hash of each feed's page when last parsed, to skip parsing it again if it has not changed.
+        self.__page_hashes = {}
+        # The date and section hashes of each feed's latest patch, as last read from or written to storage.
+        self.patch_dates = {}
+        self.section_hashes = {}
+        # Only feeds with nothing stored, e.g. on the first run, are fetched, to store their latest patch
+        # without posting it. Patches released while the bot was down are then posted by the next check.
+        unstored_feeds = []
+        for feed in PATCH_FEEDS:
+            stored_state = self.storage.get_patch_state(feed)
+            if stored_state is None:
+                unstored_feeds.append(feed)
+            else:
+                self.patch_dates[feed], self.section_hashes[feed] = stored_state
+        for feed, patch in zip(unstored_feeds, self.__executor.map(self.__get_latest_feed_patch, unstored_feeds)):
+            self.patch_dates[feed] = self.__get_patch_date(patch) if patch is not None else ""
+            self.section_hashes[feed] = self.get_section_hashes(patch) if patch is not None else {}
+            self.storage.save_patch_state(feed, self.patch_dates[feed], self.section_hashes[feed])
 
 
     def get_latest_patch(self, url: str):
@@ -48,27 +96,54 @@ class Overwatch_Patch_Scraper():
     def check_for_new_live_patch(self) -> bool:
         """
         Checks the date of the latest patch from the live patches url and compares it with
-        the stored date in .livepatchdate. If they differ, return True (new patch) else return False.
+        the stored date for the live feed. If they differ, return True (new patch) else return False.
 
         Returns:
             new_patch (bool) True if the latest patch date differs to the stored one.
         """
-        latest_patch = self.get_latest_patch(self.live_patches_url)
-        patch_date = self.__get_patch_date(latest_patch)
-        # If something goes wrong here, then patch_date is empty string, so ignore this attempt
-        if not patch_date:
-            return False
-        with open(self.live_patch_date_fpath, "r") as f:
-            old_patch_date = f.read()
-        
-        new_patch = True if old_patch_date != patch_date else False
-        if new_patch:
-            with open(self.live_patch_date_fpath, "w") as f:
-                f.write(patch_date)
-
+        new_patch = self.__check_feed("live") is not None
         return new_patch
 
 
+    def check_for_new_patch(self, feed: str) -> list:
+        """
+        Checks a feed for a new or edited patch, with a single request, and prepares its messages if there is one.
+
+        Params:
+            feed (str) One of PATCH_FEEDS.
+
+        Returns:
+            messages (list) The new patch's notes, or the edited sections of the latest patch, as Discord
+                messages, or an empty list if there is nothing new.
+        """
+        change = self.__check_feed(feed)
+        if change is None:
+            return []
+        patch, changed_sections = change
+        messages = self.create_messages(self.write_patch_notes(patch, changed_sections))
+        return messages
+
+
+    async def check_feeds(self) -> dict:
+        """
+        Checks every feed for a new patch at once. A feed that cannot be reached is skipped until the next check.
+
+        Returns:
+            new_messages (dict) The messages of each feed's new patch, keyed by feed, for feeds with a new patch.
+        """
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(loop.run_in_executor(self.__executor, self.check_for_new_patch, feed)
+                                         for feed in PATCH_FEEDS),
+                                       return_exceptions=True)
+        new_messages = {}
+        for feed, result in zip(PATCH_FEEDS, results):
+            if isinstance(result, Exception):
+                print(f"Could not check the {feed} patch notes: {type(result).__name__}: {result}")
+            elif result:
+                new_messages[feed] = result
+        return new_messages
+
+
     def prepare_new_live_patch_notes(self) -> list:
         """
         Prepares a list of messages, formatted for Discord, of the latest live patch notes.
@@ -77,15 +152,75 @@ class Overwatch_Patch_Scraper():
             messages (list) A list of patch note messages to return.
         """
         latest_patch = self.get_latest_patch(self.live_patches_url)
-        patch_type = self.__check_patch_type(latest_patch)
+        patch_note_string = self.write_patch_notes(latest_patch)
+        messages = self.create_messages(patch_note_string)
+        return messages
+
+
+    def fetch_patches_page(self, url: str) -> str:
+        """
+        Fetches the raw html of a patch notes page.
+
+        Params:
+            url (str) The url of the patch notes page.
+
+        Returns:
+            page_text (str) The html text of the page.
+        """
+        response = self.session.get(url, timeout=self.timeout)
+        return response.text
+
+
+    def parse_patches(self, page_text: str) -> list:
+        """
+        Parses the html of a patch notes page into its separate patches, newest first.
+
+        Params:
+            page_text (str) The html text from fetch_patches_page.
+
+        Returns:
+            patches (list) A list of bs4.Tag patches.
+        """
+        patches_page = BeautifulSoup(page_text, 'html.parser')
+        patches = patches_page.find_all("div", class_="PatchNotes-patch")
+        return patches
+
+
+    def write_patch_notes(self, patch, changed_sections: list = None) -> str:
+        """
+        Converts a patch into a Discord-friendly string, depending on the type of the patch.
+
+        Params:
+            patch (bs4.Tag) A patch from get_latest_patch or __get_patch_i
+            changed_sections (list) The keys from get_section_hashes of the sections to write as an update
+                to the patch, or None to write the whole patch as a new one.
+
+        Returns:
+            patch_note_string (str) A pretty string formatted with Discord markup of the patch details.
+        """
+        patch_type = self.__check_patch_type(patch)
         if patch_type == 'generic':
-            patch_note_string = self.__write_patch_notes_generic(latest_patch)
+            patch_note_string = self.__write_patch_notes_generic(patch, changed_sections)
         elif patch_type == 'hero':
-            patch_note_string = self.__write_patch_notes_hero(latest_patch)
+            patch_note_string = self.__write_patch_notes_hero(patch, changed_sections)
         else:
-            patch_note_string = self.__write_patch_notes_unknown(latest_patch)
-        messages = self.__create_messages(patch_note_string)
-        return messages
+            patch_note_string = self.__write_patch_notes_unknown(patch, changed_sections)
+        return patch_note_string
+
+
+    def get_section_hashes(self, patch) -> dict:
+        """
+        Hashes the text of each section of a patch, or of each hero for hero patches, so that edits to
+        the patch can be found without writing it out.
+
+        Params:
+            patch (bs4.Tag) A patch from get_latest_patch or __get_patch_i
+
+        Returns:
+            section_hashes (dict) The hash of each section, keyed by its title or hero name.
+        """
+        section_hashes = {key: hash_text(section.get_text()) for key, section in self.__get_sections(patch)}
+        return section_hashes
 
 
     def __get_patch_date(self, patch) -> str:
@@ -106,6 +241,82 @@ class Overwatch_Patch_Scraper():
         return patch_date_normal
     
 
+    def __get_latest_feed_patch(self, feed: str, skip_unchanged: bool = False):
+        """
+        Private function. Gets the latest patch of a feed, or None if the feed has no patches,
+        as the experimental feed often does not, or if skip_unchanged and the page is the same
+        as when last parsed.
+        """
+        page_text = self.fetch_patches_page(self.feed_urls[feed])
+        page_hash = hash_text(page_text)
+        if skip_unchanged and self.__page_hashes.get(feed) == page_hash:
+            return None
+        patches = self.parse_patches(page_text)
+        patch_dates = {self.__get_patch_date(patch) for patch in patches}
+        with self.__dates_lock:
+            self.patch_archive |= patch_dates - {""}
+            self.__page_hashes[feed] = page_hash
+        return patches[0] if patches else None
+
+
+    def __check_feed(self, feed: str):
+        """
+        Private function. Gets the latest patch of a feed if its date differs from the stored date
+        for the feed, or the same patch has been edited, storing its date and section hashes.
+
+        The stored state is read again each check, as another process, e.g. the last lease leader,
+        may have posted and stored a patch since this one last looked.
+
+        Returns (patch, None) for a new patch, (patch, changed_sections) for an edited one, else None.
+        """
+        latest_patch = self.__get_latest_feed_patch(feed, skip_unchanged=True)
+        if latest_patch is None:
+            return None
+        patch_date = self.__get_patch_date(latest_patch)
+        # If something goes wrong here, then patch_date is empty string, so ignore this attempt
+        if not patch_date:
+            return None
+        section_hashes = self.get_section_hashes(latest_patch)
+        with self.__dates_lock:
+            old_patch_date, old_section_hashes = self.storage.get_patch_state(feed) or ("", {})
+            self.patch_dates[feed] = patch_date
+            self.section_hashes[feed] = section_hashes
+            if old_patch_date == patch_date and old_section_hashes == section_hashes:
+                return None
+            self.storage.save_patch_state(feed, patch_date, section_hashes)
+        if old_patch_date != patch_date:
+            return latest_patch, None
+        # Sections removed from the patch are not announced, nor edits to a patch whose sections were not yet stored.
+        changed_sections = [key for key, section_hash in section_hashes.items()
+                            if old_section_hashes and old_section_hashes.get(key) != section_hash]
+        return (latest_patch, changed_sections) if changed_sections else None
+
+
+    def __get_sections(self, patch) -> list:
+        """
+        Private function. Gets the sections of a patch, or the heroes of a hero patch, as (key, bs4.Tag)
+        pairs in order, keyed by their title or hero name. An unknown patch is one section.
+        """
+        patch_type = self.__check_patch_type(patch)
+        if patch_type == 'generic':
+            sections = patch.find_all("div", class_="PatchNotes-section-generic_update")
+            title_tag = ("h4", "PatchNotes-sectionTitle")
+        elif patch_type == 'hero':
+            sections = patch.find_all("div", class_="PatchNotesHeroUpdate")
+            title_tag = ("h5", "PatchNotesHeroUpdate-name")
+        else:
+            return [("Patch", patch)]
+        keyed_sections = []
+        for i, section in enumerate(sections):
+            title = section.find(title_tag[0], class_=title_tag[1])
+            key = title.get_text().strip() if title else f"Section {i + 1}"
+            # Keep keys unique, in case two sections share a title.
+            if any(key == keyed_section[0] for keyed_section in keyed_sections):
+                key = f"{key} ({i + 1})"
+            keyed_sections.append((key, section))
+        return keyed_sections
+
+
     def __get_patch_i(self, url: str, i: int):
         """
         Gets the ith patch from the provided url.
@@ -117,9 +328,7 @@ class Overwatch_Patch_Scraper():
         Returns:
             patch (bs4.Tag) A bs4 rendition of the returned url page.
         """
-        response = requests.get(url)
-        patches_page = BeautifulSoup(response.text, 'html.parser')
-        patch = patches_page.find_all("div", class_="PatchNotes-patch")[i]
+        patch = self.parse_patches(self.fetch_patches_page(url))[i]
         return patch
 
 
@@ -144,22 +353,24 @@ class Overwatch_Patch_Scraper():
             return 'unknown'
 
     
-    def __write_patch_notes_generic(self, patch) -> str:
+    def __write_patch_notes_generic(self, patch, changed_sections: list = None) -> str:
         """
         Given a patch from get_latest_patch or __get_patch_i that is of 'generic' type,
         converts the text details of the patch into a Discord-friendly string.
 
         Params:
             patch (bs4.Tag) A patch from get_latest_patch or __get_patch_i
+            changed_sections (list) The keys of the sections to write as an update, or None for all of them.
         
         Returns:
             patch_note_string (str) A pretty string formatted with Discord markup of the patch details.
         """
-        patch_note_string = f"A new Overwatch patch has been released! Patch notes from: {self.__get_patch_date(patch)}:\n\n"
-        patch_sections = patch.find_all("div", class_="PatchNotes-section-generic_update")
+        patch_note_string = self.__write_patch_header(patch, changed_sections)
         first_section_title = True
 
-        for section in patch_sections:
+        for key, section in self.__get_sections(patch):
+            if changed_sections is not None and key not in changed_sections:
+                continue
             # Some patch notes have a section title - add this to the string in bold
             section_title = section.find("h4", class_="PatchNotes-sectionTitle")
             if section_title:
@@ -194,22 +405,24 @@ class Overwatch_Patch_Scraper():
         return patch_note_string
 
 
-    def __write_patch_notes_hero(self, patch) -> str:
+    def __write_patch_notes_hero(self, patch, changed_sections: list = None) -> str:
         """
         Given a patch from get_latest_patch or __get_patch_i that is of 'hero' type,
         converts the text details of the patch into a Discord-friendly string.
 
         Params:
             patch (bs4.Tag) A patch from get_latest_patch or __get_patch_i
+            changed_sections (list) The keys of the heroes to write as an update, or None for all of them.
         
         Returns:
             patch_note_string (str) A pretty string formatted with Discord markup of the patch details.
         """
-        patch_note_string = f"A new Overwatch patch has been released! Patch notes from: {self.__get_patch_date(patch)}:\n\n"
-        patch_sections = patch.find_all("div", class_="PatchNotesHeroUpdate")
+        patch_note_string = self.__write_patch_header(patch, changed_sections)
         first_hero_name = True
 
-        for section in patch_sections:
+        for key, section in self.__get_sections(patch):
+            if changed_sections is not None and key not in changed_sections:
+                continue
             # Some patch notes have a section title - add this to the string in bold
             hero_name = section.find("h5", class_="PatchNotesHeroUpdate-name")
             if hero_name:
@@ -248,23 +461,36 @@ class Overwatch_Patch_Scraper():
         return patch_note_string
 
 
-    def __write_patch_notes_unknown(self, patch) -> str:
+    def __write_patch_notes_unknown(self, patch, changed_sections: list = None) -> str:
         """
         Given a patch from get_latest_patch or __get_patch_i that is of 'unknown' type,
         provides notification of and link to the patch into a Discord-friendly string.
 
         Params:
             patch (bs4.Tag) A patch from get_latest_patch or __get_patch_i
+            changed_sections (list) Not None to write the notification as an update to the patch.
         
         Returns:
             patch_note_string (str) A pretty string formatted with Discord markup of the patch details.
         """
-        patch_note_string = "A new Overwatch patch has been released! Patch notes from "
+        if changed_sections is not None:
+            patch_note_string = "An Overwatch patch has been updated! Patch notes from "
+        else:
+            patch_note_string = "A new Overwatch patch has been released! Patch notes from "
         patch_note_string += self.__get_patch_date(patch)
         patch_note_string += " can be found at: https://playoverwatch.com/en-us/news/patch-notes/"
         return patch_note_string
 
 
+    def __write_patch_header(self, patch, changed_sections: list = None) -> str:
+        """
+        Private function. Writes the first line of a patch's notes, saying whether it is new or updated.
+        """
+        if changed_sections is not None:
+            return f"An Overwatch patch has been updated! Changes to the patch notes from: {self.__get_patch_date(patch)}:\n\n"
+        return f"A new Overwatch patch has been released! Patch notes from: {self.__get_patch_date(patch)}:\n\n"
+
+
     def __split_message(self, patch_segment: str) -> tuple:
         """
         Given a patch_segment, splits it into two segments, the first with fewer than 2000 characters.
@@ -287,12 +513,12 @@ class Overwatch_Patch_Scraper():
         return patch_segment, second_patch_segment
 
 
-    def __create_messages(self, patch_note_string: str) -> list:
+    def create_messages(self, patch_note_string: str) -> list:
         """
         Recursively splits patch_note_string into a series of messages each <2000 characters.
 
         Params:
-            patch_note_string (str) The patch_note_string from __write_patch_notes
+            patch_note_string (str) The patch_note_string from write_patch_notes
         
         Returns:
             messages (list) A list of patch_notes, with each message <2000 characters.
@@ -311,6 +537,20 @@ class Overwatch_Patch_Scraper():
         return messages
 
 
+def hash_text(text: str) -> str:
+    """
+    Hashes text, ignoring differences in whitespace, e.g. to compare patch notes between polls.
+
+    Params:
+        text (str) The text to hash.
+
+    Returns:
+        text_hash (str) The hex digest of the text's hash.
+    """
+    text_hash = hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+    return text_hash
+
+
 if __name__ == "__main__":
     """
     Run this file directly to test viewing the latest patch notes.
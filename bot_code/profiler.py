@@ -0,0 +1,280 @@
+"""
+Class for profiling the running bot on demand, from the admin !profile command.
+
+While running, a background thread samples the stack of every other thread each interval: the
+event loop thread, running command handlers and Storage calls, and the executor threads the
+scraper runs in. Samples are written in the folded stack format read by flamegraph.pl and
+speedscope, along with a summary of the most sampled functions and of the memory allocated by the
+queue modules, from tracemalloc snapshots taken at the start and end.
+
+Nothing is hooked into the bot while no profile is running, so it costs nothing until asked for.
+"""
+
+# Standard library imports
+import datetime
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+# The longest a single profile may run for, in seconds.
+MAX_PROFILE_SECONDS = 300
+DEFAULT_INTERVAL = 0.005
+# Samples are put down to the first of these modules in their stack, searching from the innermost frame.
+COMPONENT_FILES = {"storage_layer.py": "storage", "patch_scraper.py": "scraper", "discord_bot.py": "commands"}
+# Threads whose innermost frame is in one of these are waiting for work or I/O.
+IDLE_FILES = ("selectors.py", "threading.py", "queue.py")
+# The modules whose memory is reported, holding the queue structures.
+QUEUE_FILES = ("overwatch_queue.py", "guild_queue.py", "name_index.py", "status_message.py")
+
+
+class Sampling_Profiler():
+    """
+    A sampling profiler of all threads, with tracemalloc snapshots of the queue modules.
+
+    Attributes:
+        interval (float): Seconds between samples.
+        trace_memory (bool): Whether to take tracemalloc snapshots.
+        stacks (dict): The count of samples of each stack, keyed by a tuple of frame names, outermost first.
+        components (dict): The count of samples put down to each component, e.g. 'storage' or 'idle'.
+        sample_count (int): The number of times the threads were sampled.
+        sample_seconds (float): The time spent taking samples.
+        running (bool): Whether the profiler is sampling.
+        start_time (float): When profiling started, from time.perf_counter, or None if it never has.
+        end_time (float): When profiling stopped, from time.perf_counter, or None if it has not.
+        memory_diff (list): The tracemalloc StatisticDiff of each queue module line, largest growth first.
+        memory_total (int): The bytes allocated by the queue modules and still held when profiling stopped.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, trace_memory: bool = True):
+        """
+        Initialise a stopped profiler.
+
+        Args:
+            interval (float): Seconds between samples.
+            trace_memory (bool): Whether to take tracemalloc snapshots of the queue modules.
+        """
+        self.interval = interval
+        self.trace_memory = trace_memory
+        self.stacks = {}
+        self.components = {}
+        self.sample_count = 0
+        self.sample_seconds = 0.0
+        self.running = False
+        self.start_time = None
+        self.end_time = None
+        self.memory_diff = []
+        self.memory_total = 0
+        self.__thread = None
+        self.__stop_event = threading.Event()
+        self.__start_snapshot = None
+        self.__started_tracemalloc = False
+
+
+    def start(self):
+        """
+        Starts sampling in a background thread, and tracing memory if trace_memory is set.
+        """
+        if self.running:
+            return
+        if self.trace_memory:
+            # If tracemalloc was started with the process, memory allocated before now is included too.
+            self.__started_tracemalloc = not tracemalloc.is_tracing()
+            if self.__started_tracemalloc:
+                tracemalloc.start()
+            self.__start_snapshot = tracemalloc.take_snapshot()
+        self.running = True
+        self.start_time = time.perf_counter()
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(target=self.__run, name="profiler", daemon=True)
+        self.__thread.start()
+
+
+    def stop(self):
+        """
+        Stops sampling, and takes the final memory snapshot.
+        """
+        if not self.running:
+            return
+        self.__stop_event.set()
+        self.__thread.join()
+        self.running = False
+        self.end_time = time.perf_counter()
+        if self.trace_memory:
+            end_snapshot = tracemalloc.take_snapshot()
+            if self.__started_tracemalloc:
+                tracemalloc.stop()
+            filters = [tracemalloc.Filter(True, f"*{fname}") for fname in QUEUE_FILES]
+            end_snapshot = end_snapshot.filter_traces(filters)
+            self.memory_diff = end_snapshot.compare_to(self.__start_snapshot.filter_traces(filters), "lineno")
+            self.memory_total = sum(statistic.size for statistic in end_snapshot.statistics("filename"))
+            self.__start_snapshot = None
+
+
+    def sample(self, frames: dict = None):
+        """
+        Records the current stack of every thread except the profiler's own.
+
+        Args:
+            frames (dict): The innermost frame of each thread, keyed by thread id, or None for sys._current_frames().
+        """
+        start = time.perf_counter()
+        frames = sys._current_frames() if frames is None else frames
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_ident = threading.get_ident()
+        for ident, frame in frames.items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(get_frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.append(thread_names.get(ident, f"thread-{ident}"))
+            key = tuple(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            component = get_component(key)
+            self.components[component] = self.components.get(component, 0) + 1
+        self.sample_count += 1
+        self.sample_seconds += time.perf_counter() - start
+
+
+    def to_folded(self) -> str:
+        """
+        Returns the samples in the folded stack format, one 'outermost;...;innermost count' line per stack.
+
+        Returns:
+            text (str): The folded stacks, readable by flamegraph.pl and speedscope.
+        """
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+    def get_top_functions(self, top_n: int = 10) -> list:
+        """
+        Gets the functions sampled most often, by their own time and by the time of everything they called.
+
+        Thread names and idle threads are left out.
+
+        Args:
+            top_n (int): The number of functions to return.
+
+        Returns:
+            top (list): (function, self samples, total samples) for the top_n functions by self samples.
+        """
+        self_counts, total_counts = {}, {}
+        for stack, count in self.stacks.items():
+            if get_component(stack) == "idle":
+                continue
+            frames = stack[1:]
+            self_counts[frames[-1]] = self_counts.get(frames[-1], 0) + count
+            # A recursive function is only counted once per sample.
+            for frame_name in set(frames):
+                total_counts[frame_name] = total_counts.get(frame_name, 0) + count
+        top = sorted(self_counts.items(), key=lambda item: (-item[1], item[0]))[:top_n]
+        return [(frame_name, self_count, total_counts[frame_name]) for frame_name, self_count in top]
+
+
+    def summary(self, top_n: int = 10) -> str:
+        """
+        Returns a Discord-friendly summary of the profile.
+
+        Args:
+            top_n (int): The number of functions, and of lines allocating memory, to list.
+
+        Returns:
+            message (str): The summary message.
+        """
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        seconds = end_time - self.start_time if self.start_time is not None else 0
+        message = (f"Profiled for {seconds:.1f} s: {self.sample_count} samples, "
+                   f"sampling took {1000 * self.sample_seconds:.0f} ms.")
+        thread_samples = sum(self.components.values())
+        if thread_samples:
+            shares = ", ".join(f"{component} {100 * count / thread_samples:.0f}%"
+                               for component, count in sorted(self.components.items(), key=lambda item: -item[1]))
+            message += f"\nThread samples by component: {shares}"
+        top = self.get_top_functions(top_n)
+        if top:
+            message += "\n\nMost sampled functions (self, total):"
+            for frame_name, self_count, total_count in top:
+                message += f"\n\t{frame_name}: {self_count}, {total_count}"
+        if self.trace_memory and self.end_time is not None:
+            message += f"\n\nQueue memory traced: {format_kibibytes(self.memory_total)}"
+            growth = [statistic for statistic in self.memory_diff if statistic.size_diff][:top_n]
+            if growth:
+                message += ", changed while profiling:"
+                for statistic in growth:
+                    frame = statistic.traceback[0]
+                    message += (f"\n\t{os.path.basename(frame.filename)}:{frame.lineno}: "
+                                f"{format_kibibytes(statistic.size_diff, sign=True)} "
+                                f"({statistic.count_diff:+d} blocks)")
+        return message
+
+
+    def write(self, directory: str, now: datetime.datetime = None) -> tuple:
+        """
+        Writes the folded stacks and the summary to files named after when they were written.
+
+        Args:
+            directory (str): The folder to write to, created if needed.
+            now (datetime.datetime): The time to name the files after, or None for now.
+
+        Returns:
+            fpaths (tuple): The folded stacks file path and the summary file path.
+        """
+        now = datetime.datetime.now() if now is None else now
+        os.makedirs(directory, exist_ok=True)
+        fname = f"profile-{now.strftime('%Y%m%d-%H%M%S')}"
+        folded_fpath = os.path.join(directory, fname + ".folded")
+        summary_fpath = os.path.join(directory, fname + ".txt")
+        with open(folded_fpath, "w") as f:
+            f.write(self.to_folded())
+        with open(summary_fpath, "w") as f:
+            f.write(self.summary(top_n=30) + "\n")
+        return folded_fpath, summary_fpath
+
+
+    def __run(self):
+        """
+        Private function. Samples every interval until stopped.
+        """
+        while not self.__stop_event.wait(self.interval):
+            self.sample()
+
+
+
+def get_frame_name(code) -> str:
+    """
+    Names a frame's function for a folded stack, e.g. 'Storage.save_queue (storage_layer.py:210)'.
+
+    Semicolons separate frames in the folded format, so none are left in the name.
+    """
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def get_component(stack: tuple) -> str:
+    """
+    Gets the component a sampled stack is put down to: the innermost module of COMPONENT_FILES in it,
+    or else 'idle' if the thread is waiting, or 'other'.
+
+    Args:
+        stack (tuple): The thread name, then its frame names from outermost to innermost.
+
+    Returns:
+        component (str)
+    """
+    for frame_name in reversed(stack[1:]):
+        for fname, component in COMPONENT_FILES.items():
+            if f"({fname}:" in frame_name:
+                return component
+    innermost = stack[-1] if len(stack) > 1 else ""
+    return "idle" if any(f"({fname}:" in innermost for fname in IDLE_FILES) else "other"
+
+
+def format_kibibytes(size: int, sign: bool = False) -> str:
+    """
+    Formats a number of bytes in KiB for display.
+    """
+    return f"{size / 1024:+.1f} KiB" if sign else f"{size / 1024:.1f} KiB"
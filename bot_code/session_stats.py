@@ -0,0 +1,209 @@
+"""
+Classes for the analytics of a queue's session: how many games each player played, and how long
+they spent playing, waiting and delaying.
+
+The analytics are kept up to date as the queue changes rather than worked out afterwards. Each
+player's record holds the state they are in and when they entered it, so a change of state only
+adds the time since then to one total. Games are counted with a single counter of games completed
+by the queue: a player's games are the games completed while they were playing, found by
+subtraction when they stop, so ending a game does not touch every player.
+"""
+
+# Standard library imports
+import datetime
+import time
+from copy import copy
+
+
+PLAYING = "playing"
+WAITING = "waiting"
+DELAYING = "delaying"
+
+
+class Player_Session():
+    """
+    A player's analytics for one session of a queue.
+
+    Attributes:
+        name (str): The name of the player.
+        state (str): PLAYING, WAITING or DELAYING, or None if not in the queue.
+        state_since (float): When the player entered their state, in seconds since the epoch.
+        games_played (int): Games completed while playing, not counting the current stint.
+        games_at_start (int): The queue's games completed when the player last started playing.
+        seconds (dict): Seconds spent in each state, not counting the current state.
+    """
+
+    def __init__(self, name: str, now: float):
+        self.name = name
+        self.state = None
+        self.state_since = now
+        self.games_played = 0
+        self.games_at_start = 0
+        self.seconds = {PLAYING: 0.0, WAITING: 0.0, DELAYING: 0.0}
+
+
+
+class Session_Stats():
+    """
+    The analytics of a queue's session, updated as each player changes state.
+
+    Attributes:
+        start_time (float): When the session started, in seconds since the epoch.
+        games_completed (int): The number of games the queue has moved on from.
+        players (dict): The Player_Session of each player in the session, keyed by name.
+        clock (callable): Returns the current time in seconds since the epoch.
+    """
+
+    def __init__(self, start_time: float = None, clock=time.time):
+        """
+        Initialise the analytics of a new session.
+
+        Args:
+            start_time (float): When the session started, or None for now.
+            clock (callable): Returns the current time in seconds since the epoch.
+        """
+        self.clock = clock
+        self.start_time = clock() if start_time is None else start_time
+        self.games_completed = 0
+        self.players = {}
+
+
+    def update_player(self, name: str, state: str):
+        """
+        Records that a player has changed state, adding the time spent in their previous state.
+
+        Args:
+            name (str): The name of the player.
+            state (str): PLAYING, WAITING or DELAYING, or None if they have left the queue.
+        """
+        now = self.clock()
+        record = self.players.get(name)
+        if record is None:
+            record = self.players[name] = Player_Session(name, now)
+        if record.state == state:
+            return
+        if record.state is not None:
+            record.seconds[record.state] += now - record.state_since
+        if record.state == PLAYING:
+            record.games_played += self.games_completed - record.games_at_start
+        if state == PLAYING:
+            record.games_at_start = self.games_completed
+        record.state = state
+        record.state_since = now
+
+
+    def complete_game(self):
+        """
+        Records that the queue has moved on to the next game.
+        """
+        self.games_completed += 1
+
+
+    def get_player_totals(self, name: str) -> dict:
+        """
+        Gets a player's analytics so far, including their current state.
+
+        Args:
+            name (str): The name of the player.
+
+        Returns:
+            totals (dict): The games played and seconds spent in each state, or None if not in the session.
+        """
+        record = self.players.get(name)
+        if record is None:
+            return None
+        totals = {"games_played": record.games_played, "seconds_playing": record.seconds[PLAYING],
+                  "seconds_waiting": record.seconds[WAITING], "seconds_delaying": record.seconds[DELAYING]}
+        if record.state == PLAYING:
+            totals["games_played"] += self.games_completed - record.games_at_start
+        if record.state is not None:
+            totals[f"seconds_{record.state}"] += self.clock() - record.state_since
+        return totals
+
+
+    def snapshot(self) -> "Session_Stats":
+        """
+        Copies the analytics, e.g. to back up before a command. Only each player's record and its
+        seconds are copied, as the rest never changes in place, which is far cheaper than deepcopy.
+
+        Returns:
+            Session_Stats: The copy.
+        """
+        session = copy(self)
+        session.players = {}
+        for name, record in self.players.items():
+            record_copy = session.players[name] = copy(record)
+            record_copy.seconds = dict(record.seconds)
+        return session
+
+
+    def end(self) -> dict:
+        """
+        Ends the session, closing every player's current state.
+
+        Returns:
+            summary (dict): The session's start and end times, games completed and each player's totals.
+        """
+        for name in self.players:
+            self.update_player(name, None)
+        return self.to_dict()
+
+
+    def summary(self, max_players: int = 20) -> str:
+        """
+        Returns a Discord-friendly summary of the session, most games played first.
+
+        Args:
+            max_players (int): The most players to list.
+
+        Returns:
+            message (str): The summary message.
+        """
+        start = datetime.datetime.fromtimestamp(self.start_time)
+        message = (f"Session started {start.strftime('%d %B, %Y %H:%M')} "
+                   f"({format_seconds(self.clock() - self.start_time)} ago), {self.games_completed} games played.")
+        totals = sorted(((name, self.get_player_totals(name)) for name in self.players),
+                        key=lambda item: (-item[1]["games_played"], item[0]))
+        for name, player_totals in totals[:max_players]:
+            message += (f"\n\t{name}: {player_totals['games_played']} games, "
+                        f"waited {format_seconds(player_totals['seconds_waiting'])}, "
+                        f"delayed {format_seconds(player_totals['seconds_delaying'])}")
+        if len(totals) > max_players:
+            message += f"\n\t...and {len(totals) - max_players} more players."
+        return message
+
+
+    def to_dict(self) -> dict:
+        """
+        Returns the session as a dict of plain types, e.g. to save as JSON.
+        """
+        return {"start_time": self.start_time,
+                "games_completed": self.games_completed,
+                "players": [{"name": record.name, "state": record.state, "state_since": record.state_since,
+                             "games_played": record.games_played, "games_at_start": record.games_at_start,
+                             "seconds": record.seconds} for record in self.players.values()]}
+
+
+    @classmethod
+    def from_dict(cls, state: dict, clock=time.time):
+        """
+        Creates a session from the dict returned by to_dict.
+        """
+        session = cls(start_time=state["start_time"], clock=clock)
+        session.games_completed = state["games_completed"]
+        for player_state in state["players"]:
+            record = Player_Session(player_state["name"], player_state["state_since"])
+            record.state = player_state["state"]
+            record.games_played = player_state["games_played"]
+            record.games_at_start = player_state["games_at_start"]
+            record.seconds = dict(player_state["seconds"])
+            session.players[record.name] = record
+        return session
+
+
+
+def format_seconds(seconds: float) -> str:
+    """
+    Formats a number of seconds as hours, minutes and seconds, e.g. 1:05:09.
+    """
+    return str(datetime.timedelta(seconds=int(seconds)))
@@ -0,0 +1,78 @@
+"""
+Functions for running the bot as several processes (shards), each connected to Discord for a
+subset of guilds.
+
+Shards share their queues, patch note channels and leader election through the Storage database,
+so any shard can pick up a guild's queue where another left it.
+"""
+
+# Standard library imports
+import multiprocessing
+import os
+import socket
+
+# Local imports
+from patch_schedule import DEFAULT_POLLS_PER_DAY
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """
+    Gets the shard that Discord sends a guild's events to.
+
+    Args:
+        guild_id (int): The id of the guild.
+        shard_count (int): The total number of shards.
+
+    Returns:
+        shard_id (int): The id of the shard, from 0 to shard_count - 1.
+    """
+    return (guild_id >> 22) % shard_count
+
+
+def get_instance_id(shard_id: int = None) -> str:
+    """
+    Gets an id unique to this bot process, to hold leases in the shared database.
+
+    Args:
+        shard_id (int): The shard this process runs, or None if not sharded.
+
+    Returns:
+        instance_id (str): The host, process id and shard of this process.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{shard_id if shard_id is not None else 'unsharded'}"
+
+
+def run_shard(token: str, shard_id: int, shard_count: int, patch_polls_per_day: int = DEFAULT_POLLS_PER_DAY):
+    """
+    Creates and runs the bot for one shard. Called in each shard's process.
+
+    Args:
+        token (str): The Discord bot token.
+        shard_id (int): The shard to run.
+        shard_count (int): The total number of shards.
+        patch_polls_per_day (int): The most polls of the patch notes site to plan for in a day.
+    """
+    # Imported here so that each shard's process sets up its own bot and database connection.
+    from discord_bot import create_bot
+    bot = create_bot(shard_id=shard_id, shard_count=shard_count, patch_polls_per_day=patch_polls_per_day)
+    bot.run(token)
+
+
+def run_shards(token: str, shard_count: int, patch_polls_per_day: int = DEFAULT_POLLS_PER_DAY):
+    """
+    Runs the bot as shard_count processes, one per shard, waiting until they all exit.
+
+    Args:
+        token (str): The Discord bot token.
+        shard_count (int): The number of shards to run.
+        patch_polls_per_day (int): The most polls of the patch notes site to plan for in a day, in
+            whichever shard polls.
+    """
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_shard, args=(token, shard_id, shard_count, patch_polls_per_day),
+                                 name=f"overwatch-bot-shard-{shard_id}")
+                 for shard_id in range(shard_count)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
@@ -0,0 +1,161 @@
+"""
+Class for taking regular snapshots of linked players' key stats, with helpers to read back trends.
+
+Snapshots are stored by Storage as integer (player id, stat, time, value) rows, appended only
+when a value has changed, so a player who has not played adds nothing. Old samples are thinned
+out to one a day, then one a week, so the table stays small however long the bot runs.
+"""
+
+# Standard library imports
+import datetime
+import time
+
+# Third party imports
+import over_stats
+
+
+# The integer code each stat is stored under. Never reuse or renumber a code.
+STAT_CODES = {"sr": 1,
+              "quickplay_seconds": 2,
+              "competitive_seconds": 3,
+              "quickplay_games_won": 4,
+              "competitive_games_won": 5}
+# Samples younger than this are all kept, then one a day is kept until DAILY_RETENTION, then one a week.
+RAW_RETENTION = 7 * 24 * 60 * 60
+DAILY_RETENTION = 90 * 24 * 60 * 60
+DAY = 24 * 60 * 60
+WEEK = 7 * DAY
+
+
+class Stats_Snapshotter():
+    """
+    Records the key stats of every linked player, fetching their profiles concurrently.
+
+    Attributes:
+        storage (Storage): The storage the players are linked in and samples are written to.
+        profile_fetcher (Profile_Fetcher): The fetcher used to get the players' profiles.
+    """
+
+    def __init__(self, storage, profile_fetcher):
+        """
+        Initialise a Stats_Snapshotter.
+
+        Args:
+            storage (Storage): The storage the players are linked in and samples are written to.
+            profile_fetcher (Profile_Fetcher): The fetcher used to get the players' profiles.
+        """
+        self.storage = storage
+        self.profile_fetcher = profile_fetcher
+
+
+    async def snapshot(self, now: int = None) -> int:
+        """
+        Records the current key stats of every linked player whose profile can be fetched.
+
+        Args:
+            now (int): The time to record the samples at, in seconds since the epoch, or None for now.
+
+        Returns:
+            appended (int): The number of samples appended, which is only those that changed.
+        """
+        now = int(time.time()) if now is None else now
+        linked_players = await self.storage.get_linked_players()
+        ratings = await self.storage.get_ratings(list({discord_name for _, discord_name, _ in linked_players}))
+        profiles, _ = await self.profile_fetcher.fetch_profiles([battle_tag for _, _, battle_tag in linked_players])
+        samples = []
+        for player_id, discord_name, battle_tag in linked_players:
+            stats = get_key_stats(profiles[battle_tag]) if battle_tag in profiles else {}
+            if discord_name in ratings:
+                stats["sr"] = ratings[discord_name][0]
+            samples.extend((player_id, STAT_CODES[stat], now, value) for stat, value in stats.items())
+        return await self.storage.append_stat_samples(samples)
+
+
+    async def downsample(self, now: int = None) -> int:
+        """
+        Thins out old samples, keeping one a day after RAW_RETENTION and one a week after DAILY_RETENTION.
+
+        Args:
+            now (int): The current time in seconds since the epoch, or None for now.
+
+        Returns:
+            deleted (int): The number of samples deleted.
+        """
+        now = int(time.time()) if now is None else now
+        deleted = await self.storage.downsample_stat_samples(now - RAW_RETENTION, DAY)
+        deleted += await self.storage.downsample_stat_samples(now - DAILY_RETENTION, WEEK)
+        return deleted
+
+
+
+def get_key_stats(profile) -> dict:
+    """
+    Gets the time played and games won in each mode from a loaded profile, skipping any not shown.
+
+    Args:
+        profile (over_stats.PlayerProfile): The loaded profile.
+
+    Returns:
+        stats (dict): The integer value of each stat found, keyed by stat name.
+    """
+    stats = {}
+    for mode in profile.modes():
+        for stat_name, key in (("Time Played", f"{mode}_seconds"), ("Games Won", f"{mode}_games_won")):
+            if key not in STAT_CODES:
+                continue
+            try:
+                value = profile.stats(mode, "ALL HEROES", "Game", stat_name)
+            except (over_stats.errors.DataNotFound, KeyError, TypeError):
+                continue
+            value = parse_duration(value) if isinstance(value, str) else value
+            if isinstance(value, (int, float)):
+                stats[key] = int(value)
+    return stats
+
+
+def parse_duration(value: str):
+    """
+    Converts a duration such as '12:34:56' or '34:56' to seconds, or None if it is not one.
+    """
+    seconds = 0
+    for part in value.split(":"):
+        if not part.isdigit():
+            return None
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+def format_stat_value(stat: str, value: int) -> str:
+    """
+    Formats a stat's value for display, showing durations in hours.
+    """
+    if stat.endswith("_seconds"):
+        return f"{value / 3600:.1f} hours"
+    return str(value)
+
+
+def format_trend(name: str, stat: str, samples: list, days: int) -> str:
+    """
+    Formats a player's samples of a stat, from Storage.get_stat_samples, as a Discord message.
+
+    Args:
+        name (str): The player's name.
+        stat (str): The name of the stat.
+        samples (list): The (time, value) samples, oldest first.
+        days (int): The number of days the samples cover.
+
+    Returns:
+        str
+    """
+    if not samples:
+        return f"There are no {stat} records for {name} yet."
+    first_time, first_value = samples[0]
+    last_time, last_value = samples[-1]
+    change = last_value - first_value
+    message = (f"{name}'s {stat} over the last {days} days: {format_stat_value(stat, first_value)} to "
+               f"{format_stat_value(stat, last_value)} ({'+' if change >= 0 else '-'}"
+               f"{format_stat_value(stat, abs(change))}).")
+    for sample_time, value in samples[-10:]:
+        date = datetime.datetime.fromtimestamp(sample_time).strftime('%d %B, %Y')
+        message += f"\n\t{date}: {format_stat_value(stat, value)}"
+    return message
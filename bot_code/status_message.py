@@ -0,0 +1,154 @@
+"""
+Class for a single, pinned Discord message showing the status of a queue, edited in place as the
+queue changes.
+
+Changes are debounced - the message is only edited once per debounce window however many times
+the queue changes within it - so a rush of commands costs one edit rather than one message each.
+"""
+
+# Standard library imports
+import asyncio
+
+# Third party imports
+import discord
+
+# Local imports
+from dispatcher import STATUS
+
+
+class Live_Status_Message():
+    """
+    A pinned message showing the status of a queue, kept up to date with debounced edits.
+
+    Attributes:
+        render (callable): A function returning the current status message content.
+        debounce (float): Seconds to wait after a change before editing, to coalesce further changes.
+        channel (discord.abc.Messageable): The channel the message should be in, or None.
+        message (discord.Message): The posted status message, or None if not yet posted.
+        send_count (int): The number of status messages sent.
+        edit_count (int): The number of edits made to status messages.
+        dispatcher (Outbound_Dispatcher): Sends the message's requests after command replies, or None to send directly.
+    """
+
+    def __init__(self, render, debounce: float = 1.5, dispatcher=None):
+        """
+        Initialise a status message, without posting it.
+
+        Args:
+            render (callable): A function returning the current status message content.
+            debounce (float): Seconds to wait after a change before editing.
+            dispatcher (Outbound_Dispatcher): Sends the message's requests after command replies, or None to send directly.
+        """
+        self.render = render
+        self.debounce = debounce
+        self.dispatcher = dispatcher
+        self.channel = None
+        self.message = None
+        self.send_count = 0
+        self.edit_count = 0
+        self.__posted_content = None
+        self.__pending = None
+        self.__lock = None
+
+
+    def request_update(self, channel: discord.abc.Messageable):
+        """
+        Schedules the status message to be updated at the end of the debounce window.
+
+        If the message is in a different channel, it is moved to this channel when updated.
+
+        Args:
+            channel (discord.abc.Messageable): The channel the queue was last used in.
+        """
+        self.channel = channel
+        if self.__pending is None:
+            self.__pending = asyncio.ensure_future(self.__update_after_debounce())
+
+
+    async def flush(self):
+        """
+        Updates the status message now, posting and pinning it if there is not one in the channel.
+        """
+        if self.__lock is None:
+            self.__lock = asyncio.Lock()
+        async with self.__lock:
+            if self.channel is None:
+                return
+            content = self.render()
+            if self.message is not None and self.message.channel.id != self.channel.id:
+                await self.__unpin()
+                self.message = None
+            if self.message is not None and content == self.__posted_content:
+                return
+            if self.message is not None:
+                try:
+                    await self.__request(self.message.channel.id, lambda: self.message.edit(content=content))
+                    self.edit_count += 1
+                    self.__posted_content = content
+                    return
+                except discord.NotFound:
+                    # The status message was deleted, so post a new one.
+                    self.message = None
+            self.message = await self.__request(self.channel.id, lambda: self.channel.send(content))
+            self.send_count += 1
+            self.__posted_content = content
+            try:
+                await self.__request(self.message.channel.id, self.message.pin)
+            except discord.HTTPException:
+                # Missing permission to pin, or too many pins - the message still works unpinned.
+                pass
+
+
+    async def close(self, final_content: str = None):
+        """
+        Stops updating the status message, editing it a final time and unpinning it.
+
+        Args:
+            final_content (str): The content to leave in the message, or None to leave it as it is.
+        """
+        if self.__pending is not None:
+            self.__pending.cancel()
+            self.__pending = None
+        if self.message is not None:
+            if final_content is not None and final_content != self.__posted_content:
+                try:
+                    await self.__request(self.message.channel.id, lambda: self.message.edit(content=final_content))
+                    self.edit_count += 1
+                except discord.HTTPException:
+                    pass
+            await self.__unpin()
+        self.message = None
+        self.__posted_content = None
+
+
+    async def __update_after_debounce(self):
+        """
+        Private function. Waits for the debounce window then updates the message.
+        Called in request_update.
+        """
+        await asyncio.sleep(self.debounce)
+        # Clear the pending update first, so changes made while editing schedule another update.
+        self.__pending = None
+        try:
+            await self.flush()
+        except discord.HTTPException as e:
+            print(f"Could not update the queue status message: {e}")
+
+
+    async def __unpin(self):
+        """
+        Private function. Unpins the status message, ignoring it having been deleted or unpinned.
+        """
+        try:
+            await self.__request(self.message.channel.id, self.message.unpin)
+        except discord.HTTPException:
+            pass
+
+
+    async def __request(self, channel_id: int, operation):
+        """
+        Private function. Makes a request to Discord for the status message, through the dispatcher if there is one.
+        """
+        if self.dispatcher is None:
+            return await operation()
+        return await self.dispatcher.submit(channel_id, STATUS, operation)
@@ -1,5 +1,7 @@
+import json
 import os
 import sqlite3
+import time
 from sqlite3 import Error
 
 """
@@ -14,10 +16,13 @@ class Storage():
     Class for handling sqlite storage of data
     """
 
-    def __init__(self):
+    def __init__(self, check_same_thread: bool = True):
         """
         Initialise an Battlenet Account.
+
+        :param check_same_thread (bool) False to allow the connection to be used from other threads, one at a time.
         """
+        self.check_same_thread = check_same_thread
         self.conn = self.create_connection()
 
 
@@ -27,7 +32,9 @@ class Storage():
         if not os.path.exists("./db"):
             os.mkdir("./db")
         try:
-            conn = sqlite3.connect(r"./db/overwatch_stats.db")
+            # Several bot processes (shards) may share the database, so wait for each other's writes.
+            conn = sqlite3.connect(r"./db/overwatch_stats.db", timeout=10, check_same_thread=self.check_same_thread)
+            conn.execute("PRAGMA journal_mode=WAL")
             print(sqlite3.version)
         except Error as e:
             print(e)
@@ -38,7 +45,68 @@ class Storage():
                                 discord_name text NOT NULL,
                                 battle_tag text UNIQUE NOT NULL
                                 ); """
+                sql_create_ratings_table = """ CREATE TABLE IF NOT EXISTS ratings (
+                                battle_tag text PRIMARY KEY,
+                                sr integer NOT NULL,
+                                role text
+                                ); """
+                # Stat samples are all integers, clustered by player, stat and time, so a range of one
+                # player's stat is read from one run of the table.
+                sql_create_stat_samples_table = """ CREATE TABLE IF NOT EXISTS stat_samples (
+                                player_id integer NOT NULL,
+                                stat integer NOT NULL,
+                                time integer NOT NULL,
+                                value integer NOT NULL,
+                                PRIMARY KEY (player_id, stat, time)
+                                ) WITHOUT ROWID; """
+                sql_create_queues_table = """ CREATE TABLE IF NOT EXISTS queues (
+                                guild_id integer PRIMARY KEY,
+                                state text NOT NULL,
+                                updated_at real NOT NULL
+                                ); """
+                sql_create_sessions_table = """ CREATE TABLE IF NOT EXISTS sessions (
+                                id integer PRIMARY KEY,
+                                guild_id integer NOT NULL,
+                                ended_at real NOT NULL,
+                                summary text NOT NULL
+                                ); """
+                sql_create_patch_subscriptions_table = """ CREATE TABLE IF NOT EXISTS patch_subscriptions (
+                                channel_id integer NOT NULL,
+                                feed text NOT NULL,
+                                PRIMARY KEY (feed, channel_id)
+                                ); """
+                # The latest patch of each feed, so every process, and the next run, knows what has been posted.
+                sql_create_patch_state_table = """ CREATE TABLE IF NOT EXISTS patch_state (
+                                feed text PRIMARY KEY,
+                                patch_date text NOT NULL,
+                                section_hashes text NOT NULL
+                                ); """
+                # Each save takes the next version, so processes can load just the settings changed since they last looked.
+                sql_create_guild_settings_table = """ CREATE TABLE IF NOT EXISTS guild_settings (
+                                guild_id integer PRIMARY KEY,
+                                settings text NOT NULL,
+                                version integer NOT NULL
+                                ); """
+                sql_create_leases_table = """ CREATE TABLE IF NOT EXISTS leases (
+                                name text PRIMARY KEY,
+                                holder text NOT NULL,
+                                expires_at real NOT NULL
+                                ); """
                 conn.cursor().execute(sql_create_players_table)
+                conn.cursor().execute(sql_create_ratings_table)
+                conn.cursor().execute(sql_create_stat_samples_table)
+                conn.cursor().execute(sql_create_queues_table)
+                conn.cursor().execute(sql_create_sessions_table)
+                conn.cursor().execute('CREATE INDEX IF NOT EXISTS sessions_guild ON sessions(guild_id, ended_at)')
+                conn.cursor().execute(sql_create_patch_subscriptions_table)
+                # Channels subscribed before there were feeds to choose from get the live feed.
+                if conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='patch_channels'").fetchone():
+                    conn.cursor().execute("INSERT OR IGNORE INTO patch_subscriptions(channel_id, feed) SELECT channel_id, 'live' FROM patch_channels")
+                    conn.cursor().execute('DROP TABLE patch_channels')
+                conn.cursor().execute(sql_create_patch_state_table)
+                conn.cursor().execute(sql_create_leases_table)
+                conn.cursor().execute(sql_create_guild_settings_table)
+                conn.cursor().execute('CREATE INDEX IF NOT EXISTS guild_settings_version ON guild_settings(version)')
                 conn.commit()
         return conn
 
@@ -48,7 +116,7 @@ class Storage():
         Inserts or updates a player based on the idea the battle tag will not change but the discord name might
         """
         t = (discord_name, battle_tag)
-        self.conn.cursor().execute('INSERT INTO players(discord_name ,battle_tag) VALUES(?,?) ON CONFLICT(battle_tag) DO UPDATE SET discord_name=excluded.battle_tag;', t)
+        self.conn.cursor().execute('INSERT INTO players(discord_name ,battle_tag) VALUES(?,?) ON CONFLICT(battle_tag) DO UPDATE SET discord_name=excluded.discord_name;', t)
         self.conn.commit()
     
     async def get_battltag(self, discord_name: str):
@@ -57,7 +125,244 @@ class Storage():
         """
         c= self.conn.cursor()
         t = ( discord_name, )
-        c.execute('SELECT battle_tag FROM players WEHRE battle_tag=?', t)
+        c.execute('SELECT battle_tag FROM players WHERE discord_name=? ORDER BY id DESC', t)
 
         return c.fetchone()
-        
+
+
+    async def get_battletags(self, discord_names: list) -> dict:
+        """
+        Gets the battletag linked to each of the discord users that has one, as a dict of discord name to battletag.
+        """
+        if not discord_names:
+            return {}
+        c = self.conn.cursor()
+        # Only the placeholders are formatted into the query, the names are still substituted.
+        placeholders = ",".join("?" * len(discord_names))
+        c.execute(f'SELECT discord_name, battle_tag FROM players WHERE discord_name IN ({placeholders}) ORDER BY id', tuple(discord_names))
+        return dict(c.fetchall())
+
+
+    async def set_rating(self, battle_tag: str, sr: int, role: str = None):
+        """
+        Sets the skill rating and main role of a battle tag, replacing any set before.
+        """
+        t = (battle_tag, sr, role)
+        self.conn.cursor().execute('INSERT INTO ratings(battle_tag, sr, role) VALUES(?,?,?) ON CONFLICT(battle_tag) DO UPDATE SET sr=excluded.sr, role=excluded.role;', t)
+        self.conn.commit()
+
+
+    async def get_ratings(self, discord_names: list) -> dict:
+        """
+        Gets the skill rating and main role of each discord user with a rated, linked battle tag,
+        as a dict of discord name to (sr, role).
+        """
+        if not discord_names:
+            return {}
+        c = self.conn.cursor()
+        # Only the placeholders are formatted into the query, the names are still substituted.
+        placeholders = ",".join("?" * len(discord_names))
+        c.execute(f'SELECT players.discord_name, ratings.sr, ratings.role FROM players JOIN ratings ON players.battle_tag=ratings.battle_tag WHERE players.discord_name IN ({placeholders}) ORDER BY players.id', tuple(discord_names))
+        return {discord_name: (sr, role) for discord_name, sr, role in c.fetchall()}
+
+
+    async def get_linked_players(self) -> list:
+        """
+        Gets every linked player, as a list of (player id, discord name, battle tag).
+        """
+        c = self.conn.cursor()
+        c.execute('SELECT id, discord_name, battle_tag FROM players ORDER BY id')
+        return c.fetchall()
+
+
+    async def get_player_id(self, discord_name: str):
+        """
+        Gets the id of the player linked to the discord user, or None if they have not linked an account.
+        """
+        c = self.conn.cursor()
+        c.execute('SELECT id FROM players WHERE discord_name=? ORDER BY id DESC', (discord_name, ))
+        row = c.fetchone()
+        return row[0] if row else None
+
+
+    async def append_stat_samples(self, samples: list) -> int:
+        """
+        Appends (player id, stat, time, value) samples, skipping any whose value is unchanged since
+        the stat's latest sample. Returns the number of samples appended.
+        """
+        c = self.conn.cursor()
+        appended = 0
+        for player_id, stat, sample_time, value in samples:
+            c.execute('SELECT value FROM stat_samples WHERE player_id=? AND stat=? ORDER BY time DESC LIMIT 1', (player_id, stat))
+            latest = c.fetchone()
+            if latest is None or latest[0] != value:
+                c.execute('INSERT OR REPLACE INTO stat_samples(player_id, stat, time, value) VALUES(?,?,?,?)', (player_id, stat, sample_time, value))
+                appended += 1
+        self.conn.commit()
+        return appended
+
+
+    async def get_stat_samples(self, player_id: int, stat: int, start: int, end: int) -> list:
+        """
+        Gets a player's samples of a stat from start to end as a list of (time, value), starting
+        with the latest sample before start, if any, as the stat's value at start.
+        """
+        c = self.conn.cursor()
+        c.execute('SELECT time, value FROM stat_samples WHERE player_id=? AND stat=? AND time<? ORDER BY time DESC LIMIT 1', (player_id, stat, start))
+        samples = c.fetchall()
+        c.execute('SELECT time, value FROM stat_samples WHERE player_id=? AND stat=? AND time>=? AND time<=? ORDER BY time', (player_id, stat, start, end))
+        return samples + c.fetchall()
+
+
+    async def downsample_stat_samples(self, before: int, interval: int) -> int:
+        """
+        Keeps only the latest sample in each interval seconds of each player's stat, for samples
+        from before the given time. Returns the number of samples deleted.
+        """
+        c = self.conn.cursor()
+        c.execute('DELETE FROM stat_samples WHERE time<? AND EXISTS (SELECT 1 FROM stat_samples AS later WHERE later.player_id=stat_samples.player_id AND later.stat=stat_samples.stat AND later.time>stat_samples.time AND later.time<? AND later.time/?=stat_samples.time/?)', (before, before, interval, interval))
+        self.conn.commit()
+        return c.rowcount
+
+
+    async def save_queue(self, guild_id: int, state: dict):
+        """
+        Saves the state of a guild's queue, from Overwatch_Queue.to_dict, replacing any saved before.
+        """
+        t = (guild_id, json.dumps(state), time.time())
+        self.conn.cursor().execute('INSERT INTO queues(guild_id, state, updated_at) VALUES(?,?,?) ON CONFLICT(guild_id) DO UPDATE SET state=excluded.state, updated_at=excluded.updated_at;', t)
+        self.conn.commit()
+
+
+    async def load_queue(self, guild_id: int):
+        """
+        Loads the saved state of a guild's queue, or None if it has no saved queue.
+        """
+        c = self.conn.cursor()
+        c.execute('SELECT state FROM queues WHERE guild_id=?', (guild_id, ))
+        row = c.fetchone()
+        return json.loads(row[0]) if row else None
+
+
+    async def delete_queue(self, guild_id: int):
+        """
+        Deletes the saved state of a guild's queue, if it has one.
+        """
+        self.conn.cursor().execute('DELETE FROM queues WHERE guild_id=?', (guild_id, ))
+        self.conn.commit()
+
+
+    async def archive_session(self, guild_id: int, summary: dict):
+        """
+        Archives the analytics of a guild's ended queue session, from Session_Stats.end.
+        """
+        t = (guild_id, time.time(), json.dumps(summary))
+        self.conn.cursor().execute('INSERT INTO sessions(guild_id, ended_at, summary) VALUES(?,?,?)', t)
+        self.conn.commit()
+
+
+    async def get_archived_sessions(self, guild_id: int, limit: int = 10) -> list:
+        """
+        Gets the analytics of a guild's most recently ended sessions, newest first.
+        """
+        c = self.conn.cursor()
+        c.execute('SELECT summary FROM sessions WHERE guild_id=? ORDER BY ended_at DESC LIMIT ?', (guild_id, limit))
+        return [json.loads(row[0]) for row in c.fetchall()]
+
+
+    async def add_patch_channel(self, channel_id: int, feed: str = "live") -> bool:
+        """
+        Subscribes a channel to a feed of patch notes, returning False if it was already subscribed.
+        """
+        c = self.conn.cursor()
+        c.execute('INSERT OR IGNORE INTO patch_subscriptions(channel_id, feed) VALUES(?,?)', (channel_id, feed))
+        self.conn.commit()
+        return c.rowcount == 1
+
+
+    async def remove_patch_channel(self, channel_id: int, feed: str = "live") -> bool:
+        """
+        Unsubscribes a channel from a feed of patch notes, returning False if it was not subscribed.
+        """
+        c = self.conn.cursor()
+        c.execute('DELETE FROM patch_subscriptions WHERE channel_id=? AND feed=?', (channel_id, feed))
+        self.conn.commit()
+        return c.rowcount == 1
+
+
+    async def get_patch_channels(self, feed: str = "live") -> list:
+        """
+        Gets the ids of all channels subscribed to a feed of patch notes.
+        """
+        c = self.conn.cursor()
+        c.execute('SELECT channel_id FROM patch_subscriptions WHERE feed=? ORDER BY channel_id', (feed, ))
+        return [row[0] for row in c.fetchall()]
+
+
+    def get_patch_state(self, feed: str):
+        """
+        Gets the (date, section hashes) of the latest patch stored for a feed, or None if none is stored.
+
+        Not async, as the patch scraper reads it from the threads it checks the feeds in.
+        """
+        c = self.conn.cursor()
+        c.execute('SELECT patch_date, section_hashes FROM patch_state WHERE feed=?', (feed, ))
+        row = c.fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+
+    def save_patch_state(self, feed: str, patch_date: str, section_hashes: dict):
+        """
+        Stores the date and section hashes of a feed's latest patch, replacing any stored before.
+
+        Not async, as the patch scraper writes it from the threads it checks the feeds in.
+        """
+        t = (feed, patch_date, json.dumps(section_hashes))
+        self.conn.cursor().execute('INSERT INTO patch_state(feed, patch_date, section_hashes) VALUES(?,?,?) ON CONFLICT(feed) DO UPDATE SET patch_date=excluded.patch_date, section_hashes=excluded.section_hashes;', t)
+        self.conn.commit()
+
+
+    async def save_guild_settings(self, guild_id: int, settings: dict) -> int:
+        """
+        Saves a guild's settings, from Guild_Settings.to_dict, replacing any saved before.
+        Returns the settings' version, one more than the highest version of any guild's settings.
+        """
+        t = (guild_id, json.dumps(settings))
+        self.conn.cursor().execute('INSERT INTO guild_settings(guild_id, settings, version) VALUES(?,?,(SELECT COALESCE(MAX(version), 0) + 1 FROM guild_settings)) ON CONFLICT(guild_id) DO UPDATE SET settings=excluded.settings, version=excluded.version;', t)
+        self.conn.commit()
+        c = self.conn.cursor()
+        c.execute('SELECT version FROM guild_settings WHERE guild_id=?', (guild_id, ))
+        return c.fetchone()[0]
+
+
+    async def get_changed_guild_settings(self, since_version: int) -> list:
+        """
+        Gets the (guild id, settings, version) of each guild whose settings were saved after since_version, oldest first.
+        """
+        c = self.conn.cursor()
+        c.execute('SELECT guild_id, settings, version FROM guild_settings WHERE version>? ORDER BY version', (since_version, ))
+        return [(row[0], json.loads(row[1]), row[2]) for row in c.fetchall()]
+
+
+    async def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """
+        Takes or renews the named lease for holder, for ttl seconds, unless another holder has it.
+
+        Used to elect a single leader among the bot's processes, e.g. to poll for patches.
+        Returns True if holder now has the lease.
+        """
+        now = time.time()
+        t = (name, holder, now + ttl, now)
+        self.conn.cursor().execute('INSERT INTO leases(name, holder, expires_at) VALUES(?,?,?) ON CONFLICT(name) DO UPDATE SET holder=excluded.holder, expires_at=excluded.expires_at WHERE leases.holder=excluded.holder OR leases.expires_at<?;', t)
+        self.conn.commit()
+        c = self.conn.cursor()
+        c.execute('SELECT holder FROM leases WHERE name=?', (name, ))
+        return c.fetchone()[0] == holder
+
+
+    async def release_lease(self, name: str, holder: str):
+        """
+        Gives up the named lease, if holder has it.
+        """
+        self.conn.cursor().execute('DELETE FROM leases WHERE name=? AND holder=?', (name, holder))
+        self.conn.commit()
@@ -0,0 +1,223 @@
+"""
+Class for splitting a game's players into two teams with as close to equal skill rating (SR) and
+roles as possible.
+
+Lobbies of up to EXACT_SEARCH_LIMIT players are split exactly with a meet-in-the-middle search:
+the players are halved, every subset of each half is listed once, and each subset of the first
+half is matched to the best subset of the second by binary search over SR totals. That is about
+2^(n/2) subsets rather than the n choose n/2 splits of a full search, so 12 players take well under
+a millisecond. Larger custom lobbies are split greedily then improved by swapping pairs of players.
+"""
+
+# Standard library imports
+from bisect import bisect_left
+from itertools import combinations
+
+
+ROLES = ("tank", "damage", "support")
+# The SR difference treated as equally bad as one team having an extra player in a role.
+ROLE_IMBALANCE_SR = 250
+# Lobbies larger than this are split with the swap heuristic rather than exactly.
+EXACT_SEARCH_LIMIT = 20
+# The SR given to players without one, if no player in the lobby has one.
+DEFAULT_SR = 2500
+
+
+class Rated_Player():
+    """
+    A player's name with their skill rating and main role, if known.
+    """
+
+    def __init__(self, name: str, sr: int = None, role: str = None):
+        """
+        Initialise a rated player.
+
+        Args:
+            name (str): The Discord name of the player.
+            sr (int): The player's skill rating, or None if unknown.
+            role (str): The player's main role - one of ROLES - or None if unknown.
+        """
+        self.name = name
+        self.sr = sr
+        self.role = role if role in ROLES else None
+
+
+
+class Team_Balancer():
+    """
+    Splits players into two teams, minimising the SR difference plus role_weight for each player
+    by which the teams differ in a role.
+
+    Attributes:
+        role_weight (float): The SR difference counted as equal to one player's role imbalance.
+        exact_search_limit (int): The most players split with the exact search.
+    """
+
+    def __init__(self, role_weight: float = ROLE_IMBALANCE_SR, exact_search_limit: int = EXACT_SEARCH_LIMIT):
+        """
+        Initialise a Team_Balancer.
+
+        Args:
+            role_weight (float): The SR difference counted as equal to one player's role imbalance.
+            exact_search_limit (int): The most players split with the exact search.
+        """
+        self.role_weight = role_weight
+        self.exact_search_limit = exact_search_limit
+
+
+    def balance(self, players: list) -> tuple:
+        """
+        Splits players into two teams. If there is an odd number of players, the second team has
+        the extra player. Players without an SR count as the average SR of those with one.
+
+        Args:
+            players (list): The Rated_Player objects to split.
+
+        Returns:
+            team_one (list): The Rated_Player objects in the first team.
+            team_two (list): The Rated_Player objects in the second team.
+        """
+        known_srs = [player.sr for player in players if player.sr is not None]
+        default_sr = round(sum(known_srs) / len(known_srs)) if known_srs else DEFAULT_SR
+        srs = [player.sr if player.sr is not None else default_sr for player in players]
+        roles = [role_vector(player.role) for player in players]
+        if len(players) <= self.exact_search_limit:
+            team_one_indexes = self.__split_exact(srs, roles)
+        else:
+            team_one_indexes = self.__split_heuristic(srs, roles)
+        team_one = [player for i, player in enumerate(players) if i in team_one_indexes]
+        team_two = [player for i, player in enumerate(players) if i not in team_one_indexes]
+        return team_one, team_two
+
+
+    def cost(self, team_one: list, team_two: list) -> float:
+        """
+        Gets how unbalanced two teams are: their SR difference plus role_weight for each player by
+        which they differ in a role. Players without an SR count as the average SR of those with one.
+
+        Args:
+            team_one (list): The Rated_Player objects in the first team.
+            team_two (list): The Rated_Player objects in the second team.
+
+        Returns:
+            float
+        """
+        known_srs = [player.sr for player in team_one + team_two if player.sr is not None]
+        default_sr = round(sum(known_srs) / len(known_srs)) if known_srs else DEFAULT_SR
+        sr_difference = sum(player.sr if player.sr is not None else default_sr for player in team_one)
+        sr_difference -= sum(player.sr if player.sr is not None else default_sr for player in team_two)
+        role_difference = sum(abs(sum(role_vector(player.role)[i] for player in team_one)
+                                  - sum(role_vector(player.role)[i] for player in team_two))
+                              for i in range(len(ROLES)))
+        return abs(sr_difference) + self.role_weight * role_difference
+
+
+    def __split_exact(self, srs: list, roles: list) -> set:
+        """
+        Private function. Finds the best first team with a meet-in-the-middle search.
+        Called in balance.
+
+        Returns:
+            team_one_indexes (set): The indexes of the players in the first team.
+        """
+        player_count = len(srs)
+        team_size = player_count // 2
+        total_sr = sum(srs)
+        total_roles = sum_roles(roles)
+        middle = player_count // 2
+        # List every subset of the second half once, grouped by size then roles, sorted by SR.
+        second_half_groups = {}
+        for size in range(0, min(team_size, player_count - middle) + 1):
+            groups = second_half_groups[size] = {}
+            for subset in combinations(range(middle, player_count), size):
+                subset_roles = sum_roles([roles[i] for i in subset])
+                groups.setdefault(subset_roles, []).append((sum(srs[i] for i in subset), subset))
+            for subset_roles, group in groups.items():
+                group.sort()
+                groups[subset_roles] = ([subset_sr for subset_sr, _ in group], [subset for _, subset in group])
+
+        best_cost, best_team = None, None
+        for size in range(max(0, team_size - (player_count - middle)), min(team_size, middle) + 1):
+            for subset in combinations(range(middle), size):
+                subset_sr = sum(srs[i] for i in subset)
+                subset_roles = sum_roles([roles[i] for i in subset])
+                for other_roles, (sums, subsets) in second_half_groups[team_size - size].items():
+                    role_difference = sum(abs(2 * (subset_roles[r] + other_roles[r]) - total_roles[r])
+                                          for r in range(len(ROLES)))
+                    role_cost = self.role_weight * role_difference
+                    if best_cost is not None and role_cost >= best_cost:
+                        continue
+                    # The team's SR should be as close to half the total as possible.
+                    position = bisect_left(sums, total_sr / 2 - subset_sr)
+                    for j in (position - 1, position):
+                        if 0 <= j < len(sums):
+                            cost = abs(2 * (subset_sr + sums[j]) - total_sr) + role_cost
+                            if best_cost is None or cost < best_cost:
+                                best_cost, best_team = cost, set(subset) | set(subsets[j])
+        return best_team
+
+
+    def __split_heuristic(self, srs: list, roles: list) -> set:
+        """
+        Private function. Splits the players greedily by SR, then swaps pairs of players between the
+        teams while that makes them more balanced. Called in balance.
+
+        Returns:
+            team_one_indexes (set): The indexes of the players in the first team.
+        """
+        player_count = len(srs)
+        team_size = player_count // 2
+        team_one, team_two = set(), set()
+        team_one_sr = team_two_sr = 0
+        # Give each player, strongest first, to the weaker team that still has room.
+        for i in sorted(range(player_count), key=lambda i: -srs[i]):
+            if len(team_one) < team_size and (team_one_sr <= team_two_sr or len(team_two) == player_count - team_size):
+                team_one.add(i)
+                team_one_sr += srs[i]
+            else:
+                team_two.add(i)
+                team_two_sr += srs[i]
+
+        total_sr = sum(srs)
+        total_roles = sum_roles(roles)
+
+        def split_cost(team_sr, team_roles):
+            return abs(2 * team_sr - total_sr) + self.role_weight * sum(
+                abs(2 * team_roles[r] - total_roles[r]) for r in range(len(ROLES)))
+
+        team_roles = list(sum_roles([roles[i] for i in team_one]))
+        cost = split_cost(team_one_sr, team_roles)
+        improved = True
+        while improved:
+            improved = False
+            best_swap = None
+            for i in team_one:
+                for j in team_two:
+                    swapped_roles = [team_roles[r] - roles[i][r] + roles[j][r] for r in range(len(ROLES))]
+                    swapped_cost = split_cost(team_one_sr - srs[i] + srs[j], swapped_roles)
+                    if swapped_cost < cost and (best_swap is None or swapped_cost < best_swap[0]):
+                        best_swap = (swapped_cost, i, j, swapped_roles)
+            if best_swap is not None:
+                cost, i, j, team_roles = best_swap
+                team_one.remove(i)
+                team_two.remove(j)
+                team_one.add(j)
+                team_two.add(i)
+                team_one_sr += srs[j] - srs[i]
+                improved = True
+        return team_one
+
+
+
+def sum_roles(roles: list) -> tuple:
+    """
+    Adds up role vectors, giving the count of players in each of ROLES.
+    """
+    return tuple(sum(role[r] for role in roles) for r in range(len(ROLES)))
+
+
+def role_vector(role: str) -> tuple:
+    """
+    Gets a player's role as a count of players in each of ROLES, all zero if the role is unknown.
+    """
+    return tuple(int(role == name) for name in ROLES)
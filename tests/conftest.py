@@ -1,6 +1,14 @@
+import importlib
+import os
+import sys
 import pytest
 
+# The bot's modules import each other by name, as they are run from inside bot_code.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot_code"))
+
 from bot_code.overwatch_queue import Player, Overwatch_Queue
+from bot_code.patch_scraper import Overwatch_Patch_Scraper
+from patch_site import Fake_Patch_Site
 
 
 # Create a fixture of five players
@@ -43,3 +51,32 @@ def ten_players():
 def ten_player_queue(ten_players):
     ten_player_queue_obj = Overwatch_Queue(ten_players)
     return ten_player_queue_obj
+
+
+# Create a fixture of a local stand-in for the patch notes site
+@pytest.fixture
+def patch_site():
+    patch_site_obj = Fake_Patch_Site().start()
+    yield patch_site_obj
+    patch_site_obj.stop()
+
+
+# Create a fixture of a patch scraper pointed at the local patch notes site
+@pytest.fixture
+def patch_scraper(patch_site, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    patch_scraper_obj = Overwatch_Patch_Scraper(live_patches_url=patch_site.url("/live"),
+                                                experimental_patches_url=patch_site.url("/experimental"))
+    return patch_scraper_obj
+
+
+# Create a fixture of a function creating the bot, which must be called in a running event loop
+@pytest.fixture
+def create_test_bot(patch_scraper):
+    discord_bot = importlib.import_module("discord_bot")
+
+    def create_test_bot_obj():
+        bot = discord_bot.create_bot(scraper=patch_scraper)
+        bot.status_debounce = 0.01
+        return bot
+    return create_test_bot_obj
@@ -0,0 +1,157 @@
+"""
+Minimal stand-ins for the Discord objects the bot uses, recording what the bot sends.
+
+Used by tests to drive the bot's commands and status messages without connecting to Discord.
+"""
+
+# Standard library imports
+import asyncio
+import itertools
+
+# Third party imports
+import discord
+from discord.ext import commands
+
+
+ids = itertools.count(1000)
+
+
+class Fake_Message():
+    """
+    A sent message that records edits and pins.
+    """
+
+    def __init__(self, channel, content: str):
+        self.id = next(ids)
+        self.channel = channel
+        self.content = content
+        self.pinned = False
+        self.deleted = False
+        self.edits = []
+
+
+    async def edit(self, content: str):
+        if self.deleted:
+            raise not_found_error()
+        self.content = content
+        self.edits.append(content)
+
+
+    async def pin(self):
+        self.pinned = True
+
+
+    async def unpin(self):
+        self.pinned = False
+
+
+
+class Fake_Channel():
+    """
+    A text channel that records the messages sent to it, taking latency seconds to send each one.
+    """
+
+    def __init__(self, channel_id: int = None, guild=None, latency: float = 0):
+        self.id = channel_id if channel_id is not None else next(ids)
+        self.guild = guild
+        self.latency = latency
+        self.sent = []
+
+
+    async def send(self, content: str):
+        # Always yield to the event loop, as a real send would.
+        await asyncio.sleep(self.latency)
+        message = Fake_Message(self, content)
+        self.sent.append(message)
+        return message
+
+
+    def permissions_for(self, member: "Fake_Author") -> discord.Permissions:
+        return discord.Permissions.all() if member.administrator else discord.Permissions.none()
+
+
+
+class Fake_Guild():
+    """
+    A guild (server), identified by its id.
+    """
+
+    def __init__(self, guild_id: int = None):
+        self.id = guild_id if guild_id is not None else next(ids)
+
+
+
+class Fake_Author():
+    """
+    The author of a command message.
+    """
+
+    def __init__(self, name: str, author_id: int = None, administrator: bool = False):
+        self.name = name
+        self.id = author_id if author_id is not None else next(ids)
+        self.display_name = name
+        self.mention = f"<@{self.id}>"
+        self.bot = False
+        self.administrator = administrator
+
+
+
+class Fake_Command_Message():
+    """
+    The message a command was invoked with.
+    """
+
+    def __init__(self, author: Fake_Author, channel: Fake_Channel, content: str):
+        self.id = next(ids)
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.mentions = []
+        self._state = None
+
+
+
+class Fake_Context(commands.Context):
+    """
+    A real command context, except that replies go to the fake channel rather than Discord.
+    """
+
+    async def send(self, content: str = None, **kwargs):
+        return await self.channel.send(content)
+
+
+
+async def invoke_command(bot: commands.Bot, author: Fake_Author, channel: Fake_Channel,
+                         content: str) -> Fake_Context:
+    """
+    Invokes a command on the bot as if author had sent content in channel, running the bot's
+    argument parsing, checks, hooks and error handlers.
+
+    Args:
+        bot (commands.Bot): The bot to invoke the command on.
+        author (Fake_Author): The author of the command message.
+        channel (Fake_Channel): The channel the command message was sent in.
+        content (str): The command message, e.g. '!join'.
+
+    Returns:
+        ctx (Fake_Context): The context the command was invoked with.
+    """
+    if bot.user is None:
+        bot._connection.user = Fake_Author("bot")
+    message = Fake_Command_Message(author, channel, content)
+    ctx = await bot.get_context(message, cls=Fake_Context)
+    await bot.invoke(ctx)
+    return ctx
+
+
+
+def not_found_error() -> discord.NotFound:
+    """
+    Returns a discord.NotFound error, as raised when editing a deleted message.
+    """
+    class Response():
+        status = 404
+        reason = "Not Found"
+
+    return discord.NotFound(Response(), "Unknown Message")
@@ -0,0 +1,157 @@
+"""
+A stand-in for the Discord gateway that runs each shard of the bot in its own process.
+
+Commands are routed to the shard Discord would send them to, and run there with fake Discord
+contexts. The shard processes share a working directory, so they share one database just as
+shards running on the same host do.
+"""
+
+# Standard library imports
+import asyncio
+import multiprocessing
+import os
+
+# Local imports
+from bot_code.sharding import shard_for_guild
+
+
+# How long to wait for a shard to start or reply, in seconds.
+REPLY_TIMEOUT = 30
+
+
+class Fake_Gateway():
+    """
+    Runs shard_count shard processes and routes commands to them by guild.
+
+    Attributes:
+        shard_count (int): The number of shards.
+        workdir (str): The working directory shared by the shard processes.
+        patch_site_url (str): The base url of the fake patch notes site the shards' scrapers use.
+        leader_lease_ttl (float): How long, in seconds, each shard's patch polling lease lasts.
+    """
+
+    def __init__(self, shard_count: int, workdir: str, patch_site_url: str, leader_lease_ttl: float = 180):
+        self.shard_count = shard_count
+        self.workdir = workdir
+        self.patch_site_url = patch_site_url
+        self.leader_lease_ttl = leader_lease_ttl
+        self.context = multiprocessing.get_context("spawn")
+        self.shards = {}
+
+
+    def start(self):
+        for shard_id in range(self.shard_count):
+            self.start_shard(shard_id)
+        return self
+
+
+    def start_shard(self, shard_id: int):
+        """
+        Starts a process for the shard, waiting until its bot is ready for commands.
+        """
+        requests, replies = self.context.Queue(), self.context.Queue()
+        process = self.context.Process(target=run_shard_worker,
+                                       args=(shard_id, self.shard_count, self.workdir, self.patch_site_url,
+                                             self.leader_lease_ttl, requests, replies),
+                                       daemon=True)
+        process.start()
+        self.shards[shard_id] = (process, requests, replies)
+        assert replies.get(timeout=REPLY_TIMEOUT) == "ready"
+
+
+    def stop_shard(self, shard_id: int, crash: bool = False):
+        """
+        Stops the shard's process, closing its bot first unless crash is True.
+        """
+        process, requests, replies = self.shards.pop(shard_id)
+        if crash:
+            process.kill()
+        else:
+            requests.put(None)
+        process.join(timeout=REPLY_TIMEOUT)
+
+
+    def restart_shard(self, shard_id: int):
+        self.stop_shard(shard_id)
+        self.start_shard(shard_id)
+
+
+    def stop(self):
+        for shard_id in list(self.shards):
+            self.stop_shard(shard_id)
+
+
+    def send(self, guild_id: int, author: str, content: str) -> tuple:
+        """
+        Sends a command to the shard that handles the guild.
+
+        Args:
+            guild_id (int): The guild the command was sent in.
+            author (str): The name of the command's author.
+            content (str): The command message, e.g. '!join'.
+
+        Returns:
+            shard_id (int): The shard that ran the command.
+            replies (list): The bot's replies to the command.
+        """
+        return self.request(shard_for_guild(guild_id, self.shard_count), ("command", guild_id, author, content))
+
+
+    def poll_leadership(self, shard_id: int) -> bool:
+        """
+        Has the shard take or renew the patch polling lease, as its leadership loop does.
+
+        Returns:
+            bool: Whether the shard is now the patch poller.
+        """
+        return self.request(shard_id, ("leadership", ))[1]
+
+
+    def request(self, shard_id: int, request: tuple) -> tuple:
+        process, requests, replies = self.shards[shard_id]
+        requests.put(request)
+        return replies.get(timeout=REPLY_TIMEOUT)
+
+
+
+def run_shard_worker(shard_id: int, shard_count: int, workdir: str, patch_site_url: str,
+                     leader_lease_ttl: float, requests, replies):
+    """
+    Runs one shard's bot, answering requests from the gateway until it sends None.
+    Called in each shard's process.
+    """
+    os.chdir(workdir)
+    asyncio.run(serve_shard(shard_id, shard_count, patch_site_url, leader_lease_ttl, requests, replies))
+
+
+async def serve_shard(shard_id: int, shard_count: int, patch_site_url: str, leader_lease_ttl: float,
+                      requests, replies):
+    # Imported here, once in the shared working directory, as discord_bot opens the database on import.
+    from bot_code.patch_scraper import Overwatch_Patch_Scraper
+    from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+    import discord_bot
+
+    scraper = Overwatch_Patch_Scraper(live_patches_url=patch_site_url + "/live",
+                                      experimental_patches_url=patch_site_url + "/experimental")
+    bot = discord_bot.create_bot(scraper=scraper, shard_id=shard_id, shard_count=shard_count)
+    bot.leader_lease_ttl = leader_lease_ttl
+    # Never post status messages, so each command's replies are only what it sent itself.
+    bot.status_debounce = REPLY_TIMEOUT
+    channels = {}
+    loop = asyncio.get_running_loop()
+    replies.put("ready")
+    while True:
+        request = await loop.run_in_executor(None, requests.get)
+        if request is None:
+            break
+        if request[0] == "leadership":
+            replies.put((shard_id, await bot.renew_leadership()))
+            continue
+        _, guild_id, author, content = request
+        if guild_id not in channels:
+            channels[guild_id] = Fake_Channel(guild=Fake_Guild(guild_id))
+        channel = channels[guild_id]
+        sent_before = len(channel.sent)
+        await invoke_command(bot, Fake_Author(author), channel, content)
+        replies.put((shard_id, [message.content for message in channel.sent[sent_before:]]))
+    await bot.close()
@@ -0,0 +1,112 @@
+"""
+A local stand-in for the Overwatch patch notes site, serving saved patch pages.
+
+Used by the patch scraper tests and benchmarks so that neither needs the live site.
+"""
+
+# Standard library imports
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+PATCH_PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "patch_pages")
+
+
+class Fake_Patch_Site():
+    """
+    A threaded HTTP server that serves saved patch pages from PATCH_PAGES_DIR.
+
+    Attributes:
+        routes (dict): A mapping of url path (e.g. '/live') to the saved page filename served there.
+        request_count (int): The number of requests the site has served.
+    """
+
+    def __init__(self, routes: dict = None, pages_dir: str = PATCH_PAGES_DIR):
+        """
+        Initialise the site, without starting it.
+
+        Args:
+            routes (dict): A mapping of url path to saved page filename.
+            pages_dir (str): The directory holding the saved pages.
+        """
+        self.routes = routes if routes is not None else {"/live": "generic.html",
+                                                         "/experimental": "generic.html"}
+        self.pages_dir = pages_dir
+        self.request_count = 0
+        self.__server = None
+        self.__thread = None
+        self.__lock = threading.Lock()
+
+
+    def start(self):
+        """
+        Starts serving on a free local port in a background thread.
+
+        Returns:
+            self (Fake_Patch_Site): The started site.
+        """
+        site = self
+        lock = self.__lock
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with lock:
+                    site.request_count += 1
+                page = site.routes.get(self.path)
+                if page is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                with open(os.path.join(site.pages_dir, page), "rb") as f:
+                    body = f.read()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.__thread = threading.Thread(target=self.__server.serve_forever, kwargs={"poll_interval": 0.05},
+                                         daemon=True)
+        self.__thread.start()
+        return self
+
+
+    def stop(self):
+        """
+        Stops the server and waits for its thread to finish.
+        """
+        if self.__server:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__thread.join()
+            self.__server = None
+
+
+    def url(self, path: str) -> str:
+        """
+        Gets the full url of a path on the site.
+
+        Args:
+            path (str): The path, e.g. '/live'.
+
+        Returns:
+            url (str): The full url.
+        """
+        host, port = self.__server.server_address
+        return f"http://{host}:{port}{path}"
+
+
+    def set_page(self, path: str, page: str):
+        """
+        Changes which saved page is served at a path, e.g. to simulate a new patch being released.
+
+        Args:
+            path (str): The path, e.g. '/live'.
+            page (str): The saved page filename.
+        """
+        self.routes[path] = page
@@ -0,0 +1,158 @@
+"""
+Tests for fetching many players' profiles at once with Profile_Fetcher, using a stand-in for the
+slow profile scrape.
+"""
+import asyncio
+import importlib
+import threading
+import time
+
+from bot_code.battlenet_interface import Profile_Fetcher
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+
+
+class Fake_Profile():
+    def __init__(self, battletag, modes):
+        self.battletag = battletag
+        self._modes = modes
+
+    def modes(self):
+        return self._modes
+
+
+class Slow_Profile_Loader():
+    """
+    Loads fake profiles after a delay per battletag, recording how many load at once.
+    """
+
+    def __init__(self, delays, default_delay=0.05):
+        self.delays = delays
+        self.default_delay = default_delay
+        self.calls = []
+        self.running = 0
+        self.most_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, battletag):
+        with self.lock:
+            self.calls.append(battletag)
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        try:
+            delay = self.delays.get(battletag, self.default_delay)
+            if delay is None:
+                raise ValueError("profile not found")
+            time.sleep(delay)
+            # Private profiles show no game modes.
+            return Fake_Profile(battletag, [] if battletag.startswith("Private") else ["quickplay"])
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def test_fetches_concurrently_up_to_cap():
+    loader = Slow_Profile_Loader({})
+    fetcher = Profile_Fetcher(concurrency=3, timeout=5, load_profile=loader)
+    battletags = [f"Player{i}#1234" for i in range(9)]
+    start = time.perf_counter()
+    profiles, errors = asyncio.run(fetcher.fetch_profiles(battletags))
+    elapsed = time.perf_counter() - start
+    assert sorted(profiles) == sorted(battletags) and not errors
+    assert loader.most_running == 3
+    # Nine 50 ms scrapes three at a time take about 150 ms, rather than 450 ms one by one.
+    assert elapsed < 0.4
+
+
+def test_partial_results_on_timeout_and_error():
+    loader = Slow_Profile_Loader({"Slow#1234": 0.5, "Missing#1234": None})
+    fetcher = Profile_Fetcher(concurrency=4, timeout=0.2, load_profile=loader)
+
+    async def run():
+        profiles, errors = await fetcher.fetch_profiles(["Fast#1234", "Slow#1234", "Missing#1234"])
+        # The slow scrape still finishes in its thread, and is cached for next time.
+        await asyncio.sleep(0.4)
+        return profiles, errors
+
+    profiles, errors = asyncio.run(run())
+    assert list(profiles) == ["Fast#1234"]
+    assert errors == {"Slow#1234": "timed out", "Missing#1234": "ValueError: profile not found"}
+    profiles, errors = asyncio.run(fetcher.fetch_profiles(["Slow#1234"]))
+    assert list(profiles) == ["Slow#1234"] and not errors
+    assert loader.calls.count("Slow#1234") == 1
+
+
+def test_waiting_for_a_slot_counts_towards_timeout():
+    loader = Slow_Profile_Loader({"Stuck1#1234": 3, "Stuck2#1234": 3})
+    fetcher = Profile_Fetcher(concurrency=2, timeout=0.5, load_profile=loader)
+    start = time.perf_counter()
+    profiles, errors = asyncio.run(fetcher.fetch_profiles(["Stuck1#1234", "Stuck2#1234", "Fast1#1234", "Fast2#1234"]))
+    elapsed = time.perf_counter() - start
+    # Both slots are held by scrapes that outlast the timeout, so the fast profiles never got one.
+    assert not profiles
+    assert errors == {battletag: "timed out" for battletag in ("Stuck1#1234", "Stuck2#1234", "Fast1#1234", "Fast2#1234")}
+    assert loader.calls == ["Stuck1#1234", "Stuck2#1234"]
+    assert elapsed < 1
+
+
+def test_cache_and_shared_fetches():
+    loader = Slow_Profile_Loader({})
+    fetcher = Profile_Fetcher(concurrency=2, timeout=5, cache_ttl=0.3, load_profile=loader)
+
+    async def run():
+        # Asking for the same profile while it is being fetched shares the one fetch.
+        first, second = await asyncio.gather(fetcher.fetch_profile("A#1234"), fetcher.fetch_profile("A#1234"))
+        assert first is second
+        assert await fetcher.fetch_profile("A#1234") is first
+        await asyncio.sleep(0.35)
+        assert await fetcher.fetch_profile("A#1234") is not first
+
+    asyncio.run(run())
+    assert loader.calls == ["A#1234", "A#1234"]
+
+
+def test_profiles_command(create_test_bot):
+    discord_bot = importlib.import_module("discord_bot")
+    loader = Slow_Profile_Loader({"Slow#2000": 1})
+
+    async def run():
+        bot = create_test_bot()
+        bot.profile_fetcher = Profile_Fetcher(timeout=0.2, load_profile=loader)
+        channel = Fake_Channel(guild=Fake_Guild())
+        names = [f"profiles{channel.guild.id}-{i}" for i in range(4)]
+        for name, battletag in zip(names, ("Public#2000", "Slow#2000", None, "Private#2000")):
+            if battletag:
+                await discord_bot.db.upsert_player(name, battletag)
+            await invoke_command(bot, Fake_Author(name), channel, "!join")
+        await invoke_command(bot, Fake_Author(names[0]), channel, "!profiles")
+        return names, channel.sent[-1].content
+
+    names, reply = asyncio.run(run())
+    lines = reply.split("\n")
+    assert lines[1] == f"\t{names[0]}: public"
+    assert lines[2] == f"\t{names[1]}: timed out"
+    assert lines[3] == f"\t{names[2]}: no linked battle net account"
+    assert lines[4] == f"\t{names[3]}: private"
+    assert lines[5].startswith("Type '!link'")
+
+
+def test_link_command_looks_up_profile_through_fetcher(create_test_bot):
+    discord_bot = importlib.import_module("discord_bot")
+    loader = Slow_Profile_Loader({"Slow#2001": 1})
+
+    async def run():
+        bot = create_test_bot()
+        bot.profile_fetcher = Profile_Fetcher(timeout=0.2, load_profile=loader)
+        channel = Fake_Channel(guild=Fake_Guild())
+        author = Fake_Author(f"link{channel.id}")
+        for battletag in ("Private#2001", "Slow#2001", "nohash", "Public#2001"):
+            await invoke_command(bot, author, channel, f"!link {battletag}")
+        return [message.content for message in channel.sent], await discord_bot.db.get_battltag(author.name)
+
+    replies, battle_tag = asyncio.run(run())
+    assert replies[0].endswith("Could not find profile, ensure that it public.\n")
+    assert replies[1].endswith("Timed out looking up the profile, try again in a minute.\n")
+    assert replies[2].endswith("Incorrect battle tag format ensure you have include the # and the number following it.\n")
+    assert replies[3].endswith("is now linked to Public#2001")
+    assert battle_tag[0] == "Public#2001"
+    # Badly formatted battletags are never looked up.
+    assert "nohash" not in loader.calls
@@ -0,0 +1,44 @@
+"""
+Tests for the end-to-end load test of the bot in benchmarks/bench_bot_throughput.py.
+"""
+import asyncio
+import os
+import sys
+
+from bot_code.battlenet_interface import Profile_Fetcher
+from bot_code.dispatcher import Outbound_Dispatcher
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import bench_bot_throughput
+
+
+def test_generate_load_is_reproducible():
+    load = bench_bot_throughput.generate_load(500, guild_count=5, players_per_guild=4, seed=3)
+    assert load == bench_bot_throughput.generate_load(500, guild_count=5, players_per_guild=4, seed=3)
+    assert len({guild_id for guild_id, _, _, _ in load}) == 5
+    assert {content.split()[0] for _, _, _, content in load} == set(bench_bot_throughput.COMMAND_WEIGHTS)
+    assert all(content == f"!link Player{author_id - 1}#{999 + author_id}"
+               for _, author_id, _, content in load if content.startswith("!link"))
+
+
+def test_run_load(create_test_bot, patch_site):
+    load = bench_bot_throughput.generate_load(400, guild_count=8, players_per_guild=6, seed=1)
+
+    async def run():
+        bot = create_test_bot()
+        rate = bench_bot_throughput.UNLIMITED_RATE
+        bot.dispatcher = Outbound_Dispatcher(rate, rate, metrics=bot.metrics)
+        bot.profile_fetcher = Profile_Fetcher(load_profile=bench_bot_throughput.Stand_In_Profile_Loader(0.001))
+        patch_site.set_page("/live", "hero.html")
+        return await bench_bot_throughput.run_load(bot, load, rate=4000)
+
+    result = asyncio.run(run())
+    assert result["commands"] == 400 and result["command_errors"] == 0
+    assert set(result["by_command"]) == set(bench_bot_throughput.COMMAND_WEIGHTS)
+    assert sum(summary["count"] for summary in result["by_command"].values()) == 400
+    assert 0 < result["latency"]["p50_ms"] <= result["latency"]["p99_ms"] <= result["latency"]["max_ms"]
+    outbound = result["outbound"]
+    # Every command replies, and the channels that asked for patch notes by halfway get the new patch.
+    assert outbound["sent"]["reply"] >= 390 and outbound["sent"]["broadcast"] > 0
+    assert outbound["messages_sent"] >= outbound["sent"]["reply"] + outbound["sent"]["broadcast"]
+    assert outbound["throttled"] == 0
@@ -0,0 +1,105 @@
+"""
+Tests for recording the bot's queue commands, and replaying them offline with benchmarks/replay_commands.py.
+"""
+import asyncio
+import os
+import sys
+
+from bot_code.command_recorder import Command_Recorder, read_recording
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+import replay_commands
+
+
+def record_commands(create_test_bot, recording_dir, channel, commands):
+    async def run():
+        bot = create_test_bot()
+        bot.recorder = Command_Recorder(recording_dir)
+        for author, content in commands:
+            await invoke_command(bot, author, channel, content)
+        return replay_commands.guild_state(bot.guild_queues[channel.guild.id])
+    return asyncio.run(run())
+
+
+def test_records_starting_state_and_commands(create_test_bot, tmp_path):
+    channel = Fake_Channel(guild=Fake_Guild())
+    a, b = Fake_Author("a"), Fake_Author("b")
+    record_commands(create_test_bot, str(tmp_path / "first"), channel, [(a, "!join")])
+    record_commands(create_test_bot, str(tmp_path / "second"), channel,
+                    [(b, "!join"), (a, "!patchnotes"), (b, "!status me")])
+    state, commands = read_recording(str(tmp_path / "second" / f"{channel.guild.id}.jsonl"))
+    assert [player["name"] for player in state["queues"]["main"]["players"]] == ["a"]
+    assert [(command["author"], command["content"]) for command in commands] == [("b", "!join"), ("b", "!status me")]
+    assert commands[0]["author_id"] == b.id and commands[0]["channel_id"] == channel.id
+    assert commands[0]["settings"]["prefix"] == "!"
+
+
+def test_replay_reproduces_recorded_queue(create_test_bot, patch_scraper, tmp_path):
+    channel = Fake_Channel(guild=Fake_Guild())
+    authors = [Fake_Author(f"player{i}") for i in range(8)]
+    commands = ([(author, "!join") for author in authors] + [(authors[1], "!delay"), (authors[0], "!next"),
+                (authors[2], "!leave"), (authors[0], "!kick player3"), (authors[0], "!undo"),
+                (authors[1], "!rejoin"), (authors[0], "!game 1"), (authors[0], "!next")])
+    recorded_state = record_commands(create_test_bot, str(tmp_path), channel, commands)
+    streams = replay_commands.load_recordings([str(tmp_path)])
+    expected = {str(channel.guild.id): recorded_state}
+
+    _, queue_states = replay_commands.replay_through_queue(streams)
+    _, bot_states = asyncio.run(replay_commands.replay_through_bot(streams, patch_scraper))
+    assert replay_commands.diff_states(expected, queue_states) == []
+    assert replay_commands.diff_states(expected, bot_states) == []
+
+
+def test_replay_follows_named_queues_and_settings(create_test_bot, patch_scraper, tmp_path):
+    guild = Fake_Guild()
+    main_channel, ow1_channel = Fake_Channel(guild=guild), Fake_Channel(guild=guild)
+    admin = Fake_Author("admin", administrator=True)
+    authors = [Fake_Author(f"player{i}") for i in range(8)]
+    # Settings changed before recording, then used by the recorded commands.
+    commands = ([(admin, main_channel, "!settings swaps 1"), (admin, main_channel, "!settings prefix ow!"),
+                 (authors[0], ow1_channel, "ow!queue ow1")]
+                + [(author, main_channel, "ow!join") for author in authors]
+                + [(authors[7], ow1_channel, "ow!join"), (authors[0], main_channel, "ow!next"),
+                   (authors[7], main_channel, "ow!queues"), (authors[7], main_channel, "ow!leave all"),
+                   (authors[2], ow1_channel, "ow!queue ow1"), (authors[3], ow1_channel, "!join")])
+
+    async def run():
+        bot = create_test_bot()
+        bot.recorder = Command_Recorder(str(tmp_path))
+        for author, channel, content in commands:
+            await invoke_command(bot, author, channel, content)
+        return replay_commands.guild_state(bot.guild_queues[guild.id])
+
+    recorded_state = asyncio.run(run())
+    assert recorded_state["channel_queues"] == {str(ow1_channel.id): "ow1"}
+    assert [player["name"] for player in recorded_state["ow1.players"]] == ["player0", "player2"]
+    # Only one player is swapped out, as set for the guild.
+    assert recorded_state["main.games_completed"] == 1 and len(recorded_state["main.players"]) == 7
+    assert recorded_state["main.current_players"] == ["player1", "player2", "player3", "player4", "player5"]
+    streams = replay_commands.load_recordings([str(tmp_path)])
+    expected = {str(guild.id): recorded_state}
+
+    _, queue_states = replay_commands.replay_through_queue(streams)
+    _, bot_states = asyncio.run(replay_commands.replay_through_bot(streams, patch_scraper))
+    assert replay_commands.diff_states(expected, queue_states) == []
+    assert replay_commands.diff_states(expected, bot_states) == []
+
+
+def test_synthetic_streams_agree_between_engines(create_test_bot, patch_scraper):
+    streams = replay_commands.generate_commands(1500, guild_count=10, players_per_guild=12, seed=34)
+    assert streams == replay_commands.generate_commands(1500, guild_count=10, players_per_guild=12, seed=34)
+    queue_timings, queue_states = replay_commands.replay_through_queue(streams)
+    bot_timings, bot_states = asyncio.run(replay_commands.replay_through_bot(streams, patch_scraper,
+                                                                            parallel_guilds=True))
+    assert replay_commands.diff_states(queue_states, bot_states) == []
+    assert replay_commands.summarise_replay("bot", bot_timings)["commands"] == 1500
+    assert sum(len(samples) for samples in queue_timings.values()) == 1500
+
+
+def test_diff_states():
+    expected = {"1": {"players": ["a"], "player_cutoff": 5}, "2": {"players": []}}
+    actual = {"1": {"players": ["a", "b"], "player_cutoff": 5}, "3": {"players": []}}
+    assert replay_commands.diff_states(expected, actual) == ["1: players expected ['a'], got ['a', 'b']",
+                                                              "2: queue expected to exist",
+                                                              "3: queue expected not to exist"]
@@ -0,0 +1,213 @@
+"""
+Tests for the commands in discord_bot.py, invoked through the bot with fake Discord contexts.
+"""
+import asyncio
+import random
+
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+
+
+def assert_queue_consistent(queue):
+    player_ids = [id(player) for player in queue.players]
+    current_ids = {id(player) for player in queue.current_players}
+    waiting_ids = {id(player) for player in queue.waiting_players}
+    assert len(player_ids) == len(set(player_ids))
+    assert len({player.name for player in queue.players}) == len(player_ids)
+    assert len(current_ids) == len(queue.current_players)
+    assert len(waiting_ids) == len(queue.waiting_players)
+    assert not current_ids & waiting_ids
+    assert current_ids | waiting_ids == set(player_ids)
+    assert len(queue.current_players) <= queue.player_cutoff
+    assert all(player.playing and not player.delaying for player in queue.current_players)
+    assert not any(player.playing for player in queue.waiting_players)
+    assert {id(player) for player in queue.delayed_players} == {id(player) for player in queue.players
+                                                                if player.delaying}
+
+
+def test_join_and_status(create_test_bot):
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel(guild=Fake_Guild())
+        for name in ("a", "b"):
+            await invoke_command(bot, Fake_Author(name), channel, "!join")
+        await invoke_command(bot, Fake_Author("a"), channel, "!status")
+        return channel
+    channel = asyncio.run(run())
+    replies = [message.content for message in channel.sent]
+    assert replies[0].endswith("a has been added to the queue.")
+    assert replies[1] == "b has been added to the queue."
+    assert replies[2] == "The players in the next game are: \n\ta\n\tb"
+
+
+def test_guilds_have_separate_queues(create_test_bot):
+    async def run():
+        bot = create_test_bot()
+        first_channel, second_channel = Fake_Channel(guild=Fake_Guild()), Fake_Channel(guild=Fake_Guild())
+        await invoke_command(bot, Fake_Author("a"), first_channel, "!join")
+        await invoke_command(bot, Fake_Author("b"), second_channel, "!join")
+        return bot, first_channel, second_channel
+    bot, first_channel, second_channel = asyncio.run(run())
+    assert [player.name for player in bot.guild_queues[first_channel.guild.id].queue.players] == ["a"]
+    assert [player.name for player in bot.guild_queues[second_channel.guild.id].queue.players] == ["b"]
+
+
+def test_commands_serialised_per_guild_only(create_test_bot):
+    async def run():
+        bot = create_test_bot()
+        busy_channel, free_channel = Fake_Channel(guild=Fake_Guild()), Fake_Channel(guild=Fake_Guild())
+        await invoke_command(bot, Fake_Author("a"), busy_channel, "!join")
+        busy_queue = bot.guild_queues[busy_channel.guild.id]
+        async with busy_queue.lock:
+            blocked = asyncio.ensure_future(invoke_command(bot, Fake_Author("b"), busy_channel, "!join"))
+            await asyncio.wait_for(invoke_command(bot, Fake_Author("c"), free_channel, "!join"), timeout=1)
+            await asyncio.sleep(0.05)
+            assert not blocked.done()
+        await asyncio.wait_for(blocked, timeout=1)
+        return busy_queue
+    busy_queue = asyncio.run(run())
+    assert [player.name for player in busy_queue.queue.players] == ["a", "b"]
+
+
+def test_concurrent_commands_keep_queues_consistent(create_test_bot):
+    command_mix = (["!join"] * 4 + ["!leave", "!next", "!next", "!status", "!status me", "!wait", "!delay",
+                   "!rejoin", "!undo", "!queue", "!kick player3", "!add extra", "!end"])
+
+    async def run():
+        bot = create_test_bot()
+        channels = [Fake_Channel(guild=Fake_Guild(), latency=0.001) for _ in range(8)]
+        authors = [Fake_Author(f"player{i}") for i in range(30)]
+        rng = random.Random(32)
+        invocations = [invoke_command(bot, rng.choice(authors), rng.choice(channels), rng.choice(command_mix))
+                       for _ in range(3000)]
+        contexts = await asyncio.gather(*invocations)
+        # Let the debounced status messages catch up.
+        await asyncio.sleep(0.1)
+        return bot, channels, contexts
+    bot, channels, contexts = asyncio.run(run())
+
+    assert not any(ctx.command_failed for ctx in contexts)
+    assert len(bot.guild_queues) == len(channels)
+    for guild_queue in bot.guild_queues.values():
+        assert_queue_consistent(guild_queue.queue)
+    status_messages = sum(guild_queue.status_message.send_count for guild_queue in bot.guild_queues.values())
+    assert sum(len(channel.sent) for channel in channels) == len(contexts) + status_messages
+
+
+def test_idle_queues_evicted_and_rehydrated(create_test_bot):
+    async def run():
+        bot = create_test_bot()
+        idle_channel, busy_channel = Fake_Channel(guild=Fake_Guild()), Fake_Channel(guild=Fake_Guild())
+        for name in ("a", "b", "c"):
+            await invoke_command(bot, Fake_Author(name), idle_channel, "!join")
+        await invoke_command(bot, Fake_Author("a"), idle_channel, "!next")
+        await invoke_command(bot, Fake_Author("d"), busy_channel, "!join")
+        idle_queue = bot.guild_queues[idle_channel.guild.id]
+        await idle_queue.status_message.flush()
+        idle_queue.last_used -= bot.queue_idle_ttl
+        evicted = await bot.evict_idle_queues()
+        still_resident = list(bot.guild_queues)
+        await invoke_command(bot, Fake_Author("b"), idle_channel, "!status")
+        return bot, idle_channel, idle_queue, evicted, still_resident
+
+    bot, idle_channel, idle_queue, evicted, still_resident = asyncio.run(run())
+    assert evicted == 1
+    assert idle_channel.guild.id not in still_resident and len(still_resident) == 1
+    assert idle_queue.status_message.message is None
+    assert bot.guild_queues[idle_channel.guild.id] is not idle_queue
+    assert idle_channel.sent[-1].content == "The players in the next game are: \n\ta\n\tb\n\tc"
+    assert bot.metrics.gauges["guild_queues"] == 1 and bot.metrics.gauges["guild_queues_evicted"] == 1
+    assert bot.metrics.gauges["resident_memory_bytes"] > 0
+
+
+def test_queue_used_during_eviction_is_kept(create_test_bot):
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel(guild=Fake_Guild())
+        await invoke_command(bot, Fake_Author("a"), channel, "!join")
+        guild_queue = bot.guild_queues[channel.guild.id]
+        await guild_queue.status_message.flush()
+        guild_queue.last_used -= bot.queue_idle_ttl
+        status_message = guild_queue.status_message.message
+        save_guild_queue = bot.save_guild_queue
+
+        async def slow_save(saved_queue):
+            await asyncio.sleep(0.05)
+            await save_guild_queue(saved_queue)
+        bot.save_guild_queue = slow_save
+        # The join arrives, and waits for the lock, while the sweeper is saving the queue.
+        evicted, _ = await asyncio.gather(bot.evict_idle_queues(),
+                                          invoke_command(bot, Fake_Author("b"), channel, "!join"))
+        await guild_queue.status_message.flush()
+        return bot, channel, guild_queue, evicted, status_message
+
+    bot, channel, guild_queue, evicted, status_message = asyncio.run(run())
+    assert evicted == 0
+    assert bot.guild_queues[channel.guild.id] is guild_queue
+    assert [player.name for player in guild_queue.queue.players] == ["a", "b"]
+    # The kept queue's status message was never closed, so it is still pinned and edited in place.
+    assert guild_queue.status_message.message is status_message and status_message.pinned
+    assert [message for message in channel.sent if message.pinned] == [status_message]
+    assert "b" in status_message.content
+
+
+def test_queue_used_while_evicted_status_message_closes(create_test_bot):
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel(guild=Fake_Guild())
+        await invoke_command(bot, Fake_Author("a"), channel, "!join")
+        guild_queue = bot.guild_queues[channel.guild.id]
+        await guild_queue.status_message.flush()
+        guild_queue.last_used -= bot.queue_idle_ttl
+
+        async def slow_unpin():
+            await asyncio.sleep(0.05)
+        guild_queue.status_message.message.unpin = slow_unpin
+        # The join arrives while the sweeper is unpinning the evicted queue's status message.
+        evicted, _ = await asyncio.gather(bot.evict_idle_queues(),
+                                          invoke_command(bot, Fake_Author("b"), channel, "!join"))
+        return bot, channel, guild_queue, evicted
+
+    bot, channel, guild_queue, evicted = asyncio.run(run())
+    assert evicted == 1
+    # The join loaded the saved queue rather than changing the evicted one.
+    assert bot.guild_queues[channel.guild.id] is not guild_queue
+    assert [player.name for player in bot.guild_queues[channel.guild.id].queue.players] == ["a", "b"]
+    assert [player.name for player in guild_queue.queue.players] == ["a"]
+
+
+def test_add_and_kick_several_players(create_test_bot):
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel(guild=Fake_Guild())
+        for command in ("!add a b c d e f", "!add f g", "!kick a g z", "!undo", "!kick"):
+            await invoke_command(bot, Fake_Author("a"), channel, command)
+        return bot.guild_queues[channel.guild.id].queue, [message.content for message in channel.sent]
+
+    queue, replies = asyncio.run(run())
+    assert replies[0] == ("Overwatch queue has been created. Type '!join' to be added to the queue.\n"
+                          "a, b, c, d, e and f have been added to the queue.")
+    assert replies[1] == "g has been added to the queue.\nf is already in the queue."
+    assert replies[2] == "a and g have been removed from the queue.\nz is not a player in the queue."
+    assert replies[4] == "Type '!kick ' followed by the Discord names of the players to remove them."
+    assert [player.name for player in queue.players] == ["a", "b", "c", "d", "e", "f", "g"]
+
+
+def test_patches_posted_to_each_feeds_channels(create_test_bot, patch_site):
+    async def run():
+        bot = create_test_bot()
+        live_channel, experimental_channel = Fake_Channel(), Fake_Channel()
+        bot.get_channel = {live_channel.id: live_channel, experimental_channel.id: experimental_channel}.get
+        await invoke_command(bot, Fake_Author("a"), live_channel, "!patchnotes")
+        await invoke_command(bot, Fake_Author("a"), experimental_channel, "!patchnotes Experimental")
+        await invoke_command(bot, Fake_Author("a"), experimental_channel, "!patchnotes ptr")
+        patch_site.set_page("/experimental", "hero.html")
+        posted_count = await bot.post_new_patches()
+        return posted_count, live_channel, experimental_channel
+
+    posted_count, live_channel, experimental_channel = asyncio.run(run())
+    assert posted_count == 2
+    assert [message.content for message in live_channel.sent] == ["This channel will now have live patches posted here."]
+    replies = [message.content for message in experimental_channel.sent]
+    assert replies[:2] == ["This channel will now have experimental patches posted here.",
+                           "There are no ptr patch notes. Choose from: live, experimental."]
+    assert len(replies) == 4 and replies[3].startswith("__**")
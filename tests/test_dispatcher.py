@@ -0,0 +1,120 @@
+"""
+Tests for sending outgoing requests by priority through Outbound_Dispatcher, and its token bucket.
+"""
+import asyncio
+
+import pytest
+
+from bot_code.dispatcher import Outbound_Dispatcher, Token_Bucket, REPLY, STATUS, BROADCAST
+from bot_code.metrics import Bot_Metrics
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+
+
+class Fake_Clock():
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_spaces_requests():
+    clock = Fake_Clock()
+    bucket = Token_Bucket(rate=2, capacity=2, clock=clock)
+    assert bucket.take() == 0 and bucket.take() == 0
+    assert bucket.take() == 0.5
+    clock.now += 0.25
+    assert bucket.take() == 0.25
+    clock.now += 10
+    assert bucket.take() == 0 and bucket.tokens == 1
+
+
+def test_replies_go_before_broadcasts():
+    async def run():
+        dispatcher = Outbound_Dispatcher(rate=50, burst=1)
+        sent = []
+
+        async def send(label):
+            sent.append(label)
+
+        broadcasts = [dispatcher.submit(channel_id, BROADCAST, lambda channel_id=channel_id: send(f"b{channel_id}"))
+                      for channel_id in range(5)]
+        statuses = [dispatcher.submit(10, STATUS, lambda: send("s"))]
+        replies = [dispatcher.submit(20, REPLY, lambda: send("r"))]
+        await asyncio.gather(*broadcasts, *statuses, *replies)
+        await dispatcher.close()
+        return sent, dispatcher
+
+    sent, dispatcher = asyncio.run(run())
+    # Everything is submitted before the worker first runs, so the broadcasts, submitted first, go last.
+    assert sent == ["r", "s", "b0", "b1", "b2", "b3", "b4"]
+    assert dispatcher.sent_count == {REPLY: 1, STATUS: 1, BROADCAST: 5}
+    assert dispatcher.throttled_count > 0
+
+
+def test_channel_requests_stay_in_order():
+    async def run():
+        dispatcher = Outbound_Dispatcher()
+        channel = Fake_Channel(latency=0.01)
+        await asyncio.gather(dispatcher.submit(channel.id, BROADCAST, lambda: channel.send("patch 1")),
+                             dispatcher.submit(channel.id, BROADCAST, lambda: channel.send("patch 2")),
+                             dispatcher.submit(channel.id, REPLY, lambda: channel.send("reply")))
+        await dispatcher.close()
+        return channel
+
+    channel = asyncio.run(run())
+    assert [message.content for message in channel.sent] == ["patch 1", "patch 2", "reply"]
+
+
+def test_errors_reach_caller_and_backlog_is_recorded():
+    async def run():
+        metrics = Bot_Metrics()
+        dispatcher = Outbound_Dispatcher(rate=100, burst=1, metrics=metrics)
+
+        async def fail():
+            raise RuntimeError("Discord is down")
+
+        async def succeed():
+            return "sent"
+
+        results = await asyncio.gather(dispatcher.submit(1, REPLY, fail),
+                                       *(dispatcher.submit(2, STATUS, succeed) for _ in range(3)),
+                                       return_exceptions=True)
+        await dispatcher.close()
+        return results, dispatcher, metrics
+
+    results, dispatcher, metrics = asyncio.run(run())
+    assert isinstance(results[0], RuntimeError) and results[1:] == ["sent"] * 3
+    assert dispatcher.pending[STATUS] == 0 and dispatcher.most_pending[STATUS] == 3
+    assert metrics.gauges["outbound_status_pending"] == 0
+    assert "outbound.status.wait" in metrics.to_prometheus()
+
+
+def test_close_cancels_waiting_requests():
+    async def run():
+        dispatcher = Outbound_Dispatcher(rate=1, burst=1)
+        channel = Fake_Channel()
+        first = asyncio.ensure_future(dispatcher.submit(channel.id, REPLY, lambda: channel.send("a")))
+        second = asyncio.ensure_future(dispatcher.submit(channel.id, REPLY, lambda: channel.send("b")))
+        await first
+        await dispatcher.close()
+        with pytest.raises(asyncio.CancelledError):
+            await second
+        return channel
+
+    channel = asyncio.run(run())
+    assert [message.content for message in channel.sent] == ["a"]
+
+
+def test_bot_sends_status_through_dispatcher(create_test_bot):
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel(guild=Fake_Guild())
+        await invoke_command(bot, Fake_Author("a"), channel, "!join")
+        await asyncio.sleep(0.1)
+        await bot.dispatcher.close()
+        return bot, channel
+
+    bot, channel = asyncio.run(run())
+    assert [message.content for message in channel.sent if message.pinned] == ["The players in the next game are: \n\ta"]
+    assert bot.dispatcher.sent_count[STATUS] == 2
@@ -0,0 +1,99 @@
+"""
+Tests for estimating game lengths with Game_Clock, and the waits shown by !wait and !status.
+"""
+import asyncio
+
+from bot_code.game_clock import Game_Clock, DEFAULT_GAME_SECONDS, format_eta
+from bot_code.overwatch_queue import Player, Overwatch_Queue
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+
+
+class Fake_Clock():
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def create_timed_queue(player_count):
+    clock = Fake_Clock()
+    queue = Overwatch_Queue(mode=2)
+    queue.game_clock = Game_Clock(clock=clock)
+    for i in range(player_count):
+        queue.add_player(Player(str(i)))
+    return queue, clock
+
+
+def test_estimate_is_weighted_average_of_games():
+    clock = Fake_Clock()
+    game_clock = Game_Clock(clock=clock)
+    assert game_clock.seconds_until(0) is None
+    game_clock.start_game()
+    assert game_clock.seconds_until(1) == 2 * DEFAULT_GAME_SECONDS
+    for length in (600, 1200):
+        clock.now += length
+        game_clock.start_game()
+    assert game_clock.estimate == 0.3 * 1200 + 0.7 * 600
+    # A mistaken second !next and a break between games are not counted.
+    clock.now += 10
+    game_clock.start_game()
+    clock.now += 5 * 60 * 60
+    game_clock.start_game()
+    assert game_clock.games_timed == 2 and game_clock.estimate == 780
+    clock.now += 180
+    assert game_clock.seconds_until(2) == 600 + 2 * 780
+
+
+def test_format_eta():
+    assert format_eta(20) == "any moment now"
+    assert format_eta(60) == "in about 1 minute"
+    assert format_eta(3900) == "in about 1 hour 5 minutes"
+    assert format_eta(7200) == "in about 2 hours"
+
+
+def test_wait_estimates():
+    queue, clock = create_timed_queue(8)
+    assert queue.print_wait_estimates() == ""
+    assert queue.print_player_wait(queue.find_player("7")) == "7 has to wait for 1 games after this one."
+    queue.update_queue()
+    clock.now += 600
+    queue.update_queue()
+    clock.now += 120
+    # Waiting is now 1, 2, 3: two players rotate in each game.
+    assert queue.print_player_wait(queue.find_player("3")) == ("3 has to wait for 1 games after this one. "
+                                                              "Their next game should start in about 18 minutes.")
+    assert queue.print_player_wait(queue.find_player("4")).endswith("This game should finish in about 8 minutes.")
+    assert queue.print_wait_estimates() == ("\n\nEstimated start of each waiting player's next game, with games "
+                                            "taking about 10 minutes:\n\t1: in about 8 minutes\n\t2: in about "
+                                            "8 minutes\n\t3: in about 18 minutes")
+    assert queue.print_wait_estimates(page=2, page_size=7) == (
+        "\n\nEstimated start of each waiting player's next game, with games taking about 10 minutes:"
+        "\n\t3: in about 18 minutes")
+
+
+def test_undo_next_restores_clock():
+    queue, clock = create_timed_queue(7)
+    queue.update_queue()
+    clock.now += 600
+    queue.update_queue()
+    queue.undo_command()
+    assert queue.game_clock.game_started == 1000 and queue.game_clock.estimate is None
+    restored = Overwatch_Queue.from_dict(queue.to_dict())
+    assert restored.game_clock.to_dict() == queue.game_clock.to_dict()
+
+
+def test_status_shows_estimates(create_test_bot):
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel(guild=Fake_Guild())
+        for name in ("a", "b", "c", "d", "e", "f", "g"):
+            await invoke_command(bot, Fake_Author(name), channel, "!join")
+        await invoke_command(bot, Fake_Author("a"), channel, "!next")
+        await invoke_command(bot, Fake_Author("a"), channel, "!status")
+        await invoke_command(bot, Fake_Author("a"), channel, "!wait")
+        return [message.content for message in channel.sent]
+
+    replies = asyncio.run(run())
+    assert replies[-2].endswith("taking about 15 minutes:\n\ta: in about 15 minutes\n\tb: in about 15 minutes")
+    assert replies[-1] == "a has to wait for 0 games after this one. Their next game should start in about 15 minutes."
@@ -0,0 +1,92 @@
+"""
+Tests for a guild's named queues in Guild_Queue, the index of each player's queues, and the
+commands using them.
+"""
+import asyncio
+
+from bot_code.guild_queue import Guild_Queue, DEFAULT_QUEUE_NAME
+from bot_code.overwatch_queue import Player
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+
+
+def test_index_follows_queue_changes():
+    guild_queue = Guild_Queue(1)
+    guild_queue.use_queue(10, "comp")
+    guild_queue.queues["comp"].add_player(Player("a"))
+    guild_queue.queues[DEFAULT_QUEUE_NAME].add_player(Player("a"))
+    guild_queue.queues[DEFAULT_QUEUE_NAME].add_player(Player("b"))
+    guild_queue.update_index()
+    assert guild_queue.get_player_queues("a") == ["comp", "main"]
+    assert guild_queue.get_player_queues("b") == ["main"]
+    main_queue = guild_queue.queues[DEFAULT_QUEUE_NAME]
+    main_queue.delete_player(main_queue.find_player("a"))
+    guild_queue.update_index()
+    assert guild_queue.get_player_queues("a") == ["comp"]
+    guild_queue.remove_queue("comp")
+    assert guild_queue.get_player_queues("a") == [] and "a" not in guild_queue.player_queues
+    assert guild_queue.get_channel_queue_name(10) == DEFAULT_QUEUE_NAME
+
+
+def test_save_and_load_named_queues():
+    guild_queue = Guild_Queue(1)
+    guild_queue.use_queue(10, "ow1", mode=1)
+    guild_queue.queue.add_player(Player("a"))
+    version = guild_queue.get_version()
+    restored = Guild_Queue.from_dict(1, guild_queue.to_dict())
+    assert restored.get_channel_queue_name(10) == "ow1"
+    assert restored.queues["ow1"].player_cutoff == 6
+    assert restored.get_player_queues("a") == ["ow1"]
+    guild_queue.remove_queue("ow1")
+    assert guild_queue.get_version() != version
+    # Queues saved before named queues load as the main queue.
+    old_state = restored.queues["ow1"].to_dict()
+    assert Guild_Queue.from_dict(1, old_state).get_player_queues("a") == ["main"]
+
+
+def test_live_status_fits_one_message():
+    guild_queue = Guild_Queue(1)
+    for number in range(8):
+        guild_queue.use_queue(10 + number, f"queue{number}")
+        guild_queue.queue.add_players([Player(f"player{number}-{index}".ljust(32, "x")) for index in range(20)])
+    status = guild_queue.get_live_status()
+    assert len(status) < 2000
+    assert status.startswith("**queue0** (Overwatch 2):")
+    # Queues that fit are shown in full, and the rest counted.
+    assert "player0-19" in status
+    shown_count = status.count("(Overwatch 2):")
+    assert 0 < shown_count < 8
+    assert status.endswith(f"{8 - shown_count} more queues are not shown. Type '!queues' to list every queue.")
+    assert len(guild_queue.get_live_status(max_length=100)) < 100
+
+
+def test_named_queue_commands(create_test_bot):
+    async def run():
+        bot = create_test_bot()
+        guild = Fake_Guild()
+        ow1_channel, ow2_channel = Fake_Channel(guild=guild), Fake_Channel(guild=guild)
+        await invoke_command(bot, Fake_Author("a"), ow1_channel, "!queue ow1")
+        await invoke_command(bot, Fake_Author("b"), ow1_channel, "!game 1")
+        await invoke_command(bot, Fake_Author("b"), ow1_channel, "!join")
+        await invoke_command(bot, Fake_Author("a"), ow2_channel, "!join")
+        await invoke_command(bot, Fake_Author("b"), ow2_channel, "!join")
+        await invoke_command(bot, Fake_Author("a"), ow2_channel, "!wait")
+        await invoke_command(bot, Fake_Author("b"), ow1_channel, "!queues")
+        await invoke_command(bot, Fake_Author("a"), ow1_channel, "!leave all")
+        await invoke_command(bot, Fake_Author("b"), ow1_channel, "!end")
+        await invoke_command(bot, Fake_Author("b"), ow1_channel, "!status")
+        return bot.guild_queues[guild.id], ow1_channel, ow2_channel
+
+    guild_queue, ow1_channel, ow2_channel = asyncio.run(run())
+    ow1_replies = [message.content for message in ow1_channel.sent if not message.pinned]
+    ow2_replies = [message.content for message in ow2_channel.sent if not message.pinned]
+    assert ow1_replies[0].startswith("This channel is now using the ow1 queue.\nQueue has been created for Overwatch 2.")
+    assert ow2_replies[2] == ("main: a is currently playing/queuing for a game. They have 0 games left after this one."
+                              "\now1: a is currently playing/queuing for a game. They have 0 games left after this one.")
+    assert ow1_replies[3] == ("The queues in this server are:\n\tmain: Overwatch 2, 2 players"
+                              "\n\tow1: Overwatch 1, 2 players (this channel)"
+                              "\nType '!queue ' followed by a name to use or create another queue in this channel.")
+    assert ow1_replies[4] == "a has been removed from the main, ow1 queues."
+    assert ow1_replies[5] == "The ow1 queue has been ended. This channel is now using the main queue."
+    assert ow1_replies[6] == "The players in the next game are: \n\tb"
+    assert list(guild_queue.queues) == ["main"]
+    assert guild_queue.get_player_queues("b") == ["main"]
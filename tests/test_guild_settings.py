@@ -0,0 +1,111 @@
+"""
+Tests for each guild's settings in Guild_Settings, cached and reloaded by version in Settings_Store,
+and the commands using them.
+"""
+import asyncio
+import importlib
+
+import pytest
+
+from bot_code.guild_settings import Guild_Settings, Settings_Store
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+
+
+def test_with_setting():
+    settings = Guild_Settings()
+    assert settings.to_dict() == {"prefix": "!", "mode": 2, "swaps": 3, "feeds": ["live"]}
+    changed = settings.with_setting("feeds", "Experimental live").with_setting("prefix", "ow!")
+    assert changed.to_dict() == {"prefix": "ow!", "mode": 2, "swaps": 3, "feeds": ["live", "experimental"]}
+    # The original is never changed, so cached copies can be read at any time.
+    assert settings.prefix == "!"
+    for name, value in (("prefix", ""), ("prefix", "a b"), ("prefix", "toolong"), ("mode", "3"), ("swaps", "0"),
+                        ("feeds", "ptr"), ("colour", "red")):
+        with pytest.raises(ValueError):
+            settings.with_setting(name, value)
+    assert Guild_Settings.from_dict({"mode": 1, "removed": True}).to_dict() == {"prefix": "!", "mode": 1, "swaps": 3,
+                                                                                  "feeds": ["live"]}
+
+
+def test_store_reloads_changes_from_other_processes(create_test_bot):
+    db = importlib.import_module("discord_bot").db
+    guild_id = Fake_Guild().id
+
+    async def run():
+        # Two stores on one database, as two shards have.
+        store, other_store = Settings_Store(db), Settings_Store(db)
+        await store.refresh()
+        await other_store.refresh()
+        settings = await store.update(guild_id, "prefix", "?")
+        version = store.version
+        before_refresh = other_store.get(guild_id).prefix
+        changed = await other_store.refresh()
+        unchanged = await other_store.refresh()
+        other_version = other_store.version
+        await other_store.update(guild_id, "swaps", "1")
+        await store.refresh()
+        return settings, version, before_refresh, changed, unchanged, other_version, other_store, store
+
+    settings, version, before_refresh, changed, unchanged, other_version, other_store, store = asyncio.run(run())
+    assert settings.prefix == "?" and store.get(guild_id).prefix == "?"
+    assert before_refresh == "!"
+    assert changed == [guild_id] and unchanged == []
+    assert other_store.get(guild_id).prefix == "?" and other_version == version
+    assert store.get(guild_id).to_dict() == {"prefix": "?", "mode": 2, "swaps": 1, "feeds": ["live"]}
+    assert store.version == other_store.version == version + 1
+    assert store.get(None) is store.defaults
+
+
+def test_settings_command(create_test_bot):
+    discord_db = importlib.import_module("discord_bot").db
+
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel(guild=Fake_Guild())
+        admin = Fake_Author("admin", administrator=True)
+        await invoke_command(bot, Fake_Author("a"), channel, "!settings mode 1")
+        # Command errors are handled in a task of their own.
+        await asyncio.sleep(0.01)
+        for content in ("!settings mode 1", "!settings swaps 1", "!settings feeds live experimental",
+                        "!settings prefix ?", "!join", "?settings mode 3", "?patchnotes", "?join", "?add b c d e f g h",
+                        "?next", "?settings"):
+            await invoke_command(bot, admin, channel, content)
+        queue = bot.guild_queues[channel.guild.id].queue
+        return ([message.content for message in channel.sent if not message.pinned], queue,
+                await discord_db.get_patch_channels("experimental"), channel)
+
+    replies, queue, experimental_channels, channel = asyncio.run(run())
+    assert "permissions" in replies[0]
+    assert replies[4].startswith("The prefix setting has been changed.") and "\tprefix: ? - " in replies[4]
+    # The old prefix no longer works, once changed.
+    assert replies[5] == "The mode must be 1 or 2, for Overwatch 1 or 2."
+    assert replies[6] == ("This channel will now have live patches posted here.\n"
+                          "This channel will now have experimental patches posted here.")
+    assert channel.id in experimental_channels
+    # Overwatch 1 queues have six current players, and only one is swapped out each game.
+    assert queue.player_cutoff == 6
+    assert [player.name for player in queue.current_players] == ["b", "c", "d", "e", "f", "g"]
+    assert [player.name for player in queue.waiting_players] == ["h", "admin"]
+    assert replies[-1].startswith("This server's settings are:\n\tprefix: ? - ")
+    assert "\tfeeds: live experimental - " in replies[-1]
+
+
+def test_messages_suggest_the_guild_prefix(create_test_bot):
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel(guild=Fake_Guild())
+        channel.guild.me = Fake_Author("bot")
+        admin = Fake_Author("admin", administrator=True)
+        for content in ("!settings prefix ow!", "ow!status", "ow!join", "ow!kick", "ow!help kick", "ow!help"):
+            await invoke_command(bot, admin, channel, content)
+        guild_queue = bot.guild_queues[channel.guild.id]
+        guild_queue.queue.empty_queue()
+        return [message.content for message in channel.sent if not message.pinned], guild_queue.get_live_status()
+
+    replies, live_status = asyncio.run(run())
+    assert replies[1] == "There is no queue. Type 'ow!queue' to create one."
+    assert replies[2].startswith("Queue has been created for Overwatch 2. Type 'ow!join' to be added to the queue.")
+    assert replies[3] == "Type 'ow!kick ' followed by the Discord names of the players to remove them."
+    assert "e.g. ow!kick a @b luc." in replies[4]
+    assert "{prefix}" not in replies[5] and "ow!help" in replies[5]
+    assert not any("'!" in reply for reply in replies[1:])
+    assert live_status == "There is no queue. Type 'ow!queue' to create one."
@@ -0,0 +1,95 @@
+"""
+Unit tests for metrics.py
+"""
+import pytest
+
+from bot_code.metrics import *
+
+
+def test_histogram_observe():
+    histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+    for value in (0.005, 0.01, 0.05, 2.0):
+        histogram.observe(value)
+    assert histogram.bucket_counts == [2, 1, 0, 1]
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.065)
+
+
+def test_histogram_quantile():
+    histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+    for value in [0.005] * 9 + [0.5]:
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == 0.01
+    assert histogram.quantile(1.0) == 1.0
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_observe_command_counts_by_guild_and_outcome():
+    metrics = Bot_Metrics()
+    metrics.observe_command("next", "1", 0.002, failed=False)
+    metrics.observe_command("next", "1", 0.003, failed=False)
+    metrics.observe_command("next", "2", 0.004, failed=True)
+    assert metrics.command_counts == {("next", "1", "success"): 2, ("next", "2", "error"): 1}
+    assert metrics.command_latency["next"].count == 3
+
+
+def test_time_operation_records_errors():
+    metrics = Bot_Metrics()
+    with metrics.time_operation("storage.upsert_player"):
+        pass
+    with pytest.raises(ValueError):
+        with metrics.time_operation("storage.upsert_player"):
+            raise ValueError
+    assert metrics.operation_latency["storage.upsert_player"].count == 2
+    assert metrics.operation_errors == {("storage.upsert_player", "ValueError"): 1}
+
+
+def test_to_prometheus():
+    metrics = Bot_Metrics(buckets=(0.01, 0.1))
+    metrics.observe_command("next", "1", 0.05, failed=False)
+    metrics.record_command_error("unknown", KeyError())
+    text = metrics.to_prometheus()
+    assert 'overwatch_bot_commands_total{command="next",guild="1",outcome="success"} 1' in text
+    assert 'overwatch_bot_command_errors_total{command="unknown",error="KeyError"} 1' in text
+    assert 'overwatch_bot_command_duration_seconds_bucket{command="next",le="0.01"} 0' in text
+    assert 'overwatch_bot_command_duration_seconds_bucket{command="next",le="0.1"} 1' in text
+    assert 'overwatch_bot_command_duration_seconds_bucket{command="next",le="+Inf"} 1' in text
+    assert 'overwatch_bot_command_duration_seconds_count{command="next"} 1' in text
+    assert text.endswith("\n")
+
+
+def test_format_labels_escapes_values():
+    assert format_labels(command='a"b\\c') == '{command="a\\"b\\\\c"}'
+
+
+def test_write_prometheus(tmp_path):
+    metrics = Bot_Metrics()
+    metrics.observe_operation("scraper.check_for_new_live_patch", 0.3)
+    fpath = str(tmp_path / "metrics.prom")
+    metrics.write_prometheus(fpath)
+    with open(fpath, "r") as f:
+        assert f.read() == metrics.to_prometheus()
+
+
+def test_summary():
+    metrics = Bot_Metrics()
+    metrics.observe_command("status", "1", 0.002, failed=False)
+    metrics.record_command_error("kick", IndexError())
+    message = metrics.summary()
+    assert "!status: 1 run, 0 failed" in message
+    assert "!kick: IndexError x1" in message
+
+
+def test_summary_messages_fit_discord_limit():
+    metrics = Bot_Metrics()
+    for i in range(60):
+        metrics.observe_command(f"command{i}", "1", 0.002, failed=False)
+        metrics.observe_operation(f"operation{i}", 0.01)
+        metrics.set_gauge(f"gauge_{i}", i, "A gauge.")
+    metrics.record_command_error("kick", ValueError("x" * 3000))
+    messages = metrics.summary_messages()
+    assert len(messages) > 1 and all(0 < len(message) < 2000 for message in messages)
+    assert messages[0].startswith("Bot stats since")
+    # No line is split between messages.
+    assert sum(message.count("\n\t") + message.startswith("\t") for message in messages) == 60 * 3 + 1
+    assert metrics.summary_messages(max_length=100000) == [metrics.summary()]
@@ -0,0 +1,68 @@
+"""
+Tests for finding players by mention, name, prefix and near-miss with Name_Index, and the commands using it.
+"""
+import asyncio
+
+from bot_code.name_index import Name_Index, normalise_name, parse_mention
+from bot_code.overwatch_queue import Player, Overwatch_Queue
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+
+
+def names(players):
+    return [player.name for player in players]
+
+
+def test_normalise_name():
+    assert normalise_name("Lúcio!") == "lucio"
+    assert normalise_name("Soldier 76") == "soldier76"
+    assert normalise_name("★") == ""
+    assert parse_mention("<@!42>") == 42 and parse_mention("<@42>") == 42 and parse_mention("42") is None
+
+
+def test_resolve_names():
+    index = Name_Index([Player("Lúcio", user_id=1), Player("Lucky"), Player("Mercy"), Player("Mei"),
+                        Player("D.Va")])
+    assert names(index.resolve("<@1>")) == ["Lúcio"] and index.resolve("<@2>") == []
+    assert names(index.resolve("Mercy")) == ["Mercy"]
+    assert names(index.resolve("dva")) == ["D.Va"]
+    assert names(index.resolve("luci")) == ["Lúcio"]
+    assert sorted(names(index.resolve("luc"))) == ["Lucky", "Lúcio"]
+    assert names(index.resolve("mecry")) == ["Mercy"]
+    assert names(index.resolve("mercyy")) == ["Mercy"]
+    assert index.resolve("zz") == [] and index.resolve("★") == []
+
+
+def test_index_follows_queue_changes():
+    queue = Overwatch_Queue(mode=2, players=[Player("Ana"), Player("Ashe")])
+    queue.add_players([Player("Anabelle"), Player("Brigitte", user_id=7)])
+    assert sorted(names(queue.resolve_player("an"))) == ["Ana", "Anabelle"]
+    assert names(queue.resolve_player("anab")) == ["Anabelle"]
+    queue.delete_players([queue.find_player("Ana")])
+    assert names(queue.resolve_player("an")) == ["Anabelle"]
+    assert queue.find_player("Ana") == "" and queue.find_player("Ashe").name == "Ashe"
+    queue.undo_command()
+    assert names(queue.resolve_player("ana")) == ["Ana"]
+    # The index is rebuilt from the restored players, so it finds the players now in the queue.
+    assert queue.find_player("Ana") is queue.players[0]
+    restored = Overwatch_Queue.from_dict(queue.to_dict())
+    assert names(restored.resolve_player("<@7>")) == ["Brigitte"]
+    queue.empty_queue()
+    assert queue.resolve_player("ana") == []
+
+
+def test_kick_by_prefix_mention_and_near_miss(create_test_bot):
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel(guild=Fake_Guild())
+        mercy = Fake_Author("Mercy")
+        await invoke_command(bot, mercy, channel, "!join")
+        await invoke_command(bot, Fake_Author("a"), channel, "!add Lúcio Lucky Reinhardt Zarya")
+        await invoke_command(bot, Fake_Author("a"), channel, f"!kick rein {mercy.mention} zraya luc nobody")
+        return bot.guild_queues[channel.guild.id].queue, [message.content for message in channel.sent
+                                                          if not message.pinned]
+
+    queue, replies = asyncio.run(run())
+    assert replies[-1] == ("Reinhardt, Mercy and Zarya have been removed from the queue.\n"
+                           "nobody is not a player in the queue.\n"
+                           "luc could be any of Lúcio and Lucky.")
+    assert names(queue.players) == ["Lúcio", "Lucky"]
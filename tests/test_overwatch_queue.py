@@ -101,4 +101,115 @@ def test_create_queue():
 
 def test_find_player(five_players, five_player_queue):
     player = find_player(five_player_queue, "5")
-    assert player == five_players[4]
\ No newline at end of file
+    assert player == five_players[4]
+
+def test_print_players_cached_until_changed():
+    queue = Overwatch_Queue(players=[Player(str(i)) for i in range(1, 8)])
+    message = queue.print_players()
+    assert queue.print_players() is message
+    queue.update_queue()
+    assert queue.print_players() is not message
+    assert queue.print_players() == queue._Overwatch_Queue__render_players()
+
+
+def test_print_players_extended_on_add():
+    queue = Overwatch_Queue(players=[Player(str(i)) for i in range(1, 6)])
+    queue.print_players()
+    for name in ("6", "7", "8"):
+        queue.add_player(Player(name))
+        assert queue.print_players() == queue._Overwatch_Queue__render_players()
+    assert queue.print_players().endswith("\n\nThe players in the waiting queue are: \n\t7\n\t8")
+
+
+def test_version_changes_on_every_action():
+    players = [Player(str(i)) for i in range(1, 9)]
+    queue = Overwatch_Queue(players=players)
+    versions = [queue.version]
+    queue.delay_player(players[0])
+    versions.append(queue.version)
+    queue.rejoin_player(players[0])
+    versions.append(queue.version)
+    queue.delete_player(players[1])
+    versions.append(queue.version)
+    queue.undo_command()
+    versions.append(queue.version)
+    queue.empty_queue()
+    versions.append(queue.version)
+    assert versions == sorted(set(versions))
+    assert queue.print_players() == "The players in the next game are: "
+
+
+def test_print_players_page():
+    players = [Player(str(i)) for i in range(1, 51)]
+    queue = Overwatch_Queue(players=players)
+    queue.delay_player(players[10])
+    message = queue.print_players_page(page=1, page_size=4)
+    assert message == ''.join(("The players in the next game are: ",
+                               "\n\t1. 1\n\t2. 2\n\t3. 3\n\t4. 4",
+                               "\n\nPage 1 of 13."))
+    message = queue.print_players_page(page=2, page_size=4)
+    assert message == ''.join(("The players in the next game are: ",
+                               "\n\t5. 5\n\t6. 6",
+                               "\n\nThe players in the waiting queue are: ",
+                               "\n\t7. 7\n\t8. 8",
+                               "\n\nPage 2 of 13."))
+    message = queue.print_players_page(page=3, page_size=4)
+    assert message.startswith("The players in the waiting queue are: \n\t9. 9\n\t10. 10\n\t11. 11 (Currently delaying)")
+    assert queue.print_players_page(page=99, page_size=4).endswith("\n\t50. 50\n\nPage 13 of 13.")
+
+
+def test_find_player_page():
+    players = [Player(str(i)) for i in range(1, 51)]
+    queue = Overwatch_Queue(players=players)
+    assert queue.find_player_page(players[0], page_size=20) == 1
+    assert queue.find_player_page(players[45], page_size=20) == 3
+    assert queue.find_player_page(Player("new"), page_size=20) == 0
+
+
+def test_add_players_batch():
+    queue = Overwatch_Queue(mode=2)
+    queue.add_player(Player("a"))
+    version = queue.version
+    message = queue.add_players([Player(name) for name in ("b", "a", "c", "d", "e", "f", "g")])
+    assert message == "b, c, d, e, f and g have been added to the queue.\na is already in the queue."
+    assert queue.version == version + 1
+    assert [player.name for player in queue.current_players] == ["a", "b", "c", "d", "e"]
+    assert [player.name for player in queue.waiting_players] == ["f", "g"]
+    assert queue.print_players().endswith("waiting queue are: \n\tf\n\tg")
+    queue.undo_command()
+    assert [player.name for player in queue.players] == ["a"]
+
+
+def test_delete_players_batch():
+    players = [Player(str(i)) for i in range(1, 10)]
+    queue = Overwatch_Queue(mode=2, players=players)
+    queue.delay_player(players[5])
+    queue.delete_players([players[0], players[2], players[7]])
+    # 6 is delaying, so 7 and 9 fill the two places left by 1 and 3.
+    assert [player.name for player in queue.current_players] == ["2", "4", "5", "7", "9"]
+    assert [player.name for player in queue.waiting_players] == ["6"]
+    assert queue.delayed_players == [players[5]]
+    assert all(player.playing for player in queue.current_players)
+    queue.undo_command()
+    assert len(queue.players) == 9
+
+
+def test_next_after_switching_to_overwatch_2_with_every_waiting_player_delaying():
+    players = [Player(str(i)) for i in range(1, 9)]
+    queue = Overwatch_Queue(mode=1, players=players)
+    queue.set_mode(2)
+    # The sixth current player is the first to wait, with no game lost to the switch.
+    assert [player.name for player in queue.current_players] == ["1", "2", "3", "4", "5"]
+    assert [player.name for player in queue.waiting_players] == ["6", "7", "8"]
+    assert not players[5].playing
+    for player in players[5:]:
+        queue.delay_player(player)
+    queue.update_queue()
+    assert [player.name for player in queue.current_players] == ["1", "2", "3", "4", "5"]
+    assert [player.name for player in queue.waiting_players] == ["6", "7", "8"]
+    queue.set_mode(1)
+    assert len(queue.current_players) == 5
+    queue.rejoin_player(players[7])
+    queue.set_mode(2)
+    queue.set_mode(1)
+    assert [player.name for player in queue.current_players] == ["1", "2", "3", "4", "5", "8"]
@@ -0,0 +1,152 @@
+"""
+Tests for the adaptive patch polling schedule in Patch_Schedule.
+"""
+import asyncio
+from datetime import datetime, timezone
+import importlib
+
+import pytest
+
+from bot_code.patch_schedule import (Patch_Schedule, get_hour_of_week, HOURS_PER_WEEK, MIN_INTERVAL, MAX_INTERVAL,
+                                     PRIOR_WEIGHT)
+from fake_discord import Fake_Channel
+
+
+class Fake_Clock():
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+# Tuesday 2 March 2021, 18:00 UTC
+TUESDAY_EVENING = datetime(2021, 3, 2, 18, tzinfo=timezone.utc).timestamp()
+WEEK = 7 * 24 * 60 * 60
+
+
+def run_weeks(schedule: Patch_Schedule, clock: Fake_Clock, weeks: int, release_offset: float = 0):
+    """
+    Polls whenever due for some weeks, with a patch released each Tuesday evening.
+    """
+    end = clock.now + weeks * WEEK
+    next_release = TUESDAY_EVENING + release_offset
+    while clock.now < end:
+        if schedule.is_due():
+            found = clock.now >= next_release
+            if found:
+                next_release += WEEK
+            schedule.record_poll(found)
+        clock.now += 60
+
+
+def test_polls_evenly_within_budget_before_any_patches():
+    schedule = Patch_Schedule(polls_per_day=24, clock=Fake_Clock(TUESDAY_EVENING))
+    assert schedule.is_due()
+    intervals = schedule.get_intervals()
+    assert len(intervals) == HOURS_PER_WEEK and intervals == pytest.approx([3600] * HOURS_PER_WEEK)
+    # A budget too small to poll every max_interval is spread evenly.
+    assert Patch_Schedule(polls_per_day=2).get_intervals()[0] == 12 * 3600
+
+
+def test_learns_release_window_within_budget():
+    clock = Fake_Clock(TUESDAY_EVENING - WEEK)
+    schedule = Patch_Schedule(polls_per_day=24, clock=clock)
+    run_weeks(schedule, clock, weeks=8, release_offset=-WEEK + 30 * 60)
+    intervals = schedule.get_intervals()
+    release_hour = get_hour_of_week(TUESDAY_EVENING)
+    assert intervals[release_hour] == MIN_INTERVAL
+    # Other hours are polled less often than hourly, but never less than every MAX_INTERVAL.
+    assert 3600 < max(intervals) <= MAX_INTERVAL
+    stats = schedule.get_stats()
+    assert stats["planned_polls_per_day"] <= 24 + 1e-6
+    # The budget is kept to on average over the week, with more polls on release days.
+    assert stats["polls"] <= 8 * 7 * 24
+    assert stats["releases_detected"] == 8
+    # Once learned, the latest releases are caught within min_interval, far sooner than the first.
+    assert schedule.detection_latencies[-1] <= MIN_INTERVAL + 60
+    assert schedule.detection_latencies[0] > schedule.detection_latencies[-1]
+
+
+def test_release_dates_weight_their_weekday():
+    schedule = Patch_Schedule()
+    schedule.learn_dates(["02 March, 2021", "23 February, 2021", ""])
+    weights = schedule.get_weights()
+    # Both dates are Tuesdays.
+    assert weights[24] == pytest.approx(PRIOR_WEIGHT + 2 / 24) and weights[0] == PRIOR_WEIGHT
+
+
+def test_save_and_load(tmp_path):
+    clock = Fake_Clock(TUESDAY_EVENING)
+    schedule = Patch_Schedule(clock=clock)
+    schedule.record_poll(False)
+    clock.now += 600
+    schedule.record_poll(True)
+    schedule.learn_dates(["02 March, 2021"])
+    fpath = str(tmp_path / "schedule.json")
+    schedule.save(fpath)
+    restored = Patch_Schedule.load(fpath)
+    assert restored.to_dict() == schedule.to_dict()
+    assert restored.get_intervals() == schedule.get_intervals()
+    assert Patch_Schedule.load(str(tmp_path / "missing.json")).poll_count == 0
+
+
+def test_new_patch_leader_loads_schedule(patch_scraper):
+    discord_bot = importlib.import_module("discord_bot")
+
+    async def run():
+        # Two shards, as two processes sharing the database and the db folder.
+        old_leader = discord_bot.create_bot(scraper=patch_scraper, shard_id=0, shard_count=2)
+        new_leader = discord_bot.create_bot(scraper=patch_scraper, shard_id=1, shard_count=2)
+        assert await old_leader.renew_leadership() and not await new_leader.renew_leadership()
+        old_leader.record_patch_poll(False)
+        old_leader.scraper.patch_archive.add("02 March, 2021")
+        old_leader.record_patch_poll(True)
+        await discord_bot.db.release_lease("patch_poller", old_leader.instance_id)
+        stale_poll_count = new_leader.patch_schedule.poll_count
+        assert await new_leader.renew_leadership()
+        await discord_bot.db.release_lease("patch_poller", new_leader.instance_id)
+        return old_leader.patch_schedule, new_leader.patch_schedule, stale_poll_count
+
+    old_schedule, new_schedule, stale_poll_count = asyncio.run(run())
+    assert stale_poll_count == 0
+    assert new_schedule.to_dict() == old_schedule.to_dict()
+    assert new_schedule.last_poll == old_schedule.last_poll and "02 March, 2021" in new_schedule.release_dates
+
+
+def test_edited_patch_not_counted_as_release(create_test_bot, patch_site):
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel()
+        bot.get_channel = {channel.id: channel}.get
+
+        async def get_patch_channels(feed: str = "live"):
+            return [channel.id] if feed == "live" else []
+        bot.get_patch_channels = get_patch_channels
+        await bot.post_new_patches()
+        patch_site.set_page("/live", "hero.html")
+        await bot.post_new_patches()
+        releases = list(bot.patch_schedule.releases)
+        patch_site.set_page("/live", "hero_edited.html")
+        posted_count = await bot.post_new_patches()
+        return bot.patch_schedule, releases, posted_count, channel
+
+    schedule, releases, posted_count, channel = asyncio.run(run())
+    assert len(releases) == 1 and "16 March, 2021" in schedule.release_dates
+    # The edit is posted, but the schedule still counts one release.
+    assert posted_count == 1 and channel.sent[-1].content.startswith("An Overwatch patch has been updated!")
+    assert schedule.releases == releases and schedule.poll_count == 3
+
+
+def test_polls_per_day_kept_when_reloaded(patch_scraper):
+    discord_bot = importlib.import_module("discord_bot")
+
+    async def run():
+        bot = discord_bot.create_bot(scraper=patch_scraper, patch_polls_per_day=96)
+        budget = bot.patch_schedule.polls_per_day
+        assert await bot.renew_leadership()
+        await discord_bot.db.release_lease("patch_poller", bot.instance_id)
+        return budget, bot.patch_schedule.get_stats()
+
+    budget, stats = asyncio.run(run())
+    assert budget == 96 and stats["budget_polls_per_day"] == 96
@@ -0,0 +1,142 @@
+"""
+Unit tests for patch_scraper.py, run against saved patch pages served by a local stand-in site.
+
+The golden files in tests/fixtures/patch_pages hold the expected Discord messages for each saved
+page. To regenerate them after an intended formatting change, run with UPDATE_GOLDEN=1.
+"""
+import asyncio
+import json
+import os
+import pytest
+
+from bot_code.patch_scraper import Overwatch_Patch_Scraper, PATCH_FEEDS, hash_text
+from patch_site import PATCH_PAGES_DIR
+
+
+def read_golden(page: str) -> list:
+    golden_fpath = os.path.join(PATCH_PAGES_DIR, page.replace(".html", ".golden.json"))
+    if os.environ.get("UPDATE_GOLDEN"):
+        return None
+    with open(golden_fpath, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_golden(page: str, messages: list):
+    golden_fpath = os.path.join(PATCH_PAGES_DIR, page.replace(".html", ".golden.json"))
+    with open(golden_fpath, "w", encoding="utf-8") as f:
+        json.dump(messages, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+
+
+@pytest.mark.parametrize("page", ["generic.html", "hero.html", "unknown.html"])
+def test_prepare_new_live_patch_notes_golden(patch_site, patch_scraper, page):
+    patch_site.set_page("/live", page)
+    messages = patch_scraper.prepare_new_live_patch_notes()
+    expected_messages = read_golden(page)
+    if expected_messages is None:
+        write_golden(page, messages)
+        pytest.skip(f"Golden output for {page} regenerated.")
+    assert messages == expected_messages
+
+
+@pytest.mark.parametrize("page, expected_type", [("generic.html", "generic"),
+                                                 ("hero.html", "hero"),
+                                                 ("unknown.html", "unknown")])
+def test_check_patch_type(patch_site, patch_scraper, page, expected_type):
+    patch_site.set_page("/live", page)
+    patch = patch_scraper.get_latest_patch(patch_scraper.live_patches_url)
+    assert patch_scraper._Overwatch_Patch_Scraper__check_patch_type(patch) == expected_type
+
+
+def test_init_stores_latest_patch_date(patch_scraper):
+    for feed in PATCH_FEEDS:
+        patch_date, section_hashes = patch_scraper.storage.get_patch_state(feed)
+        assert patch_date == "23 February, 2021" and "Bug Fixes" in section_hashes
+
+
+def test_restart_posts_only_patches_released_while_down(patch_site, patch_scraper):
+    patch_site.set_page("/live", "hero.html")
+    assert patch_scraper.check_for_new_patch("live")
+    # A restarted scraper loads what was stored, rather than taking the site as already posted.
+    patch_site.set_page("/live", "generic.html")
+    request_count = patch_site.request_count
+    restarted_scraper = Overwatch_Patch_Scraper(live_patches_url=patch_site.url("/live"),
+                                                experimental_patches_url=patch_site.url("/experimental"))
+    assert patch_site.request_count == request_count
+    assert restarted_scraper.patch_dates["live"] == "16 March, 2021"
+    assert restarted_scraper.check_for_new_patch("live")
+    assert not restarted_scraper.check_for_new_patch("live")
+
+
+def test_patch_posted_by_another_process_is_not_posted_again(patch_site, patch_scraper):
+    # Two scrapers on one database, as the old and the new lease leader have.
+    new_leader_scraper = Overwatch_Patch_Scraper(live_patches_url=patch_site.url("/live"),
+                                                 experimental_patches_url=patch_site.url("/experimental"))
+    patch_site.set_page("/live", "hero.html")
+    assert patch_scraper.check_for_new_patch("live")
+    assert new_leader_scraper.check_for_new_patch("live") == []
+    assert new_leader_scraper.patch_dates["live"] == "16 March, 2021"
+    patch_site.set_page("/live", "hero_edited.html")
+    assert len(new_leader_scraper.check_for_new_patch("live")) == 1
+    assert patch_scraper.check_for_new_patch("live") == []
+
+
+def test_check_for_new_live_patch_same_patch(patch_scraper):
+    assert not patch_scraper.check_for_new_live_patch()
+
+
+def test_check_for_new_live_patch_new_patch(patch_site, patch_scraper):
+    patch_site.set_page("/live", "hero.html")
+    assert patch_scraper.check_for_new_live_patch()
+    assert not patch_scraper.check_for_new_live_patch()
+
+
+def test_parse_patches_newest_first(patch_scraper):
+    page_text = patch_scraper.fetch_patches_page(patch_scraper.live_patches_url)
+    patches = patch_scraper.parse_patches(page_text)
+    assert len(patches) == 2
+    assert "February 23, 2021" in patches[0].get_text()
+
+
+def test_create_messages_long_patch(patch_site, patch_scraper):
+    patch_site.set_page("/live", "hero.html")
+    messages = patch_scraper.prepare_new_live_patch_notes()
+    assert len(messages) == 2
+    assert all(len(message) < 2000 for message in messages)
+    assert messages[1].startswith("__**")
+
+
+def test_check_feeds_one_request_per_feed(patch_site, patch_scraper):
+    assert asyncio.run(patch_scraper.check_feeds()) == {}
+    patch_site.set_page("/experimental", "hero.html")
+    request_count = patch_site.request_count
+    new_messages = asyncio.run(patch_scraper.check_feeds())
+    assert patch_site.request_count == request_count + 2
+    assert list(new_messages) == ["experimental"] and len(new_messages["experimental"]) == 2
+    # The live feed's date is kept apart from the experimental feed's.
+    assert patch_scraper.patch_dates["live"] == "23 February, 2021"
+    assert asyncio.run(patch_scraper.check_feeds()) == {}
+
+
+def test_check_feeds_skips_unreachable_feed(patch_site, patch_scraper):
+    patch_scraper.feed_urls["experimental"] = "http://127.0.0.1:1/experimental"
+    patch_site.set_page("/live", "hero.html")
+    assert list(asyncio.run(patch_scraper.check_feeds())) == ["live"]
+
+
+def test_edited_patch_posts_changed_sections_only(patch_site, patch_scraper):
+    patch_site.set_page("/live", "hero.html")
+    assert patch_scraper.check_for_new_patch("live")
+    patch_site.set_page("/live", "hero_edited.html")
+    assert patch_scraper.check_for_new_patch("live") == [
+        "An Overwatch patch has been updated! Changes to the patch notes from: 16 March, 2021:"
+        "\n\n__**Ana**__\n\n**Biotic Grenade**\nHealing boost reduced from 50% to 35%."]
+    assert patch_scraper.check_for_new_patch("live") == []
+
+
+def test_section_hashes_ignore_whitespace(patch_scraper):
+    patch = patch_scraper.parse_patches(patch_scraper.fetch_patches_page(patch_scraper.live_patches_url))[0]
+    section_hashes = patch_scraper.get_section_hashes(patch)
+    assert section_hashes == patch_scraper.section_hashes["live"]
+    assert "Bug Fixes" in section_hashes
+    assert hash_text("a  b\n c") == hash_text("a b c") != hash_text("a b d")
@@ -0,0 +1,104 @@
+"""
+Tests for the on-demand Sampling_Profiler and the !profile command.
+"""
+import asyncio
+import datetime
+import sys
+import threading
+import time
+import tracemalloc
+
+from bot_code.overwatch_queue import Overwatch_Queue, Player
+from bot_code.profiler import Sampling_Profiler, get_component
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+
+
+def spin(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sample_records_each_thread_stack():
+    ready, done = threading.Event(), threading.Event()
+
+    def wait_in_worker():
+        ready.set()
+        done.wait()
+
+    worker = threading.Thread(target=wait_in_worker, name="worker")
+    worker.start()
+    ready.wait()
+    profiler = Sampling_Profiler(trace_memory=False)
+    profiler.sample({worker.ident: sys._current_frames()[worker.ident]})
+    done.set()
+    worker.join()
+    [(stack, count)] = profiler.stacks.items()
+    assert stack[0] == "worker" and count == 1
+    assert any(frame_name.startswith("test_sample_records_each_thread_stack.<locals>.wait_in_worker (test_profiler.py:")
+               for frame_name in stack)
+    assert profiler.components == {"idle": 1}
+    assert profiler.to_folded() == f"{';'.join(stack)} 1\n"
+
+
+def test_components():
+    assert get_component(("MainThread", "main (bot.py:1)", "on_message (discord_bot.py:5)",
+                          "Storage.save_queue (storage_layer.py:210)")) == "storage"
+    assert get_component(("MainThread", "on_message (discord_bot.py:5)", "join (overwatch_queue.py:40)")) == "commands"
+    assert get_component(("ThreadPoolExecutor-0_0", "_worker (thread.py:69)", "get (queue.py:154)")) == "idle"
+    assert get_component(("MainThread", "run (events.py:80)")) == "other"
+
+
+def test_profile_samples_and_traces_queue_memory():
+    profiler = Sampling_Profiler(interval=0.001)
+    was_tracing = tracemalloc.is_tracing()
+    profiler.start()
+    assert profiler.running
+    queue = Overwatch_Queue(mode=2, players=[Player(f"player{i}") for i in range(2000)])
+    spin(0.1)
+    profiler.stop()
+    assert not profiler.running and tracemalloc.is_tracing() == was_tracing
+    assert profiler.sample_count > 10
+    assert any(frame_name.startswith("spin (test_profiler.py:") for frame_name, _, _ in profiler.get_top_functions())
+    assert profiler.memory_total > 0
+    assert any(statistic.traceback[0].filename.endswith("overwatch_queue.py") and statistic.size_diff > 0
+               for statistic in profiler.memory_diff)
+    summary = profiler.summary(top_n=3)
+    assert summary.startswith("Profiled for") and "Most sampled functions" in summary
+    assert "Queue memory traced" in summary and "name_index.py:" in summary
+    assert len(queue.players) == 2000
+
+
+def test_write(tmp_path):
+    profiler = Sampling_Profiler(trace_memory=False)
+    profiler.start()
+    spin(0.02)
+    profiler.stop()
+    folded_fpath, summary_fpath = profiler.write(str(tmp_path / "profiles"), now=datetime.datetime(2021, 3, 2, 18))
+    assert folded_fpath.endswith("profile-20210302-180000.folded")
+    with open(folded_fpath) as f:
+        assert f.read() == profiler.to_folded()
+    with open(summary_fpath) as f:
+        assert f.read().startswith("Profiled for")
+
+
+def test_profile_command_is_admin_only(create_test_bot, tmp_path):
+    async def run():
+        bot = create_test_bot()
+        bot.profile_dir = str(tmp_path / "profiles")
+        channel = Fake_Channel(guild=Fake_Guild())
+        await invoke_command(bot, Fake_Author("a"), channel, "!profile 1")
+        # Command errors are handled in a task of their own.
+        await asyncio.sleep(0.01)
+        denied = channel.sent[-1].content
+        await asyncio.gather(invoke_command(bot, Fake_Author("admin", administrator=True), channel, "!profile 0.1"),
+                             invoke_command(bot, Fake_Author("admin", administrator=True), channel, "!profile 1"))
+        return bot, denied, [message.content for message in channel.sent[1:]]
+
+    bot, denied, replies = asyncio.run(run())
+    assert "permissions" in denied
+    assert replies[0] == "Profiling for 1 seconds..."
+    assert replies[1] == "The bot is already being profiled."
+    assert replies[2].startswith("Profiled for 1.0 s") and "Flame graph stacks written to" in replies[2]
+    assert bot.profiler is None
+    assert sorted(path.suffix for path in (tmp_path / "profiles").iterdir()) == [".folded", ".txt"]
@@ -0,0 +1,131 @@
+"""
+Tests for the session analytics kept by Overwatch_Queue, and the !session and !end commands.
+"""
+import asyncio
+import importlib
+
+from bot_code.overwatch_queue import Player, Overwatch_Queue
+from bot_code.session_stats import Session_Stats, PLAYING
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+
+
+class Fake_Clock():
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def create_timed_queue(player_count, mode=2):
+    clock = Fake_Clock()
+    queue = Overwatch_Queue(mode=mode)
+    queue.session = Session_Stats(start_time=clock.now, clock=clock)
+    for i in range(player_count):
+        queue.add_player(Player(str(i)))
+    return queue, clock
+
+
+def test_games_and_waiting_counted():
+    queue, clock = create_timed_queue(7)
+    clock.now += 600
+    queue.update_queue()
+    clock.now += 600
+    queue.update_queue()
+    # Player 0 played a game, waited a game, and is playing again; player 5 waited a game then played one.
+    assert queue.session.get_player_totals("0") == {"games_played": 1, "seconds_playing": 600,
+                                                     "seconds_waiting": 600, "seconds_delaying": 0}
+    assert queue.session.get_player_totals("5") == {"games_played": 1, "seconds_playing": 600,
+                                                     "seconds_waiting": 600, "seconds_delaying": 0}
+    clock.now += 100
+    assert queue.session.get_player_totals("0")["seconds_playing"] == 700
+    assert queue.session.games_completed == 2
+
+
+def test_delaying_and_rejoining_counted():
+    queue, clock = create_timed_queue(5)
+    player = queue.find_player("2")
+    clock.now += 300
+    queue.delay_player(player)
+    clock.now += 900
+    queue.update_queue()
+    queue.rejoin_player(player)
+    clock.now += 60
+    assert queue.session.get_player_totals("2") == {"games_played": 0, "seconds_playing": 360,
+                                                     "seconds_waiting": 0, "seconds_delaying": 900}
+    assert queue.session.get_player_totals("3")["games_played"] == 1
+
+
+def test_leaving_keeps_totals_and_undo_restores_them():
+    queue, clock = create_timed_queue(6)
+    clock.now += 600
+    queue.update_queue()
+    queue.delete_player(queue.find_player("1"))
+    clock.now += 600
+    assert queue.session.get_player_totals("1") == {"games_played": 1, "seconds_playing": 600,
+                                                     "seconds_waiting": 0, "seconds_delaying": 0}
+    queue.update_queue()
+    queue.undo_command()
+    assert queue.session.games_completed == 1
+    # The restored session is a snapshot from before the last game, still timed by the queue's clock.
+    assert queue.session.clock is clock
+    clock.now += 300
+    assert queue.session.get_player_totals("0")["seconds_playing"] == 1500
+
+
+def test_snapshot_kept_apart_from_session():
+    queue, clock = create_timed_queue(6)
+    snapshot = queue.session.snapshot()
+    clock.now += 600
+    queue.update_queue()
+    assert snapshot.games_completed == 0 and snapshot.players["0"].seconds[PLAYING] == 0
+    assert snapshot.players["0"] is not queue.session.players["0"]
+    assert queue.session.players["0"].seconds[PLAYING] == 600
+
+
+def test_empty_queue_ends_session():
+    queue, clock = create_timed_queue(3)
+    clock.now += 1200
+    queue.update_queue()
+    queue.empty_queue()
+    assert queue.last_session["games_completed"] == 1
+    assert all(player["state"] is None and player["games_played"] == 1 and player["seconds"]["playing"] == 1200
+               for player in queue.last_session["players"])
+    assert queue.session.players == {} and queue.session.games_completed == 0
+
+
+def test_session_survives_save_and_load():
+    queue, clock = create_timed_queue(7)
+    clock.now += 600
+    queue.update_queue()
+    restored = Overwatch_Queue.from_dict(queue.to_dict())
+    restored.session.clock = clock
+    clock.now += 60
+    assert restored.session.get_player_totals("0") == queue.session.get_player_totals("0")
+    restored.update_queue()
+    assert restored.session.get_player_totals("2")["games_played"] == 2
+
+
+def test_session_and_end_commands(create_test_bot):
+    discord_bot = importlib.import_module("discord_bot")
+
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel(guild=Fake_Guild())
+        await invoke_command(bot, Fake_Author("a"), channel, "!session")
+        for name in ("a", "b", "c", "d", "e", "f"):
+            await invoke_command(bot, Fake_Author(name), channel, "!join")
+        await invoke_command(bot, Fake_Author("a"), channel, "!next")
+        await invoke_command(bot, Fake_Author("a"), channel, "!session")
+        await invoke_command(bot, Fake_Author("a"), channel, "!end")
+        archived = await discord_bot.db.get_archived_sessions(channel.guild.id)
+        return [message.content for message in channel.sent], archived
+
+    replies, archived = asyncio.run(run())
+    assert replies[0] == "There is no queue. Type '!queue' to create one."
+    summary = replies[-2].split("\n")
+    assert summary[0].endswith("1 games played.")
+    assert summary[1].startswith("\ta: 1 games, waited 0:00:00")
+    assert summary[-1].startswith("\tf: 0 games")
+    assert len(archived) == 1 and archived[0]["games_completed"] == 1
+    assert sorted(player["name"] for player in archived[0]["players"]) == ["a", "b", "c", "d", "e", "f"]
@@ -0,0 +1,132 @@
+"""
+Tests for running the bot as several shards sharing one database, with each shard in its own process.
+"""
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from bot_code.overwatch_queue import Player, Overwatch_Queue
+from bot_code.sharding import shard_for_guild
+from bot_code.storage_layer import Storage
+from fake_gateway import Fake_Gateway
+
+
+@pytest.fixture
+def gateway(patch_site, tmp_path):
+    gateway_obj = Fake_Gateway(shard_count=2, workdir=str(tmp_path), patch_site_url=patch_site.url(""),
+                               leader_lease_ttl=0.5).start()
+    yield gateway_obj
+    gateway_obj.stop()
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return Storage()
+
+
+def test_shard_for_guild():
+    assert [shard_for_guild(k << 22, 3) for k in range(6)] == [0, 1, 2, 0, 1, 2]
+    # The low 22 bits of an id are not part of its timestamp, so do not affect the shard.
+    assert shard_for_guild((4 << 22) + 12345, 3) == 1
+
+
+def test_queue_to_dict_round_trip():
+    queue = Overwatch_Queue(mode=1, players=[Player(str(i)) for i in range(1, 8)])
+    queue.add_player(Player("8"))
+    queue.delay_player(queue.players[2])
+    queue.update_queue()
+    restored = Overwatch_Queue.from_dict(queue.to_dict())
+    assert restored.to_dict() == queue.to_dict()
+    assert restored.print_players() == queue.print_players()
+    assert {id(player) for player in restored.current_players} <= {id(player) for player in restored.players}
+
+
+def test_storage_saves_queues(storage):
+    assert asyncio.run(storage.load_queue(1)) is None
+    asyncio.run(storage.save_queue(1, {"players": ["a"]}))
+    asyncio.run(storage.save_queue(1, {"players": ["a", "b"]}))
+    assert asyncio.run(storage.load_queue(1)) == {"players": ["a", "b"]}
+
+
+def test_storage_patch_channels(storage):
+    assert asyncio.run(storage.add_patch_channel(2))
+    assert asyncio.run(storage.add_patch_channel(1))
+    assert not asyncio.run(storage.add_patch_channel(1))
+    assert asyncio.run(storage.get_patch_channels()) == [1, 2]
+    assert asyncio.run(storage.remove_patch_channel(2))
+    assert not asyncio.run(storage.remove_patch_channel(2))
+    assert asyncio.run(storage.get_patch_channels()) == [1]
+    assert asyncio.run(storage.add_patch_channel(1, "experimental"))
+    assert asyncio.run(storage.get_patch_channels("experimental")) == [1]
+    assert asyncio.run(storage.remove_patch_channel(1))
+    assert asyncio.run(storage.get_patch_channels("experimental")) == [1]
+
+
+def test_storage_lease(storage):
+    assert asyncio.run(storage.acquire_lease("poller", "a", 0.2))
+    assert not asyncio.run(storage.acquire_lease("poller", "b", 0.2))
+    assert asyncio.run(storage.acquire_lease("poller", "a", 0.2))
+    time.sleep(0.3)
+    assert asyncio.run(storage.acquire_lease("poller", "b", 0.2))
+    asyncio.run(storage.release_lease("poller", "a"))
+    assert not asyncio.run(storage.acquire_lease("poller", "a", 0.2))
+    asyncio.run(storage.release_lease("poller", "b"))
+    assert asyncio.run(storage.acquire_lease("poller", "a", 0.2))
+
+
+def test_commands_routed_to_guild_shard(gateway):
+    for guild_id in (2 << 22, 3 << 22, 4 << 22):
+        shard_id, replies = gateway.send(guild_id, "a", "!join")
+        assert shard_id == shard_for_guild(guild_id, 2)
+        assert replies[-1].endswith("a has been added to the queue.")
+    shard_id, replies = gateway.send(3 << 22, "b", "!join")
+    assert shard_id == 1
+    assert replies == ["b has been added to the queue."]
+
+
+def test_queue_survives_shard_restart(gateway):
+    guild_id = 5 << 22
+    for name in ("a", "b", "c"):
+        gateway.send(guild_id, name, "!join")
+    gateway.send(guild_id, "b", "!game 1")
+    gateway.restart_shard(shard_for_guild(guild_id, 2))
+    _, replies = gateway.send(guild_id, "a", "!status")
+    assert replies == ["The players in the next game are: \n\ta\n\tb\n\tc"]
+    gateway.send(guild_id, "d", "!join")
+    gateway.restart_shard(shard_for_guild(guild_id, 2))
+    _, replies = gateway.send(guild_id, "a", "!status")
+    assert replies == ["The players in the next game are: \n\ta\n\tb\n\tc\n\td"]
+
+
+def test_storage_moves_old_patch_channels_to_live_feed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "db").mkdir()
+    conn = sqlite3.connect(str(tmp_path / "db" / "overwatch_stats.db"))
+    conn.execute("CREATE TABLE patch_channels (channel_id integer PRIMARY KEY)")
+    conn.execute("INSERT INTO patch_channels(channel_id) VALUES(5)")
+    conn.commit()
+    conn.close()
+    storage = Storage()
+    assert asyncio.run(storage.get_patch_channels()) == [5]
+    assert asyncio.run(storage.get_patch_channels("experimental")) == []
+
+
+def test_one_patch_poller_with_failover(gateway):
+    assert gateway.poll_leadership(0)
+    assert not gateway.poll_leadership(1)
+    assert gateway.poll_leadership(0)
+    # A crashed leader keeps its lease until it expires.
+    gateway.stop_shard(0, crash=True)
+    assert not gateway.poll_leadership(1)
+    time.sleep(0.6)
+    assert gateway.poll_leadership(1)
+    # A restarted shard does not take over while the new leader is renewing.
+    gateway.start_shard(0)
+    assert gateway.poll_leadership(1)
+    assert not gateway.poll_leadership(0)
+    # A leader shutting down cleanly hands over straight away.
+    gateway.stop_shard(1)
+    assert gateway.poll_leadership(0)
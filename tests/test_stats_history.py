@@ -0,0 +1,116 @@
+"""
+Tests for recording linked players' stats over time, and the !trend command reading them back.
+"""
+import asyncio
+import importlib
+import time
+
+import pytest
+
+from bot_code.battlenet_interface import Profile_Fetcher
+from bot_code.stats_history import Stats_Snapshotter, STAT_CODES, DAY, get_key_stats, format_trend
+from bot_code.storage_layer import Storage
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+
+
+class Fake_Profile():
+    def __init__(self, time_played, games_won):
+        self.time_played = time_played
+        self.games_won = games_won
+
+    def modes(self):
+        return ["quickplay"]
+
+    def stats(self, mode, hero, category, stat_name):
+        return {"Time Played": self.time_played, "Games Won": self.games_won}[stat_name]
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return Storage()
+
+
+def test_append_skips_unchanged_values(storage):
+    sr = STAT_CODES["sr"]
+    assert asyncio.run(storage.append_stat_samples([(1, sr, 100, 2500), (2, sr, 100, 3000)])) == 2
+    assert asyncio.run(storage.append_stat_samples([(1, sr, 200, 2500), (2, sr, 200, 3100)])) == 1
+    assert asyncio.run(storage.get_stat_samples(1, sr, 0, 300)) == [(100, 2500)]
+    assert asyncio.run(storage.get_stat_samples(2, sr, 150, 300)) == [(100, 3000), (200, 3100)]
+
+
+def test_range_query_uses_index(storage):
+    plan = storage.conn.execute('EXPLAIN QUERY PLAN SELECT time, value FROM stat_samples WHERE player_id=? AND stat=? '
+                                'AND time>=? AND time<=? ORDER BY time', (1, 1, 0, 10)).fetchall()
+    assert all("SCAN" not in row[-1] for row in plan)
+    assert any("USING PRIMARY KEY" in row[-1] for row in plan)
+
+
+def test_downsample_keeps_latest_per_interval(storage):
+    sr = STAT_CODES["sr"]
+    samples = [(1, sr, day * DAY + hour * 3600, 2000 + 10 * day + hour) for day in range(3) for hour in range(0, 24, 6)]
+    asyncio.run(storage.append_stat_samples(samples))
+    deleted = asyncio.run(storage.downsample_stat_samples(2 * DAY, DAY))
+    assert deleted == 6
+    assert asyncio.run(storage.get_stat_samples(1, sr, 0, 3 * DAY)) == [
+        (18 * 3600, 2018), (DAY + 18 * 3600, 2028), (2 * DAY, 2020), (2 * DAY + 6 * 3600, 2026),
+        (2 * DAY + 12 * 3600, 2032), (2 * DAY + 18 * 3600, 2038)]
+
+
+def test_get_key_stats():
+    assert get_key_stats(Fake_Profile("12:30:00", 40)) == {"quickplay_seconds": 45000, "quickplay_games_won": 40}
+    assert get_key_stats(Fake_Profile("--", 3)) == {"quickplay_games_won": 3}
+
+
+def test_snapshot_records_linked_players(storage):
+    profiles = {"Alpha#1111": Fake_Profile("1:00:00", 5), "Beta#2222": Fake_Profile("2:00:00", 9)}
+
+    def load_profile(battletag):
+        if battletag not in profiles:
+            raise ValueError("profile not found")
+        return profiles[battletag]
+
+    async def run():
+        await storage.upsert_player("alpha", "Alpha#1111")
+        await storage.upsert_player("beta", "Beta#2222")
+        await storage.upsert_player("gamma", "Gamma#3333")
+        await storage.set_rating("Alpha#1111", 2500, "tank")
+        snapshotter = Stats_Snapshotter(storage, Profile_Fetcher(cache_ttl=0, load_profile=load_profile))
+        first = await snapshotter.snapshot(now=1000)
+        profiles["Alpha#1111"] = Fake_Profile("1:30:00", 5)
+        second = await snapshotter.snapshot(now=2000)
+        alpha_id = await storage.get_player_id("alpha")
+        playtime = await storage.get_stat_samples(alpha_id, STAT_CODES["quickplay_seconds"], 0, 3000)
+        return first, second, playtime
+
+    first, second, playtime = asyncio.run(run())
+    assert first == 5
+    assert second == 1
+    assert playtime == [(1000, 3600), (2000, 5400)]
+
+
+def test_format_trend():
+    message = format_trend("alpha", "quickplay_seconds", [(0, 3600), (DAY, 9000)], 30)
+    assert message.startswith("alpha's quickplay_seconds over the last 30 days: 1.0 hours to 2.5 hours (+1.5 hours).")
+    assert format_trend("alpha", "sr", [], 30) == "There are no sr records for alpha yet."
+
+
+def test_trend_command(create_test_bot):
+    discord_bot = importlib.import_module("discord_bot")
+
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel(guild=Fake_Guild())
+        author = Fake_Author(f"trend{channel.guild.id}")
+        await discord_bot.db.upsert_player(author.name, f"Trend#{channel.guild.id}")
+        player_id = await discord_bot.db.get_player_id(author.name)
+        now = int(time.time())
+        await discord_bot.db.append_stat_samples([(player_id, STAT_CODES["sr"], now - 40 * DAY, 2400),
+                                                  (player_id, STAT_CODES["sr"], now - 2 * DAY, 2550)])
+        await invoke_command(bot, author, channel, "!trend sr 7")
+        await invoke_command(bot, author, channel, "!trend rank")
+        return author.name, [message.content for message in channel.sent]
+
+    name, replies = asyncio.run(run())
+    assert replies[0].startswith(f"{name}'s sr over the last 7 days: 2400 to 2550 (+150).")
+    assert replies[1].startswith("Type '!trend ' followed by one of sr, quickplay_seconds")
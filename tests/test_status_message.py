@@ -0,0 +1,73 @@
+"""
+Unit tests for status_message.py
+"""
+import asyncio
+
+from bot_code.status_message import Live_Status_Message
+from fake_discord import Fake_Channel
+
+
+def run_status_updates(status_message, channel, updates: int):
+    async def run():
+        for _ in range(updates):
+            status_message.request_update(channel)
+        await asyncio.sleep(status_message.debounce * 3)
+    asyncio.run(run())
+
+
+def test_burst_of_updates_posts_one_pinned_message():
+    channel = Fake_Channel()
+    status_message = Live_Status_Message(render=lambda: "status", debounce=0.01)
+    run_status_updates(status_message, channel, 100)
+    assert len(channel.sent) == 1
+    assert channel.sent[0].pinned
+    assert status_message.send_count == 1
+    assert status_message.edit_count == 0
+
+
+def test_burst_of_updates_edits_once():
+    channel = Fake_Channel()
+    contents = iter(range(1000))
+    status_message = Live_Status_Message(render=lambda: str(next(contents)), debounce=0.01)
+    run_status_updates(status_message, channel, 1)
+    run_status_updates(status_message, channel, 50)
+    assert len(channel.sent) == 1
+    assert channel.sent[0].edits == ["1"]
+
+
+def test_unchanged_status_not_edited():
+    channel = Fake_Channel()
+    status_message = Live_Status_Message(render=lambda: "status", debounce=0.01)
+    run_status_updates(status_message, channel, 1)
+    run_status_updates(status_message, channel, 1)
+    assert channel.sent[0].edits == []
+
+
+def test_deleted_message_reposted():
+    channel = Fake_Channel()
+    contents = iter(range(1000))
+    status_message = Live_Status_Message(render=lambda: str(next(contents)), debounce=0.01)
+    run_status_updates(status_message, channel, 1)
+    channel.sent[0].deleted = True
+    run_status_updates(status_message, channel, 1)
+    assert len(channel.sent) == 2
+    assert channel.sent[1].content == "1"
+
+
+def test_message_moves_to_new_channel():
+    old_channel, new_channel = Fake_Channel(), Fake_Channel()
+    status_message = Live_Status_Message(render=lambda: "status", debounce=0.01)
+    run_status_updates(status_message, old_channel, 1)
+    run_status_updates(status_message, new_channel, 1)
+    assert not old_channel.sent[0].pinned
+    assert new_channel.sent[0].pinned
+
+
+def test_close_unpins_with_final_content():
+    channel = Fake_Channel()
+    status_message = Live_Status_Message(render=lambda: "status", debounce=0.01)
+    run_status_updates(status_message, channel, 1)
+    asyncio.run(status_message.close(final_content="ended"))
+    assert channel.sent[0].content == "ended"
+    assert not channel.sent[0].pinned
+    assert status_message.message is None
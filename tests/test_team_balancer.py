@@ -0,0 +1,92 @@
+"""
+Tests for team_balancer.py, and the !rank and !teams commands using it.
+"""
+import asyncio
+import importlib
+import random
+import time
+from itertools import combinations
+
+from bot_code.team_balancer import Rated_Player, Team_Balancer, ROLES
+from fake_discord import Fake_Author, Fake_Channel, Fake_Guild, invoke_command
+
+
+def random_players(count, seed):
+    rng = random.Random(seed)
+    return [Rated_Player(f"p{i}", rng.choice([None] + [rng.randrange(500, 4500)] * 4),
+                         rng.choice(ROLES + (None,))) for i in range(count)]
+
+
+def best_cost_by_brute_force(balancer, players):
+    team_size = len(players) // 2
+    return min(balancer.cost([players[i] for i in team], [p for i, p in enumerate(players) if i not in team])
+               for team in combinations(range(len(players)), team_size))
+
+
+def test_exact_split_matches_brute_force():
+    balancer = Team_Balancer()
+    for seed in range(30):
+        players = random_players(random.Random(seed).randrange(2, 11), seed)
+        team_one, team_two = balancer.balance(players)
+        assert len(team_one) == len(players) // 2 and len(team_two) == len(players) - len(players) // 2
+        assert {p.name for p in team_one} | {p.name for p in team_two} == {p.name for p in players}
+        assert balancer.cost(team_one, team_two) == best_cost_by_brute_force(balancer, players)
+
+
+def test_roles_balanced_before_sr():
+    players = ([Rated_Player(f"tank{i}", 4000 - i, "tank") for i in range(2)]
+               + [Rated_Player(f"support{i}", 2000 + i, "support") for i in range(2)])
+    team_one, team_two = Team_Balancer().balance(players)
+    assert sorted(p.role for p in team_one) == sorted(p.role for p in team_two) == ["support", "tank"]
+
+
+def test_twelve_players_split_in_milliseconds():
+    balancer = Team_Balancer()
+    players = random_players(12, 35)
+    start = time.perf_counter()
+    team_one, team_two = balancer.balance(players)
+    assert time.perf_counter() - start < 0.05
+    assert balancer.cost(team_one, team_two) == best_cost_by_brute_force(balancer, players)
+
+
+def test_large_lobby_uses_heuristic():
+    balancer = Team_Balancer(exact_search_limit=20)
+    players = random_players(41, 36)
+    start = time.perf_counter()
+    team_one, team_two = balancer.balance(players)
+    assert time.perf_counter() - start < 1
+    assert len(team_one) == 20 and len(team_two) == 21
+    assert {p.name for p in team_one} | {p.name for p in team_two} == {p.name for p in players}
+    # The swaps should leave the teams far closer than a random split.
+    shuffled = random.Random(36).sample(players, len(players))
+    assert balancer.cost(team_one, team_two) <= balancer.cost(shuffled[:20], shuffled[20:])
+
+
+def test_rank_and_teams_commands(create_test_bot):
+    discord_bot = importlib.import_module("discord_bot")
+
+    async def run():
+        bot = create_test_bot()
+        channel = Fake_Channel(guild=Fake_Guild())
+        authors = [Fake_Author(f"teams{channel.guild.id}-{i}") for i in range(4)]
+        for i, (author, sr, role) in enumerate(zip(authors, (3000, 2900, 2000, 1900),
+                                                   ("tank", "tank", "support", "support"))):
+            await discord_bot.db.upsert_player(author.name, f"Teams{i}#{channel.guild.id}")
+            await invoke_command(bot, author, channel, f"!rank {sr} {role}")
+            await invoke_command(bot, author, channel, "!join")
+        # A player delaying their games is left out of the teams.
+        await invoke_command(bot, Fake_Author("delayer"), channel, "!join")
+        await invoke_command(bot, Fake_Author("delayer"), channel, "!delay")
+        await invoke_command(bot, Fake_Author("unlinked"), channel, "!rank 2500")
+        await invoke_command(bot, authors[0], channel, "!teams")
+        return channel.guild.id, authors, [message.content for message in channel.sent]
+
+    guild_id, authors, replies = asyncio.run(run())
+    assert replies[0] == f"Teams0#{guild_id} is now rated 3000 as tank."
+    assert replies[-2].startswith("unlinked has no linked battle net account.")
+    team_one, team_two = replies[-1].split("\n**Team 2**")
+    # Each team gets one tank and one support, and the stronger tank goes with the weaker support.
+    assert f"{authors[0].name} (3000, tank)" in team_one and f"{authors[3].name} (1900, support)" in team_one
+    assert f"{authors[1].name} (2900, tank)" in team_two and f"{authors[2].name} (2000, support)" in team_two
+    assert "(average SR 2450)" in team_one and "Unrated" not in replies[-1]
+    assert "delayer" not in replies[-1]